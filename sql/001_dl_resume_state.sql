@@ -0,0 +1,8 @@
+-- ---------------------------------------------------------
+-- sql/001_dl_resume_state.sql (V6.18 斷點續傳)
+-- 職責：為 mission_queue 增設續傳點欄位，供 pod_scra_intel_trans 接續泥沼戰術中斷的下載。
+-- 格式：{"key", "upload_id", "part_size", "parts": [{"PartNumber", "ETag"}], "offset",
+--        "etag", "last_modified", "attempts", "updated_at"}
+-- [備註] R2 未封箱的 Multipart 預設 7 天後自動清除，逾期續傳點會在下次掛載時被判定失效並重頭搬運。
+-- ---------------------------------------------------------
+ALTER TABLE mission_queue ADD COLUMN IF NOT EXISTS dl_resume_state jsonb;
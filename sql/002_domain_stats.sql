@@ -0,0 +1,16 @@
+-- ---------------------------------------------------------
+-- sql/002_domain_stats.sql (V6.20 網域戰情表)
+-- 職責：記錄各下載網域的滾動吞吐量、首包延遲、成功率，供 FASTEST_FIRST 選貨排序。
+-- 寫入者：pod_scra_intel_domainstats.record_transfer (每筆搬運結束後 upsert)
+-- ---------------------------------------------------------
+CREATE TABLE IF NOT EXISTS pod_scra_domain_stats (
+    domain           text PRIMARY KEY,
+    bps_ewma         double precision,       -- 📈 吞吐量 EWMA (bytes/s)
+    ttfb_ms_ewma     double precision,       -- ⏱️ 首包延遲 EWMA (ms)
+    success_rate     double precision,       -- ✅ 成功率 EWMA (0~1)
+    success_count    integer NOT NULL DEFAULT 0,
+    failure_count    integer NOT NULL DEFAULT 0,
+    last_success_at  timestamptz,
+    last_failure_at  timestamptz,
+    updated_at       timestamptz NOT NULL DEFAULT now()
+);
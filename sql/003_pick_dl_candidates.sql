@@ -0,0 +1,71 @@
+-- ---------------------------------------------------------
+-- sql/003_pick_dl_candidates.sql (V6.21 伺服端選貨 RPC)
+-- 職責：取代物流拍「撈 50 筆完整列 + Python 篩選」的流程，於資料庫內一次完成：
+--       1. 狀態/時間窗篩選與 50 筆新鮮度樣本 (created_at desc)
+--       2. 黑名單過濾 (與 domainpolicy 字尾樹同語意：主機等於規則網域或為其子網域才封鎖，x.com 不會誤殺 box.com)
+--       3. 網域分散度動態偵測：樣本獨立網域數 >= dl_limit 時，同網域上限降為 1
+--       4. 同網域上限 + 候補席次，僅回傳搬運所需欄位
+-- 呼叫端：pod_scra_intel_trans._pick_candidates_rpc (失敗時自動退回 Python 篩選)
+--         重裝兵專屬的 dl_heavy_only 由呼叫端依機甲身分放入 p_statuses，函式本身不需 worker_id。
+-- ---------------------------------------------------------
+-- 🧹 移除舊版簽章 (首版多帶一個未使用的 p_worker_id)
+DROP FUNCTION IF EXISTS pod_scra_pick_dl_candidates(text, text[], integer, integer, text[], timestamptz, integer, integer);
+
+CREATE OR REPLACE FUNCTION pod_scra_pick_dl_candidates(
+    p_statuses         text[],
+    p_dl_limit         integer,
+    p_max_same_domain  integer,
+    p_blacklist        text[]      DEFAULT '{}',
+    p_now              timestamptz DEFAULT now(),
+    p_spares           integer     DEFAULT 1,
+    p_sample           integer     DEFAULT 50
+)
+RETURNS TABLE (
+    id                     mission_queue.id%TYPE,
+    audio_url              mission_queue.audio_url%TYPE,
+    source_name            mission_queue.source_name%TYPE,
+    episode_title          mission_queue.episode_title%TYPE,
+    scrape_status          mission_queue.scrape_status%TYPE,
+    audio_size_mb          mission_queue.audio_size_mb%TYPE,
+    dl_soft_failure_count  mission_queue.dl_soft_failure_count%TYPE,
+    dl_resume_state        mission_queue.dl_resume_state%TYPE,
+    created_at             mission_queue.created_at%TYPE,
+    domain_cap             integer,
+    sample_domains         integer
+)
+LANGUAGE sql STABLE AS $$
+    WITH sample AS (
+        -- 🧭 主機名稱正規化 (小寫、去帳密與連接埠)，與 domainpolicy.normalize_host 一致
+        SELECT q.*, lower(split_part(regexp_replace(split_part(split_part(q.audio_url, '://', 2), '/', 1), '^.*@', ''), ':', 1)) AS host
+        FROM mission_queue q
+        WHERE q.scrape_status = ANY (p_statuses)
+          AND q.r2_url IS NULL
+          AND q.troop2_start_at <= p_now
+          AND q.audio_url IS NOT NULL
+        ORDER BY q.created_at DESC
+        LIMIT p_sample
+    ),
+    dispersion AS (
+        SELECT count(DISTINCT host)::integer AS n,
+               CASE WHEN count(DISTINCT host) >= p_dl_limit THEN 1 ELSE p_max_same_domain END AS cap
+        FROM sample
+    ),
+    allowed AS (
+        SELECT s.*
+        FROM sample s
+        WHERE NOT EXISTS (
+            SELECT 1 FROM unnest(p_blacklist) AS b(domain)
+            WHERE b.domain <> '' AND (s.host = b.domain OR s.host LIKE '%.' || b.domain)
+        )
+    ),
+    ranked AS (
+        SELECT a.*, row_number() OVER (PARTITION BY a.host ORDER BY a.created_at DESC) AS rn
+        FROM allowed a
+    )
+    SELECT r.id, r.audio_url, r.source_name, r.episode_title, r.scrape_status, r.audio_size_mb,
+           r.dl_soft_failure_count, r.dl_resume_state, r.created_at, d.cap, d.n
+    FROM ranked r CROSS JOIN dispersion d
+    WHERE r.rn <= d.cap + p_spares
+    ORDER BY r.rn, r.created_at DESC
+    LIMIT p_dl_limit * (GREATEST(p_max_same_domain, 1) + p_spares);
+$$;
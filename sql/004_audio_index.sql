@@ -0,0 +1,21 @@
+-- ---------------------------------------------------------
+-- sql/004_audio_index.sql (V6.23 內容定址去重)
+-- 職責：以音檔 SHA-256 為鍵，記錄已入庫的原檔 / Opus / 逐字稿任務，同內容換網址重新上架時直接掛回。
+-- 寫入者：pod_scra_intel_dedup (register_audio / attach_artifact / apply_dedup_hit)
+-- ---------------------------------------------------------
+CREATE TABLE IF NOT EXISTS pod_scra_audio_index (
+    sha256            text PRIMARY KEY,
+    size_bytes        bigint,
+    r2_key            text,                   -- 📦 原檔 R2 鍵
+    opus_key          text,                   -- 🗜️ Opus 成品 R2 鍵
+    stt_task_id       uuid,                   -- 📝 已有逐字稿的任務 (mission_intel.task_id)
+    first_task_id     uuid,
+    hit_count         integer NOT NULL DEFAULT 0,
+    bytes_saved       bigint  NOT NULL DEFAULT 0,
+    stt_passes_saved  integer NOT NULL DEFAULT 0,
+    created_at        timestamptz NOT NULL DEFAULT now(),
+    updated_at        timestamptz NOT NULL DEFAULT now()
+);
+
+ALTER TABLE mission_queue ADD COLUMN IF NOT EXISTS audio_sha256 text;
+CREATE INDEX IF NOT EXISTS idx_mission_queue_audio_sha256 ON mission_queue (audio_sha256);
@@ -0,0 +1,40 @@
+-- ---------------------------------------------------------
+-- sql/005_audio_fingerprint.sql (V6.24 音紋重播偵測)
+-- 職責：存放已聽打任務的地標音紋 (int[])，以 GIN 索引支援 && 重疊查詢，找出換廣告重播的舊集數。
+-- 寫入者：pod_scra_intel_fingerprint.register_fingerprint (逐字稿入庫後)
+-- 呼叫端：pod_scra_intel_fingerprint.find_rerun
+-- ---------------------------------------------------------
+CREATE TABLE IF NOT EXISTS pod_scra_audio_fingerprint (
+    task_id       uuid PRIMARY KEY,
+    hashes        integer[] NOT NULL,        -- 🎼 抽樣後的地標雜湊 (已排序、不重複)
+    hash_count    integer   NOT NULL,
+    duration_sec  double precision,
+    created_at    timestamptz NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS idx_audio_fingerprint_hashes
+    ON pod_scra_audio_fingerprint USING gin (hashes);
+
+ALTER TABLE mission_queue ADD COLUMN IF NOT EXISTS rerun_of uuid;
+
+-- 🔍 GIN 重疊預篩 + 片長預篩 (重播插播廣告，片長差距容許 25% 或 10 分鐘)，再以集合交集精算共同雜湊數
+CREATE OR REPLACE FUNCTION pod_scra_match_fingerprint(
+    p_hashes    integer[],
+    p_duration  double precision,
+    p_exclude   uuid    DEFAULT NULL,
+    p_limit     integer DEFAULT 3
+)
+RETURNS TABLE (task_id uuid, overlap integer, hash_count integer, duration_sec double precision)
+LANGUAGE sql STABLE
+AS $$
+    SELECT f.task_id,
+           (SELECT count(*) FROM (SELECT unnest(f.hashes) INTERSECT SELECT unnest(p_hashes)) x)::integer AS overlap,
+           f.hash_count,
+           f.duration_sec
+    FROM pod_scra_audio_fingerprint f
+    WHERE f.hashes && p_hashes
+      AND f.task_id IS DISTINCT FROM p_exclude
+      AND abs(coalesce(f.duration_sec, p_duration) - p_duration) <= GREATEST(600, p_duration * 0.25)
+    ORDER BY overlap DESC
+    LIMIT p_limit;
+$$;
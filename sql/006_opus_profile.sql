@@ -0,0 +1,8 @@
+-- ---------------------------------------------------------
+-- sql/006_opus_profile.sql (V6.26 片長導向自適應 Opus)
+-- 職責：記錄兵工廠為每筆任務挑選的壓縮規格與成品大小/片長比，供日後校正位元率階梯。
+-- 寫入者：pod_scra_intel_core._finish_compression
+-- ---------------------------------------------------------
+ALTER TABLE mission_queue ADD COLUMN IF NOT EXISTS opus_profile       text;              -- 🪜 例如 opus_auto_24k
+ALTER TABLE mission_queue ADD COLUMN IF NOT EXISTS audio_duration_sec double precision;  -- ⏱️ 探測片長 (秒)
+ALTER TABLE mission_queue ADD COLUMN IF NOT EXISTS opus_bytes_per_sec double precision;  -- 🧮 成品位元組 ÷ 片長
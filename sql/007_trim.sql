@@ -0,0 +1,7 @@
+-- ---------------------------------------------------------
+-- sql/007_trim.sql (V6.27 靜音與配樂修剪)
+-- 職責：記錄兵工廠修剪掉的音訊秒數，以及「修剪後 -> 原始」時間軸對照表 (逐字稿時間換算用)。
+-- 寫入者：pod_scra_intel_core._finish_compression
+-- ---------------------------------------------------------
+ALTER TABLE mission_queue ADD COLUMN IF NOT EXISTS trim_seconds_saved double precision;  -- ✂️ 省下的計費秒數
+ALTER TABLE mission_queue ADD COLUMN IF NOT EXISTS trim_map jsonb;                       -- 🗺️ [[輸出起點, 原始起點, 長度], ...]
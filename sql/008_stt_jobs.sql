@@ -0,0 +1,28 @@
+-- ---------------------------------------------------------
+-- sql/008_stt_jobs.sql (V6.33 STT 遠端工單帳本)
+-- 職責：落帳已送出的 Gladia / Speechmatics / AssemblyAI 工單，機甲重啟後由任何機甲接手收件，杜絕重複送單計費。
+-- 寫入者：pod_scra_intel_sttjobs (record_job / touch_job / claim_job)
+-- 呼叫端：pod_scra_intel_stt_router.execute_stt_routing (送單)、pod_scra_intel_core (收件)
+-- ---------------------------------------------------------
+CREATE TABLE IF NOT EXISTS pod_scra_stt_jobs (
+    id            bigserial PRIMARY KEY,
+    task_id       uuid NOT NULL,
+    provider      text NOT NULL,             -- 🎯 GLADIA / SPEECHMATICS / ASSEMBLYAI
+    key_index     integer NOT NULL DEFAULT 0, -- 🔑 金鑰序號 (收件時依序號取回金鑰，帳本不存金鑰本體)
+    job_ref       text NOT NULL,             -- 🧾 工單編號或 result_url
+    audio_url     text,
+    worker_id     text,
+    status        text NOT NULL DEFAULT 'submitted' CHECK (status IN ('submitted', 'done', 'failed')),
+    error         text,
+    poll_count    integer NOT NULL DEFAULT 0,
+    submitted_at  timestamptz NOT NULL DEFAULT now(),
+    polled_at     timestamptz,
+    finished_at   timestamptz
+);
+
+-- 🔒 同一任務同時只允許一張在途工單
+CREATE UNIQUE INDEX IF NOT EXISTS uq_stt_jobs_live_task ON pod_scra_stt_jobs (task_id) WHERE status = 'submitted';
+CREATE INDEX IF NOT EXISTS idx_stt_jobs_open ON pod_scra_stt_jobs (polled_at NULLS FIRST) WHERE status = 'submitted';
+CREATE INDEX IF NOT EXISTS idx_stt_jobs_task ON pod_scra_stt_jobs (task_id);
+
+-- 📮 mission_intel.intel_status 新增 'STT-wait' (已送單、等待收件)；摘要雷達只撿 Sum.-pre，不受影響
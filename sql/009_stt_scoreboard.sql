@@ -0,0 +1,27 @@
+-- ---------------------------------------------------------
+-- sql/009_stt_scoreboard.sql (V6.35 STT 供應商計分板)
+-- 職責：記錄各 STT 供應商 + 金鑰的滾動成功率、耗時分位數、額度告警時間與斷路器狀態，
+--       供 execute_stt_routing 動態排序並略過斷路中的供應商。
+-- 寫入者：pod_scra_intel_sttscore.record_outcome (每次同步聽打 / 收件結案後 upsert)
+--         pod_scra_intel_sttscore.allow (冷卻期滿時以條件更新搶半開試射權)
+-- ---------------------------------------------------------
+CREATE TABLE IF NOT EXISTS pod_scra_stt_scoreboard (
+    slot                  text PRIMARY KEY,                -- 🔑 供應商#金鑰序號，例如 GLADIA#0
+    provider              text NOT NULL,
+    key_index             integer NOT NULL DEFAULT 0,
+    success_rate          double precision,                -- ✅ 成功率 EWMA (0~1)
+    latency_samples       double precision[],              -- ⏱️ 最近 40 筆成功耗時 (秒)
+    p50_sec               double precision,
+    p95_sec               double precision,
+    success_count         integer NOT NULL DEFAULT 0,
+    failure_count         integer NOT NULL DEFAULT 0,
+    consecutive_failures  integer NOT NULL DEFAULT 0,
+    breaker_state         text NOT NULL DEFAULT 'closed',  -- 🔌 closed / open / half_open
+    cooldown_sec          integer,                         -- 🧊 本次斷路冷卻秒數 (連續跳脫加倍)
+    cooldown_until        timestamptz,
+    last_quota_hit_at     timestamptz,                     -- 💸 最後一次 402/429 額度告警
+    last_success_at       timestamptz,
+    last_failure_at       timestamptz,
+    last_error            text,
+    updated_at            timestamptz NOT NULL DEFAULT now()
+);
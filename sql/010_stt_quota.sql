@@ -0,0 +1,127 @@
+-- ---------------------------------------------------------
+-- sql/010_stt_quota.sql (V6.36 STT 額度帳本)
+-- 職責：以音訊秒數記錄各 STT 金鑰車道每個計費週期的額度，並以 RPC 原子地預留 / 結算 / 退回，
+--       取代 pod_scra_metadata.STT_QUOTA_PACING 的「讀 JSON -> 改 -> 寫回」次數制 (無併發控制)。
+-- 寫入者：pod_scra_intel_sttquota (reserve / commit / release)
+-- 呼叫端：pod_scra_intel_stt_router.execute_stt_routing (開火前預留)、pod_scra_intel_sttpoller (收件結算)
+-- ---------------------------------------------------------
+CREATE TABLE IF NOT EXISTS pod_scra_stt_quota (
+    lane          text NOT NULL,                          -- 🔑 供應商#金鑰序號，例如 GLADIA#0
+    period        text NOT NULL,                          -- 🗓️ 計費週期：2026-10 (月) / 2026-W42 (週)
+    provider      text NOT NULL,
+    budget_sec    double precision NOT NULL,              -- 💸 本期額度 (秒)
+    used_sec      double precision NOT NULL DEFAULT 0,    -- ✅ 已結算用量
+    reserved_sec  double precision NOT NULL DEFAULT 0,    -- ⏳ 預留中 (在途工單 / 同步聽打中)
+    updated_at    timestamptz NOT NULL DEFAULT now(),
+    PRIMARY KEY (lane, period)
+);
+
+CREATE TABLE IF NOT EXISTS pod_scra_stt_quota_holds (
+    id          bigserial PRIMARY KEY,
+    lane        text NOT NULL,
+    period      text NOT NULL,
+    task_id     uuid,
+    seconds     double precision NOT NULL,
+    status      text NOT NULL DEFAULT 'reserved' CHECK (status IN ('reserved', 'committed', 'released')),
+    created_at  timestamptz NOT NULL DEFAULT now(),
+    settled_at  timestamptz
+);
+
+CREATE INDEX IF NOT EXISTS idx_stt_quota_holds_open ON pod_scra_stt_quota_holds (lane, period, created_at) WHERE status = 'reserved';
+
+-- 📮 遠端工單記下預留單號，收件時結算 / 退回
+ALTER TABLE pod_scra_stt_jobs ADD COLUMN IF NOT EXISTS quota_hold_id bigint;
+
+-- 🔒 預留：先退回逾時的遺留預留單，再以單一條件式 UPDATE 檢查「已用 + 預留 + 本次 <= 額度」(列鎖保證原子性)
+CREATE OR REPLACE FUNCTION pod_scra_stt_quota_reserve(
+    p_lane           text,
+    p_period         text,
+    p_budget_sec     double precision,
+    p_seconds        double precision,
+    p_task_id        uuid    DEFAULT NULL,
+    p_stale_minutes  integer DEFAULT 180
+)
+RETURNS bigint
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_stale  double precision;
+    v_id     bigint;
+BEGIN
+    INSERT INTO pod_scra_stt_quota (lane, period, provider, budget_sec)
+    VALUES (p_lane, p_period, split_part(p_lane, '#', 1), p_budget_sec)
+    ON CONFLICT (lane, period) DO UPDATE SET budget_sec = EXCLUDED.budget_sec;
+
+    WITH stale AS (
+        UPDATE pod_scra_stt_quota_holds
+        SET status = 'released', settled_at = now()
+        WHERE lane = p_lane AND period = p_period AND status = 'reserved'
+          AND created_at < now() - make_interval(mins => p_stale_minutes)
+        RETURNING seconds
+    )
+    SELECT coalesce(sum(seconds), 0) INTO v_stale FROM stale;
+
+    UPDATE pod_scra_stt_quota
+    SET reserved_sec = GREATEST(reserved_sec - v_stale, 0) + p_seconds, updated_at = now()
+    WHERE lane = p_lane AND period = p_period
+      AND used_sec + GREATEST(reserved_sec - v_stale, 0) + p_seconds <= budget_sec;
+
+    IF NOT FOUND THEN
+        IF v_stale > 0 THEN
+            UPDATE pod_scra_stt_quota SET reserved_sec = GREATEST(reserved_sec - v_stale, 0), updated_at = now()
+            WHERE lane = p_lane AND period = p_period;
+        END IF;
+        RETURN NULL;
+    END IF;
+
+    INSERT INTO pod_scra_stt_quota_holds (lane, period, task_id, seconds)
+    VALUES (p_lane, p_period, p_task_id, p_seconds)
+    RETURNING id INTO v_id;
+    RETURN v_id;
+END;
+$$;
+
+-- ✅ 結算：預留轉用量；預留單已被逾時退回時仍照實扣帳 (遠端確實計費)
+CREATE OR REPLACE FUNCTION pod_scra_stt_quota_commit(
+    p_hold_id  bigint,
+    p_seconds  double precision DEFAULT NULL
+)
+RETURNS boolean
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    h  pod_scra_stt_quota_holds%ROWTYPE;
+BEGIN
+    SELECT * INTO h FROM pod_scra_stt_quota_holds WHERE id = p_hold_id FOR UPDATE;
+    IF NOT FOUND OR h.status = 'committed' THEN RETURN false; END IF;
+
+    UPDATE pod_scra_stt_quota
+    SET reserved_sec = CASE WHEN h.status = 'reserved' THEN GREATEST(reserved_sec - h.seconds, 0) ELSE reserved_sec END,
+        used_sec = used_sec + coalesce(p_seconds, h.seconds),
+        updated_at = now()
+    WHERE lane = h.lane AND period = h.period;
+
+    UPDATE pod_scra_stt_quota_holds SET status = 'committed', settled_at = now() WHERE id = p_hold_id;
+    RETURN true;
+END;
+$$;
+
+-- ↩️ 退回：僅處理仍在預留中的單據 (重複呼叫無副作用)
+CREATE OR REPLACE FUNCTION pod_scra_stt_quota_release(p_hold_id bigint)
+RETURNS boolean
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    h  pod_scra_stt_quota_holds%ROWTYPE;
+BEGIN
+    UPDATE pod_scra_stt_quota_holds SET status = 'released', settled_at = now()
+    WHERE id = p_hold_id AND status = 'reserved'
+    RETURNING * INTO h;
+    IF NOT FOUND THEN RETURN false; END IF;
+
+    UPDATE pod_scra_stt_quota
+    SET reserved_sec = GREATEST(reserved_sec - h.seconds, 0), updated_at = now()
+    WHERE lane = h.lane AND period = h.period;
+    RETURN true;
+END;
+$$;
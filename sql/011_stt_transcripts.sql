@@ -0,0 +1,23 @@
+-- ---------------------------------------------------------
+-- sql/011_stt_transcripts.sql (V6.39 逐字稿快取)
+-- 職責：以「音檔 SHA-256 + 語言」為鍵保存逐字稿，與 mission_intel 生命週期脫鉤；
+--       任務被重置 (第二棒 404、Router 例外) 或重新下載後，STT 產線直接取回，不再重燒供應商秒數。
+-- 寫入者：pod_scra_intel_sttcache (store_transcript / restore_transcript)
+-- 呼叫端：pod_scra_intel_core.run_audio_to_stt_mission (聽打前查詢、成功後寫入)、
+--         pod_scra_intel_dedup.apply_dedup_hit (去重命中時的逐字稿來源)
+-- ---------------------------------------------------------
+CREATE TABLE IF NOT EXISTS pod_scra_stt_transcripts (
+    audio_sha256   text NOT NULL,                          -- 🔑 原始音檔 SHA-256 (mission_queue.audio_sha256)
+    language       text NOT NULL DEFAULT 'en',
+    stt_text       text NOT NULL,
+    provider       text,                                   -- 🎤 完成聽打的供應商
+    task_id        uuid,                                   -- 📝 首次聽打的任務
+    audio_sec      double precision,                       -- ⏱️ 片長 (命中時計入 seconds_saved)
+    hit_count      integer NOT NULL DEFAULT 0,
+    seconds_saved  double precision NOT NULL DEFAULT 0,
+    created_at     timestamptz NOT NULL DEFAULT now(),
+    last_hit_at    timestamptz,
+    PRIMARY KEY (audio_sha256, language)
+);
+
+CREATE INDEX IF NOT EXISTS idx_stt_transcripts_task ON pod_scra_stt_transcripts (task_id);
@@ -0,0 +1,44 @@
+-- ---------------------------------------------------------
+-- sql/012_domain_stats_rpc.sql (V6.20 網域戰情表：原子回報)
+-- 職責：record_transfer 原本「先讀再 upsert」，平行車道與多台機甲同時回報同一網域時會互相覆寫
+--       EWMA 與成功 / 失敗計數。本 RPC 以單一 INSERT ... ON CONFLICT DO UPDATE 在列鎖內完成累加。
+-- 呼叫端：pod_scra_intel_domainstats.record_transfer
+-- ---------------------------------------------------------
+CREATE OR REPLACE FUNCTION pod_scra_record_transfer(
+    p_domain    text,
+    p_ok        boolean,
+    p_bps       double precision DEFAULT NULL,   -- 📈 本次吞吐量 (無位元組流動時為 NULL，不更新)
+    p_ttfb_ms   double precision DEFAULT NULL,
+    p_alpha     double precision DEFAULT 0.3
+)
+RETURNS void
+LANGUAGE sql
+AS $$
+    INSERT INTO pod_scra_domain_stats AS s (
+        domain, bps_ewma, ttfb_ms_ewma, success_rate, success_count, failure_count,
+        last_success_at, last_failure_at, updated_at
+    )
+    VALUES (
+        p_domain, round(p_bps::numeric, 1), round(p_ttfb_ms::numeric, 1),
+        CASE WHEN p_ok THEN 1.0 ELSE 0.0 END,
+        CASE WHEN p_ok THEN 1 ELSE 0 END, CASE WHEN p_ok THEN 0 ELSE 1 END,
+        CASE WHEN p_ok THEN now() END, CASE WHEN p_ok THEN NULL ELSE now() END, now()
+    )
+    ON CONFLICT (domain) DO UPDATE SET
+        bps_ewma = CASE
+            WHEN p_bps IS NULL THEN s.bps_ewma
+            WHEN s.bps_ewma IS NULL THEN round(p_bps::numeric, 1)
+            ELSE round((p_alpha * p_bps + (1 - p_alpha) * s.bps_ewma)::numeric, 1) END,
+        ttfb_ms_ewma = CASE
+            WHEN p_ttfb_ms IS NULL THEN s.ttfb_ms_ewma
+            WHEN s.ttfb_ms_ewma IS NULL THEN round(p_ttfb_ms::numeric, 1)
+            ELSE round((p_alpha * p_ttfb_ms + (1 - p_alpha) * s.ttfb_ms_ewma)::numeric, 1) END,
+        success_rate = round(CASE
+            WHEN s.success_rate IS NULL THEN EXCLUDED.success_rate
+            ELSE p_alpha * EXCLUDED.success_rate + (1 - p_alpha) * s.success_rate END::numeric, 4),
+        success_count = s.success_count + EXCLUDED.success_count,
+        failure_count = s.failure_count + EXCLUDED.failure_count,
+        last_success_at = coalesce(EXCLUDED.last_success_at, s.last_success_at),
+        last_failure_at = coalesce(EXCLUDED.last_failure_at, s.last_failure_at),
+        updated_at = now();
+$$;
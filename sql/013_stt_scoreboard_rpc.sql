@@ -0,0 +1,92 @@
+-- ---------------------------------------------------------
+-- sql/013_stt_scoreboard_rpc.sql (V6.35 STT 供應商計分板：原子戰績回報)
+-- 職責：record_outcome 原本「先讀再 upsert」，多台機甲同時回報同一金鑰時會遺失成功 / 失敗 / 連敗計數，
+--       甚至以 closed 覆寫剛跳脫的斷路器。本 RPC 於列鎖內完成 EWMA、耗時分位數、計數與斷路器轉換。
+-- 呼叫端：pod_scra_intel_sttscore.record_outcome (門檻與冷卻參數由 Python 端常數傳入)
+-- ---------------------------------------------------------
+CREATE OR REPLACE FUNCTION pod_scra_stt_record_outcome(
+    p_slot            text,
+    p_provider        text,
+    p_key_index       integer,
+    p_ok              boolean,
+    p_latency_sec     double precision DEFAULT NULL,
+    p_quota           boolean DEFAULT false,           -- 💸 402/429 額度告警 (立即跳脫)
+    p_error           text DEFAULT NULL,
+    p_alpha           double precision DEFAULT 0.3,
+    p_window          integer DEFAULT 40,
+    p_fail_threshold  integer DEFAULT 3,
+    p_fail_cooldown   integer DEFAULT 600,
+    p_quota_cooldown  integer DEFAULT 3600,
+    p_cooldown_max    integer DEFAULT 21600
+)
+RETURNS jsonb
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    r         pod_scra_stt_scoreboard%ROWTYPE;
+    v_n       integer;
+    v_fails   integer;
+    v_base    integer;
+    v_last    integer;
+    v_tripped boolean := false;
+BEGIN
+    INSERT INTO pod_scra_stt_scoreboard (slot, provider, key_index)
+    VALUES (p_slot, p_provider, p_key_index)
+    ON CONFLICT (slot) DO NOTHING;
+
+    SELECT * INTO r FROM pod_scra_stt_scoreboard WHERE slot = p_slot FOR UPDATE;
+
+    r.success_count := r.success_count + CASE WHEN p_ok THEN 1 ELSE 0 END;
+    r.failure_count := r.failure_count + CASE WHEN p_ok THEN 0 ELSE 1 END;
+    r.success_rate := round((CASE
+        WHEN r.success_rate IS NULL THEN CASE WHEN p_ok THEN 1.0 ELSE 0.0 END
+        ELSE p_alpha * CASE WHEN p_ok THEN 1.0 ELSE 0.0 END + (1 - p_alpha) * r.success_rate END)::numeric, 4);
+
+    -- ⏱️ 成功耗時：保留最近 p_window 筆，重算 p50 / p95 (與 Python 端 _percentile 同一取樣規則)
+    IF p_ok AND p_latency_sec IS NOT NULL THEN
+        r.latency_samples := coalesce(r.latency_samples, '{}') || round(p_latency_sec::numeric, 1)::double precision;
+        v_n := cardinality(r.latency_samples);
+        IF v_n > p_window THEN
+            r.latency_samples := r.latency_samples[v_n - p_window + 1 : v_n];
+            v_n := p_window;
+        END IF;
+        SELECT x INTO r.p50_sec FROM unnest(r.latency_samples) x ORDER BY x OFFSET round(0.5 * (v_n - 1)) LIMIT 1;
+        SELECT x INTO r.p95_sec FROM unnest(r.latency_samples) x ORDER BY x OFFSET round(0.95 * (v_n - 1)) LIMIT 1;
+    END IF;
+
+    IF p_ok THEN
+        r.consecutive_failures := 0;
+        r.breaker_state := 'closed';
+        r.cooldown_sec := NULL;
+        r.cooldown_until := NULL;
+        r.last_success_at := now();
+    ELSE
+        v_fails := r.consecutive_failures + 1;
+        r.consecutive_failures := v_fails;
+        r.last_failure_at := now();
+        r.last_error := left(coalesce(p_error, ''), 120);
+        IF p_quota THEN r.last_quota_hit_at := now(); END IF;
+        IF p_quota OR v_fails >= p_fail_threshold OR r.breaker_state = 'half_open' THEN
+            -- 🧊 跳脫：連續跳脫時冷卻加倍
+            v_base := CASE WHEN p_quota THEN p_quota_cooldown ELSE p_fail_cooldown END;
+            v_last := CASE WHEN r.breaker_state IN ('open', 'half_open') THEN r.cooldown_sec END;
+            r.cooldown_sec := LEAST(GREATEST(v_base, coalesce(v_last, 0) * 2), p_cooldown_max);
+            r.cooldown_until := now() + make_interval(secs => r.cooldown_sec);
+            r.breaker_state := 'open';
+            v_tripped := true;
+        END IF;
+    END IF;
+    r.updated_at := now();
+
+    UPDATE pod_scra_stt_scoreboard SET
+        success_count = r.success_count, failure_count = r.failure_count, success_rate = r.success_rate,
+        latency_samples = r.latency_samples, p50_sec = r.p50_sec, p95_sec = r.p95_sec,
+        consecutive_failures = r.consecutive_failures, breaker_state = r.breaker_state,
+        cooldown_sec = r.cooldown_sec, cooldown_until = r.cooldown_until,
+        last_quota_hit_at = r.last_quota_hit_at, last_success_at = r.last_success_at,
+        last_failure_at = r.last_failure_at, last_error = r.last_error, updated_at = r.updated_at
+    WHERE slot = p_slot;
+
+    RETURN to_jsonb(r) || jsonb_build_object('tripped', v_tripped);
+END;
+$$;
@@ -0,0 +1,321 @@
+# ---------------------------------------------------------
+# src/pod_scra_bench.py (V6.24 兵棋推演台)
+# 職責：離線量測各產線元件的效能，不連資料庫；僅在明確指定 --stt 時才呼叫 STT 供應商。
+# 用法：python -m src.pod_scra_bench <項目> [參數]
+#   fingerprint  音紋計算耗時 (秒 / 每音訊小時) 與重播/異集相似度
+#   trim         靜音/配樂修剪：語料庫剔除秒數，與 (選配 --stt groq) 修剪前後逐字稿的 WER 漂移
+#   memory       取貨 + STT 上傳的峰值 RSS：整檔 resp.content 舊路徑 vs fetch_spooled 串流路徑 (本機假伺服器)
+#   s3           R2 客戶端建立耗時 (每次新建 vs 共用連線池)，與各分片大小的上傳/下載 MB/s (需 R2 憑證)
+#   handshake    單件 STT 工單 (送單 + 輪詢 + 取稿) 的請求耗時：每次新建客戶端 vs 供應商連線池 (預設本機 TLS 假伺服器)
+# ---------------------------------------------------------
+import argparse, os, sys, time, tempfile, threading
+
+def _synthetic_program(seed, seconds, sr=16000):
+    """合成類語音節目：隨機三音和弦 + Hann 包絡的「音節」，每段 0.25 秒"""
+    import numpy as np
+    rng = np.random.default_rng(seed)
+    seg = sr // 4
+    t = np.arange(seg) / sr
+    env = np.hanning(seg)
+    out = np.empty(seg * seconds * 4, np.float32)
+    for i in range(seconds * 4):
+        freqs = rng.uniform(150, 3000, 3)
+        wave = sum(np.sin(2 * np.pi * f * t) for f in freqs) * env * rng.uniform(0.1, 0.5)
+        out[i * seg:(i + 1) * seg] = wave + rng.normal(0, 0.02, seg)
+    return out
+
+def bench_fingerprint(args):
+    import numpy as np
+    from src.pod_scra_intel_fingerprint import fingerprint_audio, fingerprint_pcm, match_score, SAMPLE_RATE
+
+    if args.file:
+        t0 = time.time()
+        fp = fingerprint_audio(args.file)
+        cost = time.time() - t0
+        if not fp:
+            print("❌ 音紋計算失敗"); return
+        hours = fp["duration_sec"] / 3600
+        print(f"🎼 {args.file}: 片長 {fp['duration_sec']:.0f}s | 雜湊 {len(fp['hashes'])} | "
+              f"耗時 {cost:.2f}s (含解碼) | {cost / max(hours, 1e-9):.1f} 秒/音訊小時")
+        return
+
+    seconds = int(args.minutes * 60)
+    base = _synthetic_program(1, seconds)
+    ad = _synthetic_program(99, 60)
+    cut = len(base) // 3
+    rerun = np.concatenate([base[:cut], ad, base[cut:]])
+    rerun += np.random.default_rng(7).normal(0, 0.01, len(rerun)).astype(np.float32)
+    other = _synthetic_program(2, seconds)
+
+    t0 = time.time()
+    fp_base = fingerprint_pcm(base)
+    cost = time.time() - t0
+    fp_rerun, fp_other = fingerprint_pcm(rerun), fingerprint_pcm(other)
+    hours = len(base) / SAMPLE_RATE / 3600
+    print(f"🎼 合成節目 {args.minutes:.0f} 分鐘 | 雜湊 {len(fp_base['hashes'])} | "
+          f"耗時 {cost:.2f}s | {cost / hours:.1f} 秒/音訊小時 (不含解碼)")
+    print(f"   重播 (插播 60 秒廣告 + 雜訊) 相似度: {match_score(fp_base['hashes'], fp_rerun['hashes']):.3f}")
+    print(f"   異集相似度: {match_score(fp_base['hashes'], fp_other['hashes']):.3f}")
+
+def word_error_rate(ref, hyp):
+    """以詞為單位的編輯距離 ÷ 參考稿詞數"""
+    ref, hyp = ref.lower().split(), hyp.lower().split()
+    if not ref: return 0.0 if not hyp else 1.0
+    prev = list(range(len(hyp) + 1))
+    for i, r in enumerate(ref, 1):
+        cur = [i] + [0] * len(hyp)
+        for j, h in enumerate(hyp, 1):
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (r != h))
+        prev = cur
+    return prev[-1] / len(ref)
+
+def _groq_transcribe(path):
+    from src.pod_scra_intel_stt_router import _call_groq, get_stt_secrets
+    with open(path, "rb") as f:
+        text, status, _ = _call_groq(get_stt_secrets()["GROQ_KEYS"], f.read(), os.path.basename(path), "audio/ogg")
+    return text if status == "SUCCESS" else None
+
+def bench_trim(args):
+    from src.pod_scra_intel_transcoder import transcode, probe_duration, pick_opus_profile
+    from src.pod_scra_intel_trim import plan_trim, trim_filter
+
+    exts = (".mp3", ".m4a", ".opus", ".ogg", ".wav", ".aac")
+    files = sorted(os.path.join(args.corpus, f) for f in os.listdir(args.corpus) if f.lower().endswith(exts))
+    if not files:
+        print(f"❌ 語料庫 {args.corpus} 內沒有音檔"); return
+
+    total_in = total_saved = 0.0
+    wers = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for path in files:
+            duration = probe_duration(path) or 0
+            t0 = time.time()
+            plan = plan_trim(path, duration)
+            cost = time.time() - t0
+            saved = plan["seconds_saved"] if plan else 0.0
+            total_in += duration; total_saved += saved
+            line = f"✂️ {os.path.basename(path)}: {duration:.0f}s -> 剔除 {saved:.0f}s ({saved / max(duration, 1) * 100:.1f}%) | 偵測 {cost:.1f}s"
+
+            if args.stt == "groq" and plan:
+                profile, _ = pick_opus_profile(duration)
+                full, cut = os.path.join(tmp, "full.opus"), os.path.join(tmp, "cut.opus")
+                if transcode(path, full, profile)[0] and transcode(path, cut, profile, af=trim_filter(plan["keep"]))[0]:
+                    ref, hyp = _groq_transcribe(full), _groq_transcribe(cut)
+                    if ref and hyp:
+                        wer = word_error_rate(ref, hyp)
+                        wers.append(wer)
+                        line += f" | WER 漂移 {wer * 100:.2f}%"
+            print(line)
+
+    print(f"📊 合計 {len(files)} 檔 | 音訊 {total_in / 3600:.2f} 小時 | 剔除 {total_saved / 3600:.2f} 小時 "
+          f"({total_saved / max(total_in, 1) * 100:.1f}%)")
+    if wers:
+        print(f"📊 WER 漂移：平均 {sum(wers) / len(wers) * 100:.2f}% | 最大 {max(wers) * 100:.2f}%")
+    elif args.stt != "groq":
+        print("💡 加上 --stt groq (需 GROQ_API_KEY) 即可量測修剪前後逐字稿的 WER 漂移")
+
+def _serve_local(path):
+    """本機假 R2 + 假 STT：GET 回傳音檔，POST 分塊讀完請求體後丟棄"""
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *a): pass
+
+        def do_GET(self):
+            size = os.path.getsize(path)
+            self.send_response(200)
+            self.send_header("Content-Length", str(size))
+            self.end_headers()
+            with open(path, "rb") as f:
+                while chunk := f.read(256 * 1024): self.wfile.write(chunk)
+
+        def do_POST(self):
+            left = int(self.headers.get("Content-Length", 0))
+            while left > 0:
+                chunk = self.rfile.read(min(left, 256 * 1024))
+                if not chunk: break
+                left -= len(chunk)
+            self.send_response(200)
+            self.send_header("Content-Length", "2")
+            self.end_headers()
+            self.wfile.write(b"ok")
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+def _peak_rss_mb():
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024   # Linux 單位為 KB
+
+def _memory_probe(mode, base):
+    """子行程：量測單一路徑的峰值 RSS 增量 (先 import 完畢再取基準)"""
+    import httpx
+    from curl_cffi import requests
+    from src.pod_scra_intel_fetch import fetch_spooled
+    before = _peak_rss_mb()
+    if mode == "legacy":
+        audio_data = requests.get(f"{base}/audio.opus", timeout=120).content
+    else:
+        audio_data, _ = fetch_spooled(f"{base}/audio.opus", timeout=120)
+    with httpx.Client(timeout=120.0) as client:
+        client.post(f"{base}/stt", files={"file": ("audio.opus", audio_data, "audio/ogg")}, data={"model": "bench"})
+    if mode != "legacy": audio_data.close()
+    print(f"{_peak_rss_mb() - before:.1f}")
+
+def bench_memory(args):
+    import subprocess
+    if args.probe:
+        _memory_probe(args.probe, args.base); return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for size_mb in args.sizes:
+            path = os.path.join(tmp, "audio.opus")
+            with open(path, "wb") as f:
+                for _ in range(size_mb): f.write(os.urandom(1024 * 1024))
+            server, base = _serve_local(path)
+            try:
+                line = f"📼 {size_mb:>3}MB"
+                for mode in ("legacy", "spooled"):
+                    res = subprocess.run([sys.executable, "-m", "src.pod_scra_bench", "memory", "--probe", mode, "--base", base],
+                                         capture_output=True, text=True, timeout=600)
+                    peak = res.stdout.strip().splitlines()[-1] if res.returncode == 0 and res.stdout.strip() else "失敗"
+                    line += f" | {mode} 峰值增量 {peak} MB"
+                print(line)
+            finally:
+                server.shutdown()
+
+def bench_s3(args):
+    import boto3
+    from src.pod_scra_intel_s3pool import get_s3_client, make_transfer_config, MB
+
+    rounds = 5
+    t0 = time.time()
+    for _ in range(rounds):
+        boto3.client('s3', endpoint_url=os.environ.get("R2_ENDPOINT_URL") or "https://example.r2.cloudflarestorage.com",
+                     aws_access_key_id="bench", aws_secret_access_key="bench", region_name="auto")
+    fresh = (time.time() - t0) / rounds
+    get_s3_client()
+    t0 = time.time()
+    for _ in range(rounds): get_s3_client()
+    pooled = (time.time() - t0) / rounds
+    print(f"🔌 客戶端建立：每次新建 {fresh * 1000:.0f}ms | 共用連線池 {pooled * 1000:.3f}ms")
+
+    bucket = os.environ.get("R2_BUCKET_NAME")
+    if not (bucket and os.environ.get("R2_ENDPOINT_URL")):
+        print("💡 設定 R2_ENDPOINT_URL / R2_ACCESS_KEY_ID / R2_SECRET_ACCESS_KEY / R2_BUCKET_NAME 即可量測傳輸吞吐"); return
+
+    s3 = get_s3_client()
+    with tempfile.TemporaryDirectory() as tmp:
+        src, dst = os.path.join(tmp, "src.bin"), os.path.join(tmp, "dst.bin")
+        with open(src, "wb") as f:
+            for _ in range(args.size): f.write(os.urandom(MB))
+        for part_mb in args.parts:
+            cfg = make_transfer_config(part_mb * MB, args.concurrency)
+            key = f"bench/s3_{part_mb}mb_{int(time.time())}.bin"
+            try:
+                t0 = time.time(); s3.upload_file(src, bucket, key, Config=cfg); up = time.time() - t0
+                t0 = time.time(); s3.download_file(bucket, key, dst, Config=cfg); down = time.time() - t0
+                print(f"📦 分片 {part_mb:>2}MB x 併發 {args.concurrency} | 上傳 {args.size / up:.1f} MB/s | 下載 {args.size / down:.1f} MB/s")
+            finally:
+                try: s3.delete_object(Bucket=bucket, Key=key)
+                except Exception: pass
+
+def _serve_tls(tmp):
+    """本機 TLS 假供應商 (自簽憑證)：GET 一律回傳小型 JSON，模擬輪詢回應"""
+    import ssl, subprocess
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+    cert, key = os.path.join(tmp, "cert.pem"), os.path.join(tmp, "key.pem")
+    subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1", "-subj", "/CN=127.0.0.1",
+                    "-keyout", key, "-out", cert], check=True, capture_output=True)
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        def log_message(self, *a): pass
+
+        def do_GET(self):
+            body = b'{"status":"queued"}'
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    ctx.load_cert_chain(cert, key)
+    server.socket = ctx.wrap_socket(server.socket, server_side=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"https://127.0.0.1:{server.server_address[1]}/v2/jobs/bench"
+
+def bench_handshake(args):
+    import httpx
+    from src.pod_scra_intel_httppool import HTTP2_READY, POOL_LIMITS
+
+    with tempfile.TemporaryDirectory() as tmp:
+        server, url = (None, args.url) if args.url else _serve_tls(tmp)
+        verify = bool(args.url)
+        try:
+            def fresh():
+                with httpx.Client(timeout=30.0, verify=verify) as client:
+                    client.get(url)
+
+            pooled_client = httpx.Client(http2=HTTP2_READY, timeout=30.0, limits=POOL_LIMITS, verify=verify)
+            def pooled():
+                pooled_client.get(url)
+
+            results = {}
+            for name, fire in (("fresh", fresh), ("pooled", pooled)):
+                fire()   # 暖身 (DNS / 首次連線)
+                t0 = time.time()
+                for _ in range(args.jobs * args.requests): fire()
+                results[name] = (time.time() - t0) / (args.jobs * args.requests)
+            pooled_client.close()
+        finally:
+            if server: server.shutdown()
+
+    per_job = {k: v * args.requests for k, v in results.items()}
+    saved = per_job["fresh"] - per_job["pooled"]
+    print(f"🎯 目標 {url} | HTTP/2 {'啟用' if HTTP2_READY else '未安裝 h2'} | 每件工單 {args.requests} 個請求 x {args.jobs} 件")
+    print(f"🔌 每次新建客戶端：{results['fresh'] * 1000:.2f} ms/請求 | {per_job['fresh'] * 1000:.0f} ms/工單")
+    print(f"♻️ 供應商連線池：  {results['pooled'] * 1000:.2f} ms/請求 | {per_job['pooled'] * 1000:.0f} ms/工單")
+    print(f"⚡ 每件工單省下握手 {saved * 1000:.0f} ms ({saved / max(per_job['fresh'], 1e-9) * 100:.0f}%)")
+    if not args.url:
+        print("💡 本機迴路無網路延遲，實際省下的握手時間約再乘上 2~3 個 RTT；加上 --url 可量測真實供應商主機")
+
+def main():
+    parser = argparse.ArgumentParser(description="S-Plan 產線兵棋推演台")
+    sub = parser.add_subparsers(dest="target", required=True)
+
+    p = sub.add_parser("fingerprint", help="音紋計算耗時與相似度")
+    p.add_argument("--file", help="實際音檔 (本機路徑或網址)，省略則使用合成節目")
+    p.add_argument("--minutes", type=float, default=60, help="合成節目長度 (分鐘)")
+    p.set_defaults(func=bench_fingerprint)
+
+    p = sub.add_parser("trim", help="靜音/配樂修剪的剔除秒數與 WER 漂移")
+    p.add_argument("--corpus", required=True, help="樣本音檔目錄")
+    p.add_argument("--stt", choices=["none", "groq"], default="none", help="量測 WER 漂移所用的 STT 供應商")
+    p.set_defaults(func=bench_trim)
+
+    p = sub.add_parser("memory", help="取貨 + STT 上傳的峰值 RSS (舊路徑 vs 串流路徑)")
+    p.add_argument("--sizes", type=int, nargs="+", default=[5, 20, 50], help="測試檔案大小 (MB)")
+    p.add_argument("--probe", choices=["legacy", "spooled"], help=argparse.SUPPRESS)
+    p.add_argument("--base", help=argparse.SUPPRESS)
+    p.set_defaults(func=bench_memory)
+
+    p = sub.add_parser("s3", help="R2 客戶端建立耗時與各分片大小的傳輸吞吐")
+    p.add_argument("--size", type=int, default=64, help="測試檔案大小 (MB)")
+    p.add_argument("--parts", type=int, nargs="+", default=[5, 8, 16, 32], help="分片大小 (MB，R2 下限 5)")
+    p.add_argument("--concurrency", type=int, default=8, help="併發分片數")
+    p.set_defaults(func=bench_s3)
+
+    p = sub.add_parser("handshake", help="單件 STT 工單請求耗時 (每次新建客戶端 vs 供應商連線池)")
+    p.add_argument("--url", help="實際供應商端點 (例如 https://api.gladia.io/v2/transcription)，省略則用本機 TLS 假伺服器")
+    p.add_argument("--requests", type=int, default=32, help="每件工單的請求數 (送單 1 + 輪詢 30 + 取稿 1)")
+    p.add_argument("--jobs", type=int, default=3, help="模擬工單件數")
+    p.set_defaults(func=bench_handshake)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
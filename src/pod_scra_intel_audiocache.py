@@ -0,0 +1,106 @@
+# ---------------------------------------------------------
+# src/pod_scra_intel_audiocache.py (V6.31 節點音檔快取)
+# 職責：同一集音檔在單一節點上會被反覆自 R2 下載 (兵工廠取原檔、音紋比對、Groq 聽打、Gemini 摘要、
+#       NVIDIA 備援，重試時再全部重來)。本模組在本機磁碟維護以「R2 物件鍵 + ETag」定址的 LRU 快取，
+#       所有取貨路徑 (pod_scra_intel_fetch) 先查快取，未命中才下載並順手入庫。
+# [定址] 檔名 = sha1(物件鍵 | ETag)；物件被覆寫後 ETag 改變，舊版本自然失效並隨 LRU 淘汰。
+# [原子] 先寫入同目錄暫存檔，完成後 os.replace 就位；併發寫入同一檔以後到者為準，讀者永遠看到完整檔案。
+# [淘汰] 依檔案修改時間 (命中時 touch) 由舊到新刪除，直到總容量低於 AUDIO_CACHE_MAX_MB。
+# [統計] cache_stats()：hits / misses / bytes_saved / bytes_fetched / evictions (行程內累計)。
+# [相依] 本模組不引用任何 src 內部模組。
+# ---------------------------------------------------------
+import os, shutil, hashlib, tempfile, threading
+
+CACHE_DIR = os.environ.get("AUDIO_CACHE_DIR", os.path.join(tempfile.gettempdir(), "pod_scra_audio_cache"))
+CACHE_MAX_BYTES = int(float(os.environ.get("AUDIO_CACHE_MAX_MB", 512)) * 1024 * 1024)
+CACHE_ENABLED = CACHE_MAX_BYTES > 0
+
+_stats = {"hits": 0, "misses": 0, "bytes_saved": 0, "bytes_fetched": 0, "evictions": 0}
+_lock = threading.Lock()
+
+def _count(**delta):
+    with _lock:
+        for k, v in delta.items(): _stats[k] += v
+
+def cache_stats():
+    """行程內累計的快取統計 (複本)"""
+    with _lock:
+        return dict(_stats)
+
+def normalize_etag(etag):
+    """去除弱驗證前綴與引號 (S3 head_object 與公開網址 HEAD 的格式一致化)"""
+    if not etag: return None
+    etag = etag.strip()
+    if etag.startswith("W/"): etag = etag[2:]
+    return etag.strip('"') or None
+
+def _path_for(key, etag):
+    digest = hashlib.sha1(f"{key}|{normalize_etag(etag)}".encode("utf-8")).hexdigest()
+    return os.path.join(CACHE_DIR, f"{digest}.audio")
+
+def open_cached(key, etag):
+    """【查快取】命中回傳已開啟的檔案物件 (並 touch 以維持 LRU 順序)，未命中回傳 None"""
+    if not CACHE_ENABLED or not etag: return None
+    path = _path_for(key, etag)
+    try:
+        f = open(path, "rb")
+    except OSError:
+        _count(misses=1)
+        return None
+    try: os.utime(path)
+    except OSError: pass
+    _count(hits=1, bytes_saved=os.fstat(f.fileno()).st_size)
+    return f
+
+def store(key, etag, chunks=None, src_path=None):
+    """
+    【入庫】將下載分塊 (chunks) 或本機檔案 (src_path) 原子寫入快取，回傳就位後開啟的檔案物件。
+    下載端錯誤照常拋出；磁碟端錯誤 (空間不足等) 回傳 None，由呼叫端改走不經快取的路徑。
+    """
+    if not CACHE_ENABLED or not etag: return None
+    path = _path_for(key, etag)
+    tmp_path = None
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=CACHE_DIR, suffix=".part")
+        size = 0
+        with os.fdopen(fd, "wb") as out:
+            if src_path:
+                with open(src_path, "rb") as src: shutil.copyfileobj(src, out, 1024 * 1024)
+                size = out.tell()
+            else:
+                for chunk in chunks:
+                    if chunk:
+                        out.write(chunk)
+                        size += len(chunk)
+        os.replace(tmp_path, path)
+        tmp_path = None
+        f = open(path, "rb")
+    except OSError as e:
+        print(f"⚠️ [音檔快取] 入庫失敗，改走直接下載: {str(e)[:80]}")
+        return None
+    finally:
+        if tmp_path and os.path.exists(tmp_path): os.remove(tmp_path)
+    if not src_path: _count(bytes_fetched=size)
+    evict()
+    return f
+
+def evict(max_bytes=None):
+    """【淘汰】由最久未用開始刪除，直到總容量不超過上限 (已開啟的檔案不受影響)"""
+    max_bytes = CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    try:
+        entries = [e for e in os.scandir(CACHE_DIR) if e.name.endswith(".audio")]
+    except OSError:
+        return
+    stats = []
+    for e in entries:
+        try: stats.append((e.stat().st_mtime, e.stat().st_size, e.path))
+        except OSError: pass
+    total = sum(size for _, size, _ in stats)
+    for _, size, path in sorted(stats):
+        if total <= max_bytes: break
+        try:
+            os.remove(path)
+            _count(evictions=1)
+        except OSError: pass
+        total -= size
\ No newline at end of file
@@ -22,6 +22,13 @@
 #        "IDLE_GEARBOX": 4.0           # ⚙️ 隱蔽變速箱：非值勤時的巡邏降速齒輪
 # [V5.8 升級] 新增 GLOBAL_DOMAIN_BLACKLIST，集中管理下載伺服器黑名單。
 # [V5.9 升級] 新增 DOWNLOAD_LIMIT (總下載量) 與 MAX_SAME_DOMAIN (同網域併發上限)。
+# [V6.15 升級] 新增 DL_CONCURRENCY (跨網域平行下載車道數)，同網域仍依序搬運。
+# [V6.16 升級] 新增 STREAM_TO_R2：下載串流直灌 R2 Multipart，不再落地 /tmp。
+# [V6.19 升級] 新增 DL_TICK_BUDGET_SECONDS (單拍下載總預算) 與 DL_MIN_KBPS (測速哨兵的速率底線)。
+# [V6.20 升級] 新增 DL_SELECTION_MODE：FASTEST_FIRST 依網域戰情表「最短預估完工優先」選貨；NEWEST_FIRST 維持舊制。
+# [V6.27 升級] 新增 TRIM_SILENCE：兵工廠壓縮前剔除長靜音與片頭片尾配樂，減少計費音訊秒數。
+#              預設關閉 (配樂判定可能誤剪真人語音)，待 bench trim 的 WER 漂移驗證通過再逐面板開啟。
+# [V6.28 升級] 新增 STT_SEGMENT_MODE：重型任務切成 Groq 輕型分段平行聽打 (256MB 輕裝預設關閉)。
 # ---------------------------------------------------------
 import os
 from supabase import create_client
@@ -41,6 +48,13 @@ def get_tactical_panel(worker_id):
         "RADAR_FETCH_LIMIT": 50,
         "DOWNLOAD_LIMIT": 1,           # 📥 總下載配額
         "MAX_SAME_DOMAIN": 1,          # 🛡️ 同網域安全併發數
+        "DL_CONCURRENCY": 1,           # 🛣️ 跨網域平行下載車道數
+        "STREAM_TO_R2": True,          # 🌊 下載直灌 R2 (零落地)
+        "DL_TICK_BUDGET_SECONDS": 300, # ⏳ 單拍下載總預算
+        "DL_MIN_KBPS": 24,             # 🐌 低於此速率即判定泥沼
+        "DL_SELECTION_MODE": "FASTEST_FIRST",  # 🏁 選貨策略
+        "TRIM_SILENCE": False,         # ✂️ 壓縮前剔除靜音與片頭片尾配樂 (選配)
+        "STT_SEGMENT_MODE": False,     # 🧩 重型任務切段平行聽打
         "STT_LIMIT": 1,
         "SUMMARY_LIMIT": 1,
         "SAFE_DURATION_SECONDS": 600,
@@ -58,6 +72,13 @@ def get_tactical_panel(worker_id):
         "RADAR_FETCH_LIMIT": 100,
         "DOWNLOAD_LIMIT": 3,           # 📥 總下載配額
         "MAX_SAME_DOMAIN": 1,          # 🛡️ 同網域安全併發數。例如總下載2個，每個網域最多1個
+        "DL_CONCURRENCY": 2,           # 🛣️ 跨網域平行下載車道數
+        "STREAM_TO_R2": True,          # 🌊 下載直灌 R2 (零落地)
+        "DL_TICK_BUDGET_SECONDS": 600, # ⏳ 單拍下載總預算
+        "DL_MIN_KBPS": 32,             # 🐌 低於此速率即判定泥沼
+        "DL_SELECTION_MODE": "FASTEST_FIRST",  # 🏁 選貨策略
+        "TRIM_SILENCE": False,         # ✂️ 壓縮前剔除靜音與片頭片尾配樂 (選配)
+        "STT_SEGMENT_MODE": True,      # 🧩 重型任務切段平行聽打
         "STT_LIMIT": 3,
         "SUMMARY_LIMIT": 2,
         "SAFE_DURATION_SECONDS": 1500,
@@ -75,6 +96,13 @@ def get_tactical_panel(worker_id):
         "RADAR_FETCH_LIMIT": 100,
         "DOWNLOAD_LIMIT": 4,           # 📥 總下載配額 (重裝兵胃口較大)
         "MAX_SAME_DOMAIN": 2,          # 🛡️ 同網域安全併發數
+        "DL_CONCURRENCY": 3,           # 🛣️ 跨網域平行下載車道數
+        "STREAM_TO_R2": True,          # 🌊 下載直灌 R2 (零落地)
+        "DL_TICK_BUDGET_SECONDS": 900, # ⏳ 單拍下載總預算
+        "DL_MIN_KBPS": 24,             # 🐌 低於此速率即判定泥沼
+        "DL_SELECTION_MODE": "FASTEST_FIRST",  # 🏁 選貨策略
+        "TRIM_SILENCE": False,         # ✂️ 壓縮前剔除靜音與片頭片尾配樂 (選配)
+        "STT_SEGMENT_MODE": True,      # 🧩 重型任務切段平行聽打
         "STT_LIMIT": 5,
         "SUMMARY_LIMIT": 3,
         "SAFE_DURATION_SECONDS": 1500,
@@ -92,6 +120,13 @@ def get_tactical_panel(worker_id):
         "RADAR_FETCH_LIMIT": 100,
         "DOWNLOAD_LIMIT": 3,           # 📥 總下載配額
         "MAX_SAME_DOMAIN": 2,          # 🛡️ 同網域安全併發數
+        "DL_CONCURRENCY": 2,           # 🛣️ 跨網域平行下載車道數
+        "STREAM_TO_R2": True,          # 🌊 下載直灌 R2 (零落地)
+        "DL_TICK_BUDGET_SECONDS": 900, # ⏳ 單拍下載總預算
+        "DL_MIN_KBPS": 24,             # 🐌 低於此速率即判定泥沼
+        "DL_SELECTION_MODE": "FASTEST_FIRST",  # 🏁 選貨策略
+        "TRIM_SILENCE": False,         # ✂️ 壓縮前剔除靜音與片頭片尾配樂 (選配)
+        "STT_SEGMENT_MODE": True,      # 🧩 重型任務切段平行聽打
         "STT_LIMIT": 5,
         "SUMMARY_LIMIT": 0,            
         "SAFE_DURATION_SECONDS": 1500,
@@ -109,6 +144,13 @@ def get_tactical_panel(worker_id):
         "RADAR_FETCH_LIMIT": 100,
         "DOWNLOAD_LIMIT": 5,           # 📥 總下載配額 (兵工廠專司下載與壓縮)
         "MAX_SAME_DOMAIN": 2,          # 🛡️ 同網域安全併發數
+        "DL_CONCURRENCY": 3,           # 🛣️ 跨網域平行下載車道數
+        "STREAM_TO_R2": True,          # 🌊 下載直灌 R2 (零落地)
+        "DL_TICK_BUDGET_SECONDS": 900, # ⏳ 單拍下載總預算
+        "DL_MIN_KBPS": 32,             # 🐌 低於此速率即判定泥沼
+        "DL_SELECTION_MODE": "FASTEST_FIRST",  # 🏁 選貨策略
+        "TRIM_SILENCE": False,         # ✂️ 壓縮前剔除靜音與片頭片尾配樂 (選配)
+        "STT_SEGMENT_MODE": True,      # 🧩 重型任務切段平行聽打
         "STT_LIMIT": 2,                 
         "SUMMARY_LIMIT": 2,            
         "SAFE_DURATION_SECONDS": 1500,
@@ -8,24 +8,48 @@
 # 3. 歸檔標記：TG 戰報標題強制鑲嵌 [任務ID前8碼]，精準對位 HuggingFace 歸檔庫。
 # [V6.5 重大升級] 全面接軌 stt_router.py 聯合火力網。
 # 徹底移除原有的 STT 決策叢林 (NVIDIA/GROQ/GEMINI)，改為單一呼叫 execute_stt_routing。256MB小機器 攜帶網址聽打。
+# [V6.23 升級] 內容定址去重：壓縮與聽打成品回填 pod_scra_audio_index，同內容音檔日後直接掛回。
+# [V6.24 升級] 音紋重播偵測：聽打前比對地標音紋，換廣告重播的舊集數直接沿用舊逐字稿，免打 STT。
+# [V6.25 升級] 壓縮非同步送廠：待壓任務一次送進壓縮車道 (轉檔勤務中心定編)，STT 照常開打，
+#              壓縮成品隨完隨收，不再「壓完一件才打下一件」。
+# [V6.26 升級] 壓縮成品回填 opus_profile / audio_duration_sec / opus_bytes_per_sec，大小改用本地實測值。
+# [V6.27 升級] 面板 TRIM_SILENCE 開啟時，壓縮前剔除靜音與配樂，回填 trim_seconds_saved / trim_map。
+# [V6.28 升級] 面板 STT_SEGMENT_MODE 開啟時，重型任務交由 Router 分段平行聽打。
+# [V6.31 升級] 音紋比對改讀節點音檔快取 (順手預熱，後續 Groq 聽打直接命中)，收工時回報快取命中統計。
+# [V6.33 升級] STT 拆成送單 / 收件兩階段：重型區送單落帳後標記 STT-wait 即換下一件，
+#              每輪開工先巡邏在途工單收件；有在途工單的任務不重複送單。
+# [V6.34 升級] 收件改由事件迴圈收件中心 (pod_scra_intel_sttpoller) 於送單後的剩餘時限內併行輪詢，
+#              STT_LIMIT 即在途工單數 N；遠端在途額滿時撤回預佔、任務延後。
+# [V6.36 升級] 將實測片長交給 Router，STT 額度改以音訊秒數原子預留 / 結算。
+# [V6.39 升級] 逐字稿快取：聽打成功即以「音檔雜湊 + 語言」存入 pod_scra_stt_transcripts；
+#              任務被重置或重新下載後，壓縮與聽打前先查快取，命中即直接進入 Sum.-pre，零供應商秒數。
 # ---------------------------------------------------------
 
 import os, time, random, gc, base64, re 
 from datetime import datetime, timezone          
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from curl_cffi import requests 
 from src.pod_scra_intel_control import get_tactical_panel, get_sb, get_secrets 
 from src.pod_scra_intel_groqcore import GroqFallbackAgent
 from src.pod_scra_intel_nvidiacore import NvidiaAgent  
 
 # 🚀 匯入全新的 STT 火力協調中心
-from src.pod_scra_intel_stt_router import execute_stt_routing
+from src.pod_scra_intel_stt_router import execute_stt_routing, TEXT_PROVIDERS
+from src.pod_scra_intel_sttjobs import STT_WAIT_STATUS, live_job
+from src.pod_scra_intel_sttpoller import run_stt_poller
+from src.pod_scra_intel_dedup import attach_artifact, copy_transcript
+from src.pod_scra_intel_sttcache import store_transcript, restore_transcript
+from src.pod_scra_intel_fingerprint import FINGERPRINT_READY, fingerprint_audio, find_rerun, register_fingerprint
+from src.pod_scra_intel_transcoder import get_transcoder
+from src.pod_scra_intel_fetch import cached_path
+from src.pod_scra_intel_audiocache import cache_stats
 
 try:
     from src.pod_scra_intel_r2 import compress_task_to_opus  
 except ImportError:
-    def compress_task_to_opus(task_id, r2_url):
+    def compress_task_to_opus(task_id, r2_url, trim=False, mem_tier=None):
         print("⚠️ [系統] 本機甲未配備 R2 壓縮模組，強制略過壓縮作業。")
-        return False, r2_url
+        return False, r2_url, None
 
 from src.pod_scra_intel_techcore import (
     fetch_stt_tasks, fetch_summary_tasks, upsert_intel_status, 
@@ -33,6 +57,79 @@ from src.pod_scra_intel_techcore import (
     call_gemini_summary, send_tg_report, increment_soft_failure
 )
 
+HEAVY_STT_WORKERS = ["HUGGINGFACE", "DBOS", "AUDIO_EAT", "RAILWAY"]
+
+def _finish_compression(sb, s, task, success, new_url, meta, worker_id):
+    """【壓縮收貨】成品入帳：回報大小與壓縮規格、移交 T2，失敗則軟失敗 +1"""
+    task_id = task['id']
+    if not success:
+        increment_soft_failure(sb, task_id)
+        return
+    meta = dict(meta or {})
+    size_bytes = meta.pop("size_bytes", None)
+    compressed_size_mb = size_bytes / (1024 * 1024) if size_bytes else 5
+    if not size_bytes:
+        try:
+            head_req = requests.head(f"{s['R2_URL']}/{new_url}", timeout=10)
+            if head_req.status_code == 200 and 'Content-Length' in head_req.headers:
+                compressed_size_mb = int(head_req.headers['Content-Length']) / (1024 * 1024)
+        except: pass
+
+    update_payload = {"r2_url": new_url, "audio_ext": ".opus", "audio_size_mb": round(compressed_size_mb, 1), **meta}
+    if compressed_size_mb < 50.0:
+        update_payload["assigned_troop"] = "T2"
+        update_payload["troop2_start_at"] = datetime.now(timezone.utc).isoformat()
+        update_payload["scrape_status"] = "completed"
+
+    sb.table("mission_queue").update(update_payload).eq("id", task_id).execute()
+    task['r2_url'] = new_url
+    attach_artifact(sb, task.get('audio_sha256'), opus_key=new_url)
+    print(f"🏭 [{worker_id}] 壓縮收貨: {task_id[:8]} -> {new_url} ({compressed_size_mb:.1f}MB, {meta.get('opus_profile', '?')})")
+
+def _harvest_compressions(sb, s, lane_jobs, worker_id, wait=False):
+    """收取已完工的壓縮件 (wait=True 時等候全部完工)"""
+    done = as_completed(list(lane_jobs)) if wait else [f for f in list(lane_jobs) if f.done()]
+    for fut in done:
+        task = lane_jobs.pop(fut)
+        try:
+            success, new_url, meta = fut.result()
+            _finish_compression(sb, s, task, success, new_url, meta, worker_id)
+        except Exception as e:
+            print(f"💥 [{worker_id}] 壓縮收貨失敗 {task['id'][:8]}: {e}")
+            increment_soft_failure(sb, task['id'])
+
+def _report_cache(worker_id):
+    """節點音檔快取戰果 (行程內累計)"""
+    st = cache_stats()
+    if st["hits"] or st["misses"]:
+        print(f"📦 [{worker_id}] 音檔快取: 命中 {st['hits']} / 未命中 {st['misses']} | "
+              f"省下 {st['bytes_saved'] / 1048576:.1f}MB | 淘汰 {st['evictions']}")
+
+def _stt_job_done(sb, job, stt_text, worker_id):
+    """【收件入帳】逐字稿寫入 mission_intel (Sum.-pre)，與同步路徑的成功收尾一致"""
+    task_id = job['task_id']
+    upsert_intel_status(sb, task_id, "Sum.-pre", provider=job['provider'], stt_text=stt_text)
+    try:
+        row = sb.table("mission_queue").select("audio_sha256, audio_duration_sec").eq("id", task_id).single().execute().data or {}
+        attach_artifact(sb, row.get('audio_sha256'), stt_task_id=task_id)
+        store_transcript(sb, row.get('audio_sha256'), stt_text, job['provider'], task_id, row.get('audio_duration_sec'))
+    except Exception: pass
+    sb.table("mission_queue").update({"soft_failure_count": 0}).eq("id", task_id).execute()
+    print(f"📬 [{worker_id}] 收件成功：{str(task_id)[:8]} 由 {job['provider']} 完成 (工單 #{job['id']})")
+
+def _stt_job_failed(sb, job, reason, worker_id):
+    """【退件】撤除 STT-wait，任務回到雷達重新路由 (已失敗的供應商會被略過)"""
+    delete_intel_task(sb, job['task_id'])
+    print(f"📪 [{worker_id}] 工單 #{job['id']} ({job['provider']}) 失敗: {str(reason)[:80]}，任務重新排隊。")
+
+def _harvest_stt_jobs(sb, s, worker_id, budget_sec):
+    """【收件階段】事件迴圈併行輪詢在途工單：完工即入帳、失敗/逾時退件，帳本清空或時限到即收工"""
+    stats = run_stt_poller(sb, s, worker_id, budget_sec, _stt_job_done, _stt_job_failed)
+    if stats["polls"]:
+        print(f"📮 [{worker_id}] 收件中心收工：完工 {stats['done']} / 退件 {stats['failed']} | "
+              f"輪詢 {stats['polls']} 次 | 耗時 {stats['seconds']}s")
+    return stats["done"]
+
 # 🎤 第一棒：Audio to STT (Router 接管版)
 # =========================================================
 def run_audio_to_stt_mission(sb=None):
@@ -50,18 +147,19 @@ def run_audio_to_stt_mission(sb=None):
     tasks = fetch_stt_tasks(sb, panel["MEM_TIER"], worker_id, fetch_limit=panel["RADAR_FETCH_LIMIT"])
     if not tasks: 
         print(f"🛌 [{worker_id}] 目前無適合體量之任務。")
+        _harvest_stt_jobs(sb, s, worker_id, panel["SAFE_DURATION_SECONDS"] - (time.time() - start_time))
         return
 
     actual_processed = 0 
+    stt_fired = 0
+    # 🏭 [V6.25] 壓縮車道：車道數與轉檔勤務中心工人數一致，每件壓縮佔用一個 STT_LIMIT 名額
+    lane_jobs = {}
+    lane = ThreadPoolExecutor(max_workers=get_transcoder(panel["MEM_TIER"]).max_workers) if panel["CAN_COMPRESS"] else None
     
     for task in tasks:
         if actual_processed >= panel["STT_LIMIT"]: break 
         if time.time() - start_time > panel["SAFE_DURATION_SECONDS"]: break
-
-        if actual_processed > 0:
-            delay = random.uniform(2.0, 5.0)
-            print(f"⏳ [{worker_id}] 戰術冷卻 {delay:.1f} 秒...")
-            time.sleep(delay)
+        if lane_jobs: _harvest_compressions(sb, s, lane_jobs, worker_id)
 
         task_id = task['id']
         r2_url = str(task.get('r2_url') or '').lower()
@@ -69,53 +167,49 @@ def run_audio_to_stt_mission(sb=None):
         current_fails = task.get('soft_failure_count') or 0
         
         if r2_url.endswith('.opus') and current_size > 30.0: 
-            if worker_id not in ["HUGGINGFACE", "DBOS", "AUDIO_EAT", "RAILWAY"]: continue
+            if worker_id not in HEAVY_STT_WORKERS: continue
             
         if not r2_url.endswith('.opus') and current_size > 85.0:
-            if worker_id not in ["HUGGINGFACE", "DBOS", "AUDIO_EAT", "RAILWAY"]: continue
+            if worker_id not in HEAVY_STT_WORKERS: continue
+
+        # 📮 [V6.33] 已有在途工單的任務不得重複送單 (避免同段音訊付費兩次)
+        if live_job(sb, task_id): continue
 
         print(f"🎯 [{worker_id}] 鎖定目標: {task.get('source_name')} (大小: {current_size}MB)")
 
         try:
-            is_compressed_now = False 
-            if not panel["CAN_COMPRESS"] and (r2_url.endswith('.mp3') or r2_url.endswith('.m4a')): continue
-            if panel["CAN_COMPRESS"] and (r2_url.endswith('.mp3') or r2_url.endswith('.m4a')):
-                success, new_url = compress_task_to_opus(task_id, task['r2_url'])
-                if success:
-                    is_compressed_now = True
-                    r2_url = new_url.lower() 
-                    compressed_size_mb = 5 
-                    try:
-                        head_req = requests.head(f"{s['R2_URL']}/{new_url}", timeout=10)
-                        if head_req.status_code == 200 and 'Content-Length' in head_req.headers:
-                            compressed_size_mb = int(head_req.headers['Content-Length']) / (1024 * 1024)
-                    except: pass
-
-                    update_payload = {"r2_url": new_url, "audio_ext": ".opus", "audio_size_mb": round(compressed_size_mb, 1)}
-                    if compressed_size_mb < 50.0:
-                        update_payload["assigned_troop"] = "T2"
-                        update_payload["troop2_start_at"] = datetime.now(timezone.utc).isoformat()
-                        update_payload["scrape_status"] = "completed"
-
-                    sb.table("mission_queue").update(update_payload).eq("id", task_id).execute()
-                    task['r2_url'] = new_url
-                    
-                    if compressed_size_mb > 14.0 and worker_id not in ["HUGGINGFACE", "DBOS", "AUDIO_EAT", "RAILWAY"]:
-                        actual_processed += 1
-                        continue 
-                    if panel.get("COMPRESS_ONLY"):
-                        actual_processed += 1
-                        continue 
-                else:
-                    increment_soft_failure(sb, task_id)
-                    continue 
+            # 🗃️ [V6.39] 逐字稿快取：同內容音檔已聽打過 (任務重置 / 重新下載)，免壓縮、免 STT
+            saved_sec = restore_transcript(sb, task_id, task.get('audio_sha256'), worker_id=worker_id)
+            if saved_sec is not None:
+                sb.table("mission_queue").update({"soft_failure_count": 0}).eq("id", task_id).execute()
+                print(f"🗃️ [{worker_id}] 逐字稿快取命中 {task_id[:8]}，省下 {saved_sec / 60:.0f} 分鐘聽打。")
+                actual_processed += 1
+                continue
 
-            if is_compressed_now:
+            if r2_url.endswith('.mp3') or r2_url.endswith('.m4a'):
+                if not panel["CAN_COMPRESS"]: continue
+                # 🏭 [V6.25] 非同步送廠，成品於後續迴圈或收工時收貨
+                lane_jobs[lane.submit(compress_task_to_opus, task_id, task['r2_url'], panel.get("TRIM_SILENCE", False), panel["MEM_TIER"])] = task
                 actual_processed += 1
                 continue 
 
             if not r2_url.endswith('.opus'): continue
 
+            if stt_fired > 0:
+                delay = random.uniform(2.0, 5.0)
+                print(f"⏳ [{worker_id}] 戰術冷卻 {delay:.1f} 秒...")
+                time.sleep(delay)
+
+            # 🎼 [V6.24] 重播偵測：音紋命中已聽打的舊集數，直接沿用逐字稿
+            audio_url = f"{s['R2_URL']}/{task['r2_url']}"
+            fp = fingerprint_audio(cached_path(audio_url) or audio_url) if FINGERPRINT_READY else None
+            rerun = find_rerun(sb, fp, task_id)
+            if rerun and copy_transcript(sb, rerun['task_id'], task_id):
+                sb.table("mission_queue").update({"rerun_of": rerun['task_id'], "soft_failure_count": 0}).eq("id", task_id).execute()
+                print(f"🎼 [{worker_id}] 重播偵測命中 {str(rerun['task_id'])[:8]} (相似度 {rerun['score']:.2f})，免打 STT。")
+                actual_processed += 1
+                continue
+
             # 🚀 [V6.5 核心換裝] 呼叫 STT 火控中心
             print(f"🔒 [{worker_id}] 執行第一棒預佔，移交 STT Router 聯合火力網...")
             upsert_intel_status(sb, task_id, "Sum.-proc", "STT_ROUTER")
@@ -123,9 +217,31 @@ def run_audio_to_stt_mission(sb=None):
 
             # 🎲 Router 會自動處理 Groq -> Gladia -> Speechmatics 的輪詢
             # 💡 傳入 current_size，啟動資源感知防護網
-            stt_text, chosen_provider, errors = execute_stt_routing(sb, r2_url, current_size)
+            stt_fired += 1
+            # 💸 [V6.36] 額度帳本以實測片長扣帳 (音紋片長 > 壓縮探測片長 > Router 依大小估算)
+            audio_sec = (fp or {}).get("duration_sec") or task.get("audio_duration_sec")
+            stt_text, chosen_provider, errors = execute_stt_routing(sb, r2_url, current_size, segment=panel.get("STT_SEGMENT_MODE", False),
+                                                                    task_id=task_id, audio_sec=audio_sec)
+
+            if stt_text is None and chosen_provider is None:
+                # 🚦 [V6.34] 遠端供應商在途額滿：撤回預佔，下一輪再送
+                delete_intel_task(sb, task_id)
+                sb.table("mission_queue").update({"soft_failure_count": current_fails}).eq("id", task_id).execute()
+                print(f"🚦 [{worker_id}] 遠端在途額滿，任務 {task_id[:8]} 延後。")
+                continue
+
+            if stt_text is None:
+                # 📮 [V6.33] 遠端工單已落帳：標記 STT-wait，由收件階段回收，不佔用本執行緒
+                upsert_intel_status(sb, task_id, STT_WAIT_STATUS, provider=chosen_provider)
+                register_fingerprint(sb, task_id, fp)
+                print(f"📮 [{worker_id}] 已送單 {chosen_provider}，任務 {task_id[:8]} 轉入收件階段。")
+                actual_processed += 1
+                continue
 
             upsert_intel_status(sb, task_id, "Sum.-pre", provider=chosen_provider, stt_text=stt_text)
+            attach_artifact(sb, task.get('audio_sha256'), stt_task_id=task_id)
+            store_transcript(sb, task.get('audio_sha256'), stt_text, chosen_provider, task_id, audio_sec)
+            register_fingerprint(sb, task_id, fp)
             print(f"✅ [{worker_id}] STT 轉譯成功，由 {chosen_provider} 完成任務！")
 
             sb.table("mission_queue").update({"soft_failure_count": 0}).eq("id", task_id).execute()
@@ -143,6 +259,14 @@ def run_audio_to_stt_mission(sb=None):
         finally:
             gc.collect()
 
+    # 🏭 收工前等候壓縮車道全數完工
+    if lane:
+        _harvest_compressions(sb, s, lane_jobs, worker_id, wait=True)
+        lane.shutdown(wait=True)
+    # 📬 [V6.34] 剩餘時限交給收件中心，併行回收本輪與友軍送出的遠端工單
+    _harvest_stt_jobs(sb, s, worker_id, panel["SAFE_DURATION_SECONDS"] - (time.time() - start_time))
+    _report_cache(worker_id)
+
 # ✍️ 第二棒：STT to Summary 
 # =========================================================
 def run_stt_to_summary_mission(sb=None):
@@ -188,7 +312,7 @@ def run_stt_to_summary_mission(sb=None):
             upsert_intel_status(sb, task_id, "Sum.-proc", provider)
             sb.table("mission_queue").update({"soft_failure_count": current_fails + 1}).eq("id", task_id).execute()
 
-            is_text_transcript = (provider in ["GROQ", "NVIDIA", "GLADIA", "SPEECHMATICS"]) # 💡 加入新供應商
+            is_text_transcript = (provider in TEXT_PROVIDERS) # 💡 供應商清單統一由 Router 維護 (含分段縫合 GROQ_SEG)
             target_r2_url = q_data.get('r2_url')
             
             if is_text_transcript:
@@ -258,4 +382,6 @@ def run_stt_to_summary_mission(sb=None):
                 sb.table("mission_queue").update({"soft_failure_count": current_fails}).eq("id", task_id).execute()
         
         finally:
-            gc.collect()
\ No newline at end of file
+            gc.collect()
+
+    _report_cache(worker_id)
\ No newline at end of file
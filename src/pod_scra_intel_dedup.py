@@ -0,0 +1,99 @@
+# ---------------------------------------------------------
+# src/pod_scra_intel_dedup.py (V6.23 內容定址去重)
+# 職責：以下載串流同步計算的 SHA-256 作為音檔身分證，於 pod_scra_audio_index 記錄
+#       「雜湊 -> 原檔 R2 鍵 / Opus 鍵 / 逐字稿任務」。同一集換了網址 (追蹤前綴、Feed 搬家) 重新上架時，
+#       直接掛回既有成品，省下入庫、兵工廠回頭下載、壓縮與 STT 聽打。
+# [戰果] 每次命中累計 hit_count / bytes_saved / stt_passes_saved，並寫入 pod_scra_log (DEDUP_SAVED)。
+# [容錯] 索引讀寫失敗一律視為未命中，絕不阻斷搬運主流程。
+# [V6.39 升級] 原逐字稿任務的 mission_intel 已被刪除 (或命中的是自己) 時，改由逐字稿快取取回。
+# ---------------------------------------------------------
+from datetime import datetime, timezone
+from src.pod_scra_intel_sttcache import restore_transcript
+
+INDEX_TABLE = "pod_scra_audio_index"
+
+def lookup_audio(sb, sha256):
+    """查詢雜湊索引，回傳索引列或 None"""
+    if not sha256: return None
+    try:
+        res = sb.table(INDEX_TABLE).select("*").eq("sha256", sha256).execute()
+        return res.data[0] if res.data else None
+    except Exception as e:
+        print(f"⚠️ [去重索引] 查詢失敗，視為未命中: {str(e)[:80]}")
+        return None
+
+def register_audio(sb, sha256, size_bytes, task_id, r2_key=None, opus_key=None):
+    """登錄新音檔 (已存在則不覆寫，保留最早的成品指向)"""
+    if not sha256: return
+    row = {"sha256": sha256, "size_bytes": size_bytes, "first_task_id": task_id,
+           "r2_key": r2_key, "opus_key": opus_key}
+    try:
+        sb.table(INDEX_TABLE).upsert(row, on_conflict="sha256", ignore_duplicates=True).execute()
+    except Exception as e:
+        print(f"⚠️ [去重索引] 登錄失敗: {str(e)[:80]}")
+
+def attach_artifact(sb, sha256, **fields):
+    """補登衍生成品 (opus_key / stt_task_id)"""
+    if not sha256 or not fields: return
+    fields["updated_at"] = datetime.now(timezone.utc).isoformat()
+    try:
+        sb.table(INDEX_TABLE).update(fields).eq("sha256", sha256).execute()
+    except Exception as e:
+        print(f"⚠️ [去重索引] 成品補登失敗: {str(e)[:80]}")
+
+def copy_transcript(sb, src_task_id, task_id):
+    """將既有逐字稿複製給新任務 (mission_intel 進入 Sum.-pre)，成功回傳 True"""
+    if not src_task_id or src_task_id == task_id: return False
+    try:
+        src = sb.table("mission_intel").select("stt_text, ai_provider").eq("task_id", src_task_id).execute()
+        if not (src.data and src.data[0].get("stt_text")): return False
+        sb.table("mission_intel").upsert({
+            "task_id": task_id, "intel_status": "Sum.-pre",
+            "ai_provider": src.data[0].get("ai_provider"), "stt_text": src.data[0]["stt_text"]
+        }, on_conflict="task_id").execute()
+        return True
+    except Exception as e:
+        print(f"⚠️ [去重索引] 逐字稿複製失敗，交回 STT 產線: {str(e)[:80]}")
+        return False
+
+def apply_dedup_hit(sb, task_id, entry, size_bytes, worker_id="UNKNOWN", upload_skipped=True):
+    """
+    【去重命中】將任務直接指向既有成品：有 Opus 就給 Opus，有逐字稿就複製進 mission_intel (Sum.-pre)。
+    upload_skipped=False 表示本次入庫上傳已經發生 (串流直灌 R2 後才比對雜湊)，不計入省下的搬運量。
+    回傳本次省下的 (位元組數, STT 次數)。
+    """
+    target_key = entry.get("opus_key") or entry.get("r2_key")
+    payload = {"scrape_status": "completed", "r2_url": target_key, "dl_soft_failure_count": 0,
+               "audio_sha256": entry["sha256"]}
+    if entry.get("opus_key"): payload["audio_ext"] = ".opus"
+    sb.table("mission_queue").update(payload).eq("id", task_id).execute()
+
+    # 📦 省下的搬運量：本次入庫上傳 (僅落地模式確實跳過) + (若已有 Opus) 兵工廠回頭下載原檔
+    bytes_saved = size_bytes * ((1 if upload_skipped else 0) + (1 if entry.get("opus_key") else 0))
+    copied = copy_transcript(sb, entry.get("stt_task_id"), task_id) or \
+             restore_transcript(sb, task_id, entry["sha256"], worker_id=worker_id) is not None
+    stt_saved = 1 if copied else 0
+
+    attach_artifact(sb, entry["sha256"],
+                    hit_count=(entry.get("hit_count") or 0) + 1,
+                    bytes_saved=(entry.get("bytes_saved") or 0) + bytes_saved,
+                    stt_passes_saved=(entry.get("stt_passes_saved") or 0) + stt_saved)
+    try:
+        sb.table("pod_scra_log").insert({
+            "worker_id": worker_id, "task_type": "DEDUP_SAVED", "status": "INFO",
+            "message": f"♻️ [{str(task_id)[:8]}] 命中 {entry['sha256'][:12]}，省下 {bytes_saved / 1048576:.1f}MB 搬運"
+                       f"{' 與 1 次 STT' if stt_saved else ''}"
+        }).execute()
+    except Exception: pass
+    return bytes_saved, stt_saved
+
+def dedup_savings_report(sb):
+    """【戰果統計】彙總去重累計省下的搬運量與 STT 次數"""
+    res = sb.table(INDEX_TABLE).select("hit_count, bytes_saved, stt_passes_saved").gt("hit_count", 0).execute()
+    rows = res.data or []
+    return {
+        "deduped_audio": len(rows),
+        "hits": sum(r.get("hit_count") or 0 for r in rows),
+        "mb_saved": round(sum(r.get("bytes_saved") or 0 for r in rows) / 1048576, 1),
+        "stt_passes_saved": sum(r.get("stt_passes_saved") or 0 for r in rows),
+    }
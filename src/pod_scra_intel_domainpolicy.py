@@ -0,0 +1,172 @@
+# ---------------------------------------------------------
+# src/pod_scra_intel_domainpolicy.py (V6.22 網域禁區快取)
+# 職責：全軍共用的網域禁區判定元件 (主力物流拍與 GitHub 物流兵共用)。
+#       1. 首次載入 pod_scra_rules 有效規則，之後依 TTL 以 created_at 游標增量補貨，定期全量校正。
+#       2. 以「反轉標籤字尾樹」(com -> libsyn -> traffic) 判定封鎖，成本與網域標籤數成正比，與規則數量無關。
+#       3. 局中封鎖 (403/401/429) 先寫入本地快取立即生效，累積後批次寫回資料庫。
+# [語意] 規則網域封鎖其自身與所有子網域 (libsyn.com 同時封鎖 traffic.libsyn.com)。
+# [範圍] rule_scope="root" 時規則一律收斂為主網域 (沿用 GitHub 物流兵 a.libsyn.com -> libsyn.com 的慣例)。
+# [相依] 本模組不引用任何 src 內部模組，GHA 腳本可直接 import。
+# ---------------------------------------------------------
+import time, threading
+from datetime import datetime, timezone, timedelta
+from urllib.parse import urlparse
+
+RULES_TABLE = "pod_scra_rules"
+_FOREVER = float("inf")
+_MARK = "$"
+
+def normalize_host(value):
+    """將網址或 netloc 正規化為小寫主機名稱 (去除帳密與連接埠)"""
+    value = (value or "").strip().lower()
+    if "://" in value:
+        value = urlparse(value).netloc
+    value = value.split("/")[0].split("@")[-1].split(":")[0]
+    return value.strip(".")
+
+def root_domain(host):
+    """提取主網域，將 a.libsyn.com 和 b.libsyn.com 歸類為相同的 libsyn.com"""
+    parts = normalize_host(host).split(".")
+    return ".".join(parts[-2:]) if len(parts) > 2 else ".".join(parts)
+
+def _parse_ts(value):
+    if not value: return _FOREVER
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return _FOREVER
+
+class DomainPolicy:
+    """
+    【網域禁區】反轉標籤字尾樹 + 增量刷新快取。
+    每個節點以 {worker_id: 到期時間戳} 記錄封鎖，查詢時沿主機名稱標籤由頂級網域往下走訪。
+    """
+    def __init__(self, worker_ids=None, ttl_seconds=300, full_refresh_seconds=3600, rule_scope="host"):
+        self.worker_ids = list(worker_ids) if worker_ids else None
+        self.ttl_seconds = ttl_seconds
+        self.full_refresh_seconds = full_refresh_seconds
+        self.rule_scope = rule_scope
+        self.lock = threading.RLock()
+        self._reset()
+        self.pending = []
+
+    def _reset(self):
+        self.root = {}
+        self.rules = {}          # (domain, worker_id) -> 到期時間戳，供列舉與 RPC 傳遞
+        self.cursor = None       # 已載入規則中最新的 created_at
+        self.last_refresh = 0.0
+        self.last_full = 0.0
+
+    # -----------------------------------------------------
+    # 🌲 字尾樹
+    # -----------------------------------------------------
+    def _scoped(self, domain):
+        host = normalize_host(domain)
+        return root_domain(host) if self.rule_scope == "root" else host
+
+    def _insert(self, domain, worker_id, expires_ts):
+        domain = self._scoped(domain)
+        if not domain: return
+        node = self.root
+        for label in reversed(domain.split(".")):
+            node = node.setdefault(label, {})
+        marks = node.setdefault(_MARK, {})
+        if expires_ts > marks.get(worker_id, 0):
+            marks[worker_id] = expires_ts
+            self.rules[(domain, worker_id)] = expires_ts
+
+    def is_blocked(self, host, worker_id="ALL", now=None):
+        """判定主機是否對此機甲封鎖中：O(標籤數)"""
+        now = now or time.time()
+        node = self.root
+        with self.lock:
+            for label in reversed(normalize_host(host).split(".")):
+                node = node.get(label)
+                if node is None: return False
+                marks = node.get(_MARK)
+                if marks and (marks.get(worker_id, 0) > now or marks.get("ALL", 0) > now):
+                    return True
+        return False
+
+    def active_domains(self, worker_id="ALL", now=None):
+        """列舉對此機甲仍有效的封鎖網域 (供伺服端選貨 RPC 使用)"""
+        now = now or time.time()
+        with self.lock:
+            return sorted({d for (d, w), exp in self.rules.items() if w in (worker_id, "ALL") and exp > now})
+
+    def add_static(self, domains, worker_id="ALL"):
+        """掛載永久規則 (例如面板的 GLOBAL_DOMAIN_BLACKLIST)"""
+        with self.lock:
+            for d in domains or []:
+                self._insert(d, worker_id, _FOREVER)
+
+    # -----------------------------------------------------
+    # 🔄 增量刷新
+    # -----------------------------------------------------
+    def refresh(self, sb, force=False):
+        now = time.time()
+        if not force and now - self.last_refresh < self.ttl_seconds: return
+        full = force or self.cursor is None or now - self.last_full > self.full_refresh_seconds
+        try:
+            query = sb.table(RULES_TABLE).select("domain, worker_id, expired_at, created_at")
+            if self.worker_ids: query = query.in_("worker_id", self.worker_ids)
+            if full:
+                query = query.gte("expired_at", datetime.now(timezone.utc).isoformat())
+            else:
+                query = query.gt("created_at", self.cursor)
+            rows = query.execute().data or []
+        except Exception as e:
+            print(f"⚠️ [網域禁區] 規則刷新失敗，沿用快取: {str(e)[:80]}")
+            self.last_refresh = now
+            return
+
+        with self.lock:
+            if full:
+                static = {k: v for k, v in self.rules.items() if v == _FOREVER}
+                self._reset()
+                for (d, w), exp in static.items(): self._insert(d, w, exp)
+                self.last_full = now
+            for r in rows:
+                self._insert(r.get("domain"), r.get("worker_id") or "ALL", _parse_ts(r.get("expired_at")))
+                created = r.get("created_at")
+                if created and (self.cursor is None or created > self.cursor): self.cursor = created
+            if self.cursor is None:
+                self.cursor = datetime.now(timezone.utc).isoformat()
+            self.last_refresh = now
+
+    # -----------------------------------------------------
+    # 🚫 局中封鎖與批次寫回
+    # -----------------------------------------------------
+    def block(self, domain, worker_id, hours, rule_type="AUTO_COOLDOWN"):
+        """局中封鎖：立即寫入本地字尾樹，資料列排入待寫回佇列"""
+        expires = datetime.now(timezone.utc) + timedelta(hours=hours)
+        with self.lock:
+            self._insert(domain, worker_id, expires.timestamp())
+            row = {"worker_id": worker_id, "domain": domain, "expired_at": expires.isoformat()}
+            if rule_type: row["rule_type"] = rule_type
+            self.pending.append(row)
+
+    def flush(self, sb):
+        """批次寫回局中封鎖規則，失敗則保留待下次重送"""
+        with self.lock:
+            rows, self.pending = self.pending, []
+        if not rows: return 0
+        try:
+            sb.table(RULES_TABLE).insert(rows).execute()
+            return len(rows)
+        except Exception as e:
+            print(f"⚠️ [網域禁區] 規則寫回失敗，保留待重送: {str(e)[:80]}")
+            with self.lock:
+                self.pending = rows + self.pending
+            return 0
+
+_POLICIES = {}
+_policies_lock = threading.Lock()
+
+def get_domain_policy(worker_ids=None, rule_scope="host", ttl_seconds=300):
+    """取得行程內共用的網域禁區快取 (依 worker_ids 與 rule_scope 區分實例)"""
+    key = (tuple(sorted(worker_ids)) if worker_ids else None, rule_scope)
+    with _policies_lock:
+        if key not in _POLICIES:
+            _POLICIES[key] = DomainPolicy(worker_ids, ttl_seconds=ttl_seconds, rule_scope=rule_scope)
+        return _POLICIES[key]
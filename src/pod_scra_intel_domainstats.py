@@ -0,0 +1,93 @@
+# ---------------------------------------------------------
+# src/pod_scra_intel_domainstats.py (V6.20 網域戰情表)
+# 職責：1. 每次搬運後，將各網域的吞吐量、首包延遲 (TTFB)、成功率與最後失敗時間寫入 pod_scra_domain_stats。
+#       2. 提供「最短預估完工優先」排序：預估耗時 = 檔案大小 ÷ 網域吞吐量，讓 dl_limit 先被最快完工的貨源填滿。
+#       3. 判定已知慢速網域，交由重裝兵 (dl_heavy_only) 處理。
+# [數值] 滾動統計一律採 EWMA (alpha=0.3)，單筆異常不會劇烈拉動排序。
+# [容錯] 戰情表讀寫失敗一律靜默降級，絕不阻斷搬運主流程。
+# [原子] 回報改走 RPC pod_scra_record_transfer (單一 INSERT ... ON CONFLICT，平行車道 / 多台機甲不再互相覆寫)；
+#        RPC 尚未部署時退回「讀 -> 改 -> 寫回」。
+# ---------------------------------------------------------
+from datetime import datetime, timezone
+
+STATS_TABLE = "pod_scra_domain_stats"
+EWMA_ALPHA = 0.3
+DEFAULT_BPS = 512 * 1024        # 🧭 無紀錄網域的預設吞吐量 (樂觀估計，讓新貨源有機會被測速)
+DEFAULT_SIZE_MB = 60.0          # 🧭 尚未得知大小的任務，以典型單集 60MB 估算
+SLOW_DOMAIN_BPS = 64 * 1024     # 🐌 低於此吞吐量視為慢速網域
+SLOW_MIN_SAMPLES = 3            # 🐌 至少累積 3 筆紀錄才下慢速判決
+
+def _ewma(prev, value, alpha=EWMA_ALPHA):
+    return value if prev is None else alpha * value + (1 - alpha) * prev
+
+def load_domain_stats(sb, domains):
+    """讀取指定網域的戰情紀錄，回傳 {domain: row}"""
+    domains = [d for d in set(domains) if d]
+    if not domains: return {}
+    try:
+        res = sb.table(STATS_TABLE).select("*").in_("domain", domains).execute()
+        return {row["domain"]: row for row in (res.data or [])}
+    except Exception as e:
+        print(f"⚠️ [戰情表] 讀取失敗，改用預設估值: {e}")
+        return {}
+
+def record_transfer(sb, domain, ok, bytes_done=0, seconds=0.0, ttfb_ms=None):
+    """【戰情回報】單筆搬運結束後更新網域滾動統計"""
+    if not domain: return
+    # 📈 僅在有實際位元組流動時更新吞吐量，避免 403 等瞬間失敗把速率拉成 0
+    bps = bytes_done / seconds if bytes_done > 0 and seconds > 0 else None
+    try:
+        sb.rpc("pod_scra_record_transfer", {
+            "p_domain": domain, "p_ok": bool(ok), "p_bps": bps,
+            "p_ttfb_ms": ttfb_ms, "p_alpha": EWMA_ALPHA,
+        }).execute()
+        return
+    except Exception as e:
+        print(f"⚠️ [戰情表] RPC 回報失敗，改用讀寫回報: {str(e)[:80]}")
+    try:
+        res = sb.table(STATS_TABLE).select("*").eq("domain", domain).execute()
+        prev = (res.data or [{}])[0]
+        now_iso = datetime.now(timezone.utc).isoformat()
+        row = {
+            "domain": domain,
+            "success_count": (prev.get("success_count") or 0) + (1 if ok else 0),
+            "failure_count": (prev.get("failure_count") or 0) + (0 if ok else 1),
+            "success_rate": round(_ewma(prev.get("success_rate"), 1.0 if ok else 0.0), 4),
+            "updated_at": now_iso,
+        }
+        if bps is not None:
+            row["bps_ewma"] = round(_ewma(prev.get("bps_ewma"), bps), 1)
+        if ttfb_ms is not None:
+            row["ttfb_ms_ewma"] = round(_ewma(prev.get("ttfb_ms_ewma"), ttfb_ms), 1)
+        if ok: row["last_success_at"] = now_iso
+        else: row["last_failure_at"] = now_iso
+        sb.table(STATS_TABLE).upsert(row, on_conflict="domain").execute()
+    except Exception as e:
+        print(f"⚠️ [戰情表] 回報失敗 ({domain}): {e}")
+
+def samples_of(stat):
+    return (stat.get("success_count") or 0) + (stat.get("failure_count") or 0)
+
+def is_known_slow(stat):
+    """累積足夠樣本且吞吐量低於慢速門檻者，判定為慢速網域"""
+    if not stat or samples_of(stat) < SLOW_MIN_SAMPLES: return False
+    bps = stat.get("bps_ewma")
+    return bps is not None and bps < SLOW_DOMAIN_BPS
+
+def expected_seconds(task, stat, local_bps=None):
+    """預估完工秒數 = 大小 ÷ 吞吐量 + 首包延遲，再以成功率折算 (常失敗的網域等於要搬好幾趟)"""
+    size_mb = task.get("audio_size_mb") or DEFAULT_SIZE_MB
+    stat = stat or {}
+    bps = stat.get("bps_ewma") or local_bps or DEFAULT_BPS
+    ttfb = (stat.get("ttfb_ms_ewma") or 0) / 1000.0
+    success_rate = stat.get("success_rate")
+    success_rate = 1.0 if success_rate is None else max(success_rate, 0.2)
+    return (size_mb * 1024 * 1024 / max(bps, 1.0) + ttfb) / success_rate
+
+def order_by_expected_time(tasks, stats, domain_of, local_throughput=None):
+    """【最短預估完工優先】依預估耗時升冪排列候選任務 (穩定排序，同分者維持原本的新鮮度順序)"""
+    local_throughput = local_throughput or {}
+    def key(t):
+        d = domain_of(t)
+        return expected_seconds(t, stats.get(d), local_throughput.get(d))
+    return sorted(tasks, key=key)
@@ -0,0 +1,126 @@
+# ---------------------------------------------------------
+# src/pod_scra_intel_fetch.py (V6.29 定量記憶體取貨)
+# 職責：STT 與摘要產線原本以 resp.content 把整個 R2 物件吞進記憶體，256MB 的 FLY_LAX 碰上 20MB 音檔
+#       再加 base64 副本與 JSON 封包就逼近 OOM。本模組改以串流寫入 SpooledTemporaryFile：
+#       小檔留在記憶體，超過門檻自動溢寫到磁碟，峰值記憶體與檔案大小脫鉤。
+# [上傳] 回傳的檔案物件可直接交給 httpx 的 files= 參數，multipart 封包以 64KB 分塊串流送出。
+# [門檻] SPOOL_MAX_MEMORY_MB (預設 4MB) 控制溢寫點。
+# [V6.30 升級] Base64JsonBody：JSON 封包前段 + 檔案的 base64 分塊 + 封包後段，以產生器串流送出，
+#              長度可事先精算 (Content-Length)，可重複迭代 (模型降級輪詢共用同一個請求體)。
+# [V6.31 升級] 取貨先以 HEAD 取得 ETag 查節點音檔快取 (pod_scra_intel_audiocache)，命中直接開檔，
+#              未命中則串流寫入快取後開檔；HEAD 失敗或無 ETag 時退回原本的 Spooled 取貨。
+# ---------------------------------------------------------
+import os, base64, shutil, tempfile
+from urllib.parse import urlparse
+from curl_cffi import requests
+from src.pod_scra_intel_audiocache import CACHE_ENABLED, open_cached, store, normalize_etag
+
+SPOOL_MAX_MEMORY = int(float(os.environ.get("SPOOL_MAX_MEMORY_MB", 4)) * 1024 * 1024)
+FETCH_CHUNK = 256 * 1024
+
+def fetch_spooled(url, timeout=120, max_memory=SPOOL_MAX_MEMORY):
+    """
+    【串流取貨】下載至 SpooledTemporaryFile 並倒帶回開頭，回傳 (檔案物件, 位元組數)。
+    呼叫端負責 close()；HTTP 錯誤照常拋出 (與 raise_for_status 行為一致)。
+    啟用節點快取時回傳的是快取檔的唯讀檔案物件。
+    """
+    cached = open_via_cache(url, timeout)
+    if cached: return cached, os.fstat(cached.fileno()).st_size
+
+    spool = tempfile.SpooledTemporaryFile(max_size=max_memory)
+    size = 0
+    try:
+        for chunk in _iter_download(url, timeout):
+            if chunk:
+                spool.write(chunk)
+                size += len(chunk)
+    except Exception:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool, size
+
+def fetch_to_tempfile(url, suffix="", timeout=120):
+    """【串流取貨】下載至具名暫存檔 (供需要檔案路徑的工具使用)，回傳 (路徑, 位元組數)；呼叫端負責刪除"""
+    cached = open_via_cache(url, timeout)
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
+        path = tmp.name
+    if cached:
+        # 🔗 快取命中：同檔案系統以硬連結交付 (零複製)，呼叫端刪除暫存檔不影響快取
+        with cached:
+            try:
+                os.remove(path); os.link(cached.name, path)
+            except OSError:
+                with open(path, "wb") as f: shutil.copyfileobj(cached, f, 1024 * 1024)
+            return path, os.fstat(cached.fileno()).st_size
+    size = 0
+    try:
+        with open(path, "wb") as f:
+            for chunk in _iter_download(url, timeout):
+                if chunk:
+                    f.write(chunk)
+                    size += len(chunk)
+    except Exception:
+        os.remove(path)
+        raise
+    return path, size
+
+def _iter_download(url, timeout):
+    r = requests.get(url, stream=True, timeout=timeout)
+    try:
+        r.raise_for_status()
+        for chunk in r.iter_content(chunk_size=FETCH_CHUNK):
+            yield chunk
+    finally:
+        r.close()
+
+def cache_key(url):
+    """R2 物件鍵 = 公開網址的路徑部分"""
+    return urlparse(url).path.lstrip("/")
+
+def open_via_cache(url, timeout=120):
+    """【快取取貨】HEAD 取 ETag -> 命中開檔 / 未命中串流入庫後開檔；快取停用或無 ETag 時回傳 None"""
+    if not CACHE_ENABLED: return None
+    try:
+        head = requests.head(url, timeout=min(timeout, 15))
+        etag = normalize_etag(head.headers.get("ETag")) if head.status_code == 200 else None
+    except Exception:
+        return None
+    if not etag: return None
+    key = cache_key(url)
+    return open_cached(key, etag) or store(key, etag, chunks=_iter_download(url, timeout))
+
+def cached_path(url, timeout=120):
+    """回傳快取檔的本機路徑 (供 FFmpeg 等需要路徑的工具直接讀檔)，快取不可用時回傳 None"""
+    f = open_via_cache(url, timeout)
+    if not f: return None
+    f.close()
+    return f.name
+
+def is_spilled(spool):
+    """是否已溢寫到磁碟 (供日誌與基準測試觀察)"""
+    return bool(getattr(spool, "_rolled", False))
+
+B64_CHUNK = 3 * 64 * 1024        # 🧮 3 的倍數：分塊編碼不產生中途補位 (=)
+
+class Base64JsonBody:
+    """
+    【串流 JSON 請求體】prefix + base64(檔案) + suffix，交 httpx content= 使用。
+    每次迭代都自檔案開頭重新編碼，記憶體只佔一個分塊；len() 為精確位元組數。
+    """
+    def __init__(self, prefix, fileobj, size, suffix):
+        self.prefix = prefix.encode("utf-8") if isinstance(prefix, str) else prefix
+        self.suffix = suffix.encode("utf-8") if isinstance(suffix, str) else suffix
+        self.fileobj, self.size = fileobj, size
+
+    def __len__(self):
+        return len(self.prefix) + 4 * ((self.size + 2) // 3) + len(self.suffix)
+
+    def __iter__(self):
+        yield self.prefix
+        self.fileobj.seek(0)
+        while True:
+            chunk = self.fileobj.read(B64_CHUNK)
+            if not chunk: break
+            yield base64.b64encode(chunk)
+        yield self.suffix
\ No newline at end of file
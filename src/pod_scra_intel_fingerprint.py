@@ -0,0 +1,170 @@
+# ---------------------------------------------------------
+# src/pod_scra_intel_fingerprint.py (V6.24 音紋重播偵測)
+# 職責：節目重播常換上新廣告，位元組雜湊對不上，卻要再付一次 STT。
+#       本模組於壓縮後、聽打前，對 16kHz 單聲道 Opus 計算「頻譜峰值地標 (landmark)」音紋，
+#       以 pod_scra_audio_fingerprint (int[] + GIN) 做近似重複查詢，命中即沿用舊逐字稿。
+# [演算] 1. FFmpeg 解碼為 16kHz PCM，分塊 STFT，只保留每個頻帶每幀的最強點 (記憶體與片長無關)。
+#        2. 峰值 = 該頻帶 ±PEAK_RADIUS 幀內的最大值 (與時間平移無關，插播廣告不影響其餘段落)。
+#        3. 錨點與後續 FAN_OUT 個峰值配對，(f1, f2, dt) 打包為 24-bit 雜湊；以混雜值取 1/HASH_SAMPLE 抽樣。
+#        4. 比對分數 = 共同雜湊數 ÷ 較短一方雜湊數 (包含率，廣告插入只會稀釋長的一方)。
+# [相依] 僅需 FFmpeg 與 numpy，全程離線；缺 numpy 時 FINGERPRINT_READY=False，呼叫端自動略過。
+# ---------------------------------------------------------
+import os, subprocess
+
+try:
+    import numpy as np
+    FINGERPRINT_READY = True
+except ImportError:
+    np = None
+    FINGERPRINT_READY = False
+
+FP_TABLE = "pod_scra_audio_fingerprint"
+SAMPLE_RATE = 16000
+N_FFT = 1024
+HOP = 512                                           # ⏱️ 32ms 一幀
+BAND_EDGES = (8, 16, 28, 48, 80, 136, 232, 400)     # 🎚️ 約 125Hz ~ 6.25kHz，對數間隔 7 個頻帶
+PEAK_RADIUS = 24                                    # 🏔️ 峰值需為前後約 0.77 秒內最強
+FAN_OUT = 4
+MAX_DT = 63                                         # 🔗 配對最遠約 2 秒 (6 bits)
+HASH_SAMPLE = 4
+MAX_HASHES = 30000
+BLOCK_SECONDS = 20
+
+MATCH_THRESHOLD = float(os.environ.get("FP_MATCH_THRESHOLD", 0.30))
+MATCH_MIN_OVERLAP = 40
+
+def _ffmpeg_path():
+    try:
+        import imageio_ffmpeg
+        path = imageio_ffmpeg.get_ffmpeg_exe()
+        if path and os.path.exists(path): return path
+    except Exception: pass
+    return "ffmpeg"
+
+def _band_maxima(pcm, window):
+    """單一區塊的 STFT，回傳每幀各頻帶的 (最大對數能量, 頻率 bin)"""
+    n_frames = 1 + (len(pcm) - N_FFT) // HOP
+    if n_frames <= 0:
+        return np.empty((0, len(BAND_EDGES) - 1), np.float32), np.empty((0, len(BAND_EDGES) - 1), np.int16)
+    idx = np.arange(N_FFT)[None, :] + HOP * np.arange(n_frames)[:, None]
+    spec = np.log1p(np.abs(np.fft.rfft(pcm[idx] * window, axis=1)).astype(np.float32))
+    vals, bins = [], []
+    for lo, hi in zip(BAND_EDGES[:-1], BAND_EDGES[1:]):
+        band = spec[:, lo:hi]
+        arg = band.argmax(axis=1)
+        vals.append(band[np.arange(n_frames), arg])
+        bins.append(arg + lo)
+    return np.stack(vals, axis=1), np.stack(bins, axis=1).astype(np.int16)
+
+def _landmarks(vals, bins):
+    """峰值擷取 + 錨點配對，回傳排序後的雜湊清單"""
+    n_frames, n_bands = vals.shape
+    if n_frames == 0: return []
+    threshold = vals.mean(axis=0)
+    padded = np.pad(vals, ((PEAK_RADIUS, PEAK_RADIUS), (0, 0)), constant_values=-np.inf)
+    local_max = np.lib.stride_tricks.sliding_window_view(padded, 2 * PEAK_RADIUS + 1, axis=0).max(axis=2)
+    is_peak = (vals >= local_max) & (vals > threshold)
+    t_idx, b_idx = np.nonzero(is_peak)
+    peaks = sorted(zip(t_idx.tolist(), bins[t_idx, b_idx].tolist()))
+
+    hashes = set()
+    for i, (t1, f1) in enumerate(peaks):
+        paired = 0
+        for t2, f2 in peaks[i + 1:]:
+            dt = t2 - t1
+            if dt > MAX_DT: break
+            if dt < 1: continue
+            h = ((f1 & 511) << 15) | ((f2 & 511) << 6) | dt
+            # 🎲 以乘法混雜值抽樣：同一段聲音在任何拷貝中的取捨一致
+            if ((h * 2654435761) & 0xFFFFFFFF) % HASH_SAMPLE == 0: hashes.add(h)
+            paired += 1
+            if paired >= FAN_OUT: break
+    if len(hashes) > MAX_HASHES:
+        hashes = sorted(hashes, key=lambda h: (h * 2654435761) & 0xFFFFFFFF)[:MAX_HASHES]
+    return sorted(hashes)
+
+def fingerprint_pcm(pcm):
+    """【音紋】對 16kHz 單聲道 float32 波形計算地標雜湊 (供基準測試與離線比對)"""
+    window = np.hanning(N_FFT).astype(np.float32)
+    block = SAMPLE_RATE * BLOCK_SECONDS
+    vals, bins = [], []
+    for start in range(0, max(len(pcm) - N_FFT + 1, 1), block):
+        v, b = _band_maxima(pcm[start:start + block + N_FFT - HOP], window)
+        vals.append(v); bins.append(b)
+    hashes = _landmarks(np.concatenate(vals), np.concatenate(bins))
+    return {"hashes": hashes, "duration_sec": round(len(pcm) / SAMPLE_RATE, 1)}
+
+def fingerprint_audio(source, timeout=600):
+    """
+    【音紋】以 FFmpeg 串流解碼 (本機路徑或 R2 網址) 並逐塊計算頻帶峰值，
+    峰值記憶體僅一個區塊 (約 20 秒 PCM)，與節目長度無關。失敗回傳 None。
+    """
+    if not FINGERPRINT_READY: return None
+    cmd = [_ffmpeg_path(), "-nostdin", "-loglevel", "error", "-i", source,
+           "-vn", "-ac", "1", "-ar", str(SAMPLE_RATE), "-f", "s16le", "pipe:1"]
+    window = np.hanning(N_FFT).astype(np.float32)
+    block_bytes = SAMPLE_RATE * BLOCK_SECONDS * 2
+    carry = np.empty(0, np.float32)
+    total_samples = 0
+    vals, bins = [], []
+    try:
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        try:
+            while True:
+                raw = proc.stdout.read(block_bytes)
+                if not raw: break
+                pcm = np.frombuffer(raw[:len(raw) // 2 * 2], dtype="<i2").astype(np.float32) / 32768.0
+                total_samples += len(pcm)
+                pcm = np.concatenate([carry, pcm])
+                v, b = _band_maxima(pcm, window)
+                vals.append(v); bins.append(b)
+                # 🧵 保留尚未構成完整一幀的尾料，確保跨區塊的幀序連續
+                carry = pcm[len(v) * HOP:]
+            proc.wait(timeout=timeout)
+        finally:
+            if proc.poll() is None: proc.kill()
+        if proc.returncode != 0 or not vals: return None
+        hashes = _landmarks(np.concatenate(vals), np.concatenate(bins))
+        return {"hashes": hashes, "duration_sec": round(total_samples / SAMPLE_RATE, 1)}
+    except Exception as e:
+        print(f"⚠️ [音紋] 計算失敗，略過重播偵測: {str(e)[:80]}")
+        return None
+
+def match_score(a, b):
+    """包含率：共同雜湊數 ÷ 較短一方雜湊數"""
+    a, b = set(a), set(b)
+    if not a or not b: return 0.0
+    return len(a & b) / min(len(a), len(b))
+
+def find_rerun(sb, fp, task_id, threshold=MATCH_THRESHOLD):
+    """
+    【重播偵測】以 pod_scra_match_fingerprint RPC (GIN 重疊 + 片長預篩) 找出最相似的已聽打任務。
+    達門檻回傳 {"task_id", "overlap", "score"}，否則 None。
+    """
+    if not fp or not fp.get("hashes"): return None
+    try:
+        res = sb.rpc("pod_scra_match_fingerprint", {
+            "p_hashes": fp["hashes"], "p_duration": fp["duration_sec"],
+            "p_exclude": task_id, "p_limit": 3
+        }).execute()
+    except Exception as e:
+        print(f"⚠️ [音紋] 比對 RPC 失敗，視為未命中: {str(e)[:80]}")
+        return None
+    best = None
+    for row in res.data or []:
+        overlap = row.get("overlap") or 0
+        score = overlap / max(min(row.get("hash_count") or 0, len(fp["hashes"])), 1)
+        if overlap >= MATCH_MIN_OVERLAP and score >= threshold and (not best or score > best["score"]):
+            best = {"task_id": row["task_id"], "overlap": overlap, "score": round(score, 3)}
+    return best
+
+def register_fingerprint(sb, task_id, fp):
+    """登錄已完成聽打的任務音紋 (僅在逐字稿入庫後呼叫，確保命中必有稿可抄)"""
+    if not fp or not fp.get("hashes"): return
+    try:
+        sb.table(FP_TABLE).upsert({
+            "task_id": task_id, "hashes": fp["hashes"], "hash_count": len(fp["hashes"]),
+            "duration_sec": fp["duration_sec"]
+        }, on_conflict="task_id").execute()
+    except Exception as e:
+        print(f"⚠️ [音紋] 登錄失敗: {str(e)[:80]}")
\ No newline at end of file
@@ -4,25 +4,22 @@
 # 任務：處理超長文本的滑動窗口切塊、重疊銜接、防爆休眠與摘要生成
 # 修正：1. [V2.3] 修正變數宣告順序，確保模型降級輪詢的 try/except 完美接住。
 #       2. [V2.5] 拔除退役模型，全面換裝 Groq 官方最新 Llama 3.1 8B 與 Llama 4 17B。
+#       3. [V2.6] 改由 Groq 調度中心 (pod_scra_intel_groqpool) 多金鑰派工：依 x-ratelimit-* 標頭校正的
+#                 Token 桶決定何時開火，拔除每塊之間固定 65 秒的戰術休眠。
 # ---------------------------------------------------------
 
-import os
-import time
-from groq import Groq
-from src.pod_scra_intel_control import get_secrets
+from src.pod_scra_intel_groqpool import get_groq_pool, GroqPoolError
 
 class GroqFallbackAgent:
     """
     🛡️ [B計畫特種兵] 專門處理 Groq 的長文本切塊與 API 呼叫
     """
     def __init__(self):
-        # 🚀 從中央金庫領取 Groq 金鑰
-        s = get_secrets()
-        api_key = s.get("GROQ_KEY") 
+        # 🚀 [V2.6] 向 Groq 調度中心領取整組金鑰 (GROQ_API_KEYS / GROQ_API_KEY)
+        self.pool = get_groq_pool()
         
-        if not api_key:
+        if not self.pool.keys:
             print("⚠️ [Groq 備援] 找不到 GROQ_KEY，備援系統處於休眠狀態。")
-        self.client = Groq(api_key=api_key) if api_key else None
         
         # 設定切塊參數，確保不超過 TPM 限制
         self.chunk_size = 15000  
@@ -53,7 +50,7 @@ class GroqFallbackAgent:
 
     def generate_summary(self, long_text: str, original_prompt: str):
         """🧠 分塊處理長文本，並組合最終摘要"""
-        if not self.client:
+        if not self.pool.keys:
             return "❌ [Groq 備援] 系統未初始化，無法執行 B 計畫。"
 
         chunks = self._chunk_text_with_overlap(long_text)
@@ -84,43 +81,17 @@ class GroqFallbackAgent:
                 {"role": "user", "content": chunk_text}
             ]
 
-            chunk_success = False
-            last_error = ""
-
-            # 🚀 [第二步]：啟動模型降級輪詢，帶入剛準備好的 messages
-            for model_name in self.models_to_try:
-                try:
-                    response = self.client.chat.completions.create(
-                        model=model_name,
-                        messages=messages, 
-                        temperature=0.3,
-                        max_tokens=2048
-                    )
-                    chunk_result = response.choices[0].message.content
-                    final_summary += chunk_result + "\n\n"
-                    print(f"✅ 第 {idx + 1} 塊處理成功 (使用的模型: {model_name})。")
-                    chunk_success = True
-                    break 
-                    
-                except Exception as e:
-                    err_str = str(e)
-                    # 🚀 擴大捕捉範圍：防禦各種限流字眼
-                    if "429" in err_str or "rate limit" in err_str.lower() or "limit" in err_str.lower():
-                        print(f"⚠️ [Groq 戰損] 模型 {model_name} 額度耗盡，嘗試切換備援裝甲...")
-                        last_error = err_str
-                        continue 
-                    else:
-                        print(f"❌ [Groq 戰損] 模型 {model_name} 發生嚴重錯誤，放棄該區塊處理。")
-                        raise e 
-
-            # [第三步]：檢查輪詢結果
-            if not chunk_success:
-                print(f"❌ [Groq 戰損] 第 {idx + 1} 塊處理失敗，請求上級執行升級備援...")
-                raise Exception(f"所有 Groq 備援模型皆已耗盡額度: {last_error}")
-
-            # [第四步]：若不是最後一塊，強制休眠清洗 Token 桶以防 429
-            if idx < total_chunks - 1:
-                print("⏳ [冷卻防禦] 進入 65 秒戰術休眠，規避 TPM 12000 限制...")
-                time.sleep(65)
+            # 🚀 [第二步]：交由調度中心依 Token 桶挑金鑰開火，額度耗盡時自動降級模型梯隊
+            try:
+                chunk_result, model_name = self.pool.chat(messages, self.models_to_try, temperature=0.3, max_tokens=2048)
+            except GroqPoolError as e:
+                if "EXHAUSTED" in e.status or "429" in e.status:
+                    print(f"❌ [Groq 戰損] 第 {idx + 1} 塊處理失敗，請求上級執行升級備援...")
+                    raise Exception(f"所有 Groq 備援模型皆已耗盡額度: {e.status}")
+                print(f"❌ [Groq 戰損] 發生嚴重錯誤，放棄該區塊處理。")
+                raise
+
+            final_summary += chunk_result + "\n\n"
+            print(f"✅ 第 {idx + 1} 塊處理成功 (使用的模型: {model_name})。")
 
         return final_summary.strip()
\ No newline at end of file
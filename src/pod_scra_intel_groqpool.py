@@ -0,0 +1,236 @@
+# ---------------------------------------------------------
+# src/pod_scra_intel_groqpool.py (V6.37 Groq 多金鑰調度中心)
+# 職責：_call_groq 只認得一把 GROQ_API_KEY，429/502/503 一律睡 10 秒後降級模型；GroqFallbackAgent
+#       每塊之間固定睡 65 秒躲 TPM。本模組為 STT (_call_groq)、摘要備援 (GroqFallbackAgent) 與
+#       游擊隊 (AIAgent.generate_groq_summary) 共用的 Groq 呼叫層，持有整組金鑰並依實際剩餘額度派工。
+# [令牌桶] 每個「金鑰 + 模型」各有三個桶：請求數 (RPD)、Token (TPM)、音訊秒數 (ASH)。
+#          請求數 / Token 由回應標頭 x-ratelimit-limit-* / x-ratelimit-remaining-* / x-ratelimit-reset-* 校正；
+#          音訊秒數 Groq 未回報，依 GROQ_AUDIO_SEC_PER_HOUR 本地計量。
+# [派工] acquire() 回傳第一把「三桶皆足、且未被 retry-after 凍結」的金鑰；全數不足時只睡到最近一個桶重置
+#        (上限 max_wait)，不再固定計時。429 依 retry-after 凍結該金鑰 + 模型，立即改派下一把。
+# [相依] 僅引用同為葉節點的連線池模組 (GHA 腳本可直接 import)，HTTP 一律走 httpx。
+# [V6.38 升級] 改走供應商連線池 (pod_scra_intel_httppool)，與其他供應商共用 keep-alive / HTTP/2 連線。
+# ---------------------------------------------------------
+import os, re, time, threading
+try:
+    from src.pod_scra_intel_httppool import get_client
+except ImportError:
+    from pod_scra_intel_httppool import get_client
+
+GROQ_API_BASE = "https://api.groq.com/openai/v1"
+GROQ_STT_MODELS = ["whisper-large-v3-turbo", "whisper-large-v3"]
+GROQ_MAX_WAIT_SEC = float(os.environ.get("GROQ_MAX_WAIT_SEC", 90))
+GROQ_AUDIO_SEC_PER_HOUR = float(os.environ.get("GROQ_AUDIO_SEC_PER_HOUR", 7200))
+GROQ_MIN_BILLED_AUDIO_SEC = 10          # 🧾 Groq 單次聽打最低計費 10 秒
+SERVER_ERROR_HOLD_SEC = 5.0             # 🩹 502/503 抖動：該金鑰 + 模型短暫凍結
+EST_BYTES_PER_SEC = {"audio/ogg": 4000, "audio/mpeg": 16000}
+
+class GroqPoolError(Exception):
+    """Groq 調度失敗 (金鑰全數耗盡或不可恢復錯誤)，status 沿用 GROQ_HTTP_xxx 格式"""
+    def __init__(self, status):
+        super().__init__(status)
+        self.status = status
+
+def _parse_reset(value):
+    """解析 Groq 重置時間標頭 (例如 '7.66s'、'1m26.4s'、'2h3m0s'、'120ms')，回傳秒數"""
+    if not value: return None
+    try: return float(value)
+    except ValueError: pass
+    total, matched = 0.0, False
+    for num, unit in re.findall(r"([\d.]+)(ms|h|m|s)", value):
+        total += float(num) * {"ms": 0.001, "h": 3600, "m": 60, "s": 1}[unit]
+        matched = True
+    return total if matched else None
+
+def _to_int(value):
+    try: return int(float(value))
+    except (TypeError, ValueError): return None
+
+class _Bucket:
+    """單一令牌桶：limit / remaining 未知時視為不限 (等第一次回應標頭校正)"""
+    __slots__ = ("limit", "remaining", "reset_at", "window")
+
+    def __init__(self, limit=None, window=None):
+        self.limit, self.remaining, self.reset_at, self.window = limit, limit, None, window
+
+    def refill(self, now):
+        if self.reset_at is not None and now >= self.reset_at:
+            self.remaining, self.reset_at = self.limit, None
+
+    def wait(self, cost, now):
+        self.refill(now)
+        if self.remaining is None or cost <= self.remaining: return 0.0
+        if self.limit is not None and cost > self.limit: return 0.0      # 單筆超過整桶，等也沒用，交給伺服器裁決
+        return max(self.reset_at - now, 0.0) if self.reset_at is not None else 0.0
+
+    def take(self, cost, now):
+        if self.remaining is None: return
+        self.remaining -= cost
+        if self.reset_at is None and self.window: self.reset_at = now + self.window
+
+    def sync(self, limit, remaining, reset_in, now):
+        if limit is not None: self.limit = limit
+        if remaining is not None: self.remaining = remaining
+        if reset_in is not None: self.reset_at = now + reset_in
+
+class _Lane:
+    """單一「金鑰 + 模型」的三個令牌桶與 retry-after 凍結時間"""
+    def __init__(self):
+        self.requests = _Bucket()
+        self.tokens = _Bucket()
+        self.audio = _Bucket(GROQ_AUDIO_SEC_PER_HOUR, window=3600)
+        self.hold_until = 0.0
+
+    def wait(self, tokens, audio_sec, now):
+        return max(self.hold_until - now, self.requests.wait(1, now),
+                   self.tokens.wait(tokens, now), self.audio.wait(audio_sec, now), 0.0)
+
+    def take(self, tokens, audio_sec, now):
+        self.requests.take(1, now)
+        self.tokens.take(tokens, now)
+        self.audio.take(audio_sec, now)
+
+class GroqPool:
+    """【Groq 調度中心】持有整組金鑰，依令牌桶派工 (執行緒安全，分段平行聽打可共用)"""
+    def __init__(self, keys):
+        self.keys = list(keys)
+        self._lanes = {}
+        self._lock = threading.Lock()
+
+    def _lane(self, key, model):
+        lane = self._lanes.get((key, model))
+        if lane is None: lane = self._lanes[(key, model)] = _Lane()
+        return lane
+
+    def acquire(self, model, tokens=0, audio_sec=0, keys=None, max_wait=GROQ_MAX_WAIT_SEC):
+        """回傳第一把有餘額的金鑰並預扣額度；需等候超過 max_wait 時回傳 None"""
+        keys = self.keys if keys is None else keys
+        if not keys: return None
+        deadline = time.monotonic() + max_wait
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                soonest = float("inf")
+                for key in keys:
+                    wait = self._lane(key, model).wait(tokens, audio_sec, now)
+                    if wait <= 0:
+                        self._lane(key, model).take(tokens, audio_sec, now)
+                        return key
+                    soonest = min(soonest, wait)
+            if now + soonest > deadline: return None
+            print(f"   ⏳ [Groq 調度] {model} 全數金鑰額度不足，等候最近一桶重置 {soonest:.1f} 秒...")
+            time.sleep(soonest + 0.05)
+
+    def observe(self, key, model, resp):
+        """依回應標頭校正令牌桶；429 依 retry-after 凍結該金鑰 + 模型"""
+        h = resp.headers
+        with self._lock:
+            now = time.monotonic()
+            lane = self._lane(key, model)
+            lane.requests.sync(_to_int(h.get("x-ratelimit-limit-requests")), _to_int(h.get("x-ratelimit-remaining-requests")),
+                               _parse_reset(h.get("x-ratelimit-reset-requests")), now)
+            lane.tokens.sync(_to_int(h.get("x-ratelimit-limit-tokens")), _to_int(h.get("x-ratelimit-remaining-tokens")),
+                             _parse_reset(h.get("x-ratelimit-reset-tokens")), now)
+            if resp.status_code == 429:
+                hold = _parse_reset(h.get("retry-after")) or _parse_reset(h.get("x-ratelimit-reset-tokens")) or 60.0
+                lane.hold_until = max(lane.hold_until, now + hold)
+            elif resp.status_code in (502, 503):
+                lane.hold_until = max(lane.hold_until, now + SERVER_ERROR_HOLD_SEC)
+
+    def _dispatch(self, model, tokens, audio_sec, keys, max_wait, send):
+        """同一模型內依令牌桶換金鑰重試，回傳 (回應, 金鑰)；金鑰全數耗盡回傳 (None, 錯誤)"""
+        last_error = "GROQ_POOL_EXHAUSTED"
+        for _ in range(len(keys or self.keys) * 2 + 1):
+            key = self.acquire(model, tokens, audio_sec, keys, max_wait)
+            if key is None: return None, last_error
+            try:
+                resp = send(key)
+            except Exception as e:
+                last_error = f"GROQ_EXC_{str(e)[:50]}"
+                continue
+            self.observe(key, model, resp)
+            if resp.status_code in (429, 502, 503):
+                last_error = f"GROQ_HTTP_{resp.status_code}_{resp.text[:50]}"
+                print(f"   ⚠️ [Groq 調度] {model} 金鑰 #{self.keys.index(key) + 1} 限流或抖動 (HTTP {resp.status_code})，改派下一把...")
+                continue
+            return resp, key
+        return None, last_error
+
+    def transcribe(self, audio_data, filename, mime_type, audio_sec=None, keys=None, models=GROQ_STT_MODELS,
+                   language="en", max_wait=GROQ_MAX_WAIT_SEC):
+        """
+        【聽打】audio_data 可為 bytes 或可 seek 的檔案物件 (每次重送前倒帶)。
+        回傳 (逐字稿, 狀態, 金鑰)；狀態為 SUCCESS 或 GROQ_HTTP_xxx / GROQ_POOL_EXHAUSTED 等。
+        """
+        if not (keys or self.keys): return None, "NO_API_KEY", None
+        if audio_sec is None:
+            if hasattr(audio_data, "seek"):
+                audio_data.seek(0, os.SEEK_END); size = audio_data.tell()
+            else:
+                size = len(audio_data)
+            audio_sec = size / EST_BYTES_PER_SEC.get(mime_type, 4000)
+        audio_sec = max(audio_sec, GROQ_MIN_BILLED_AUDIO_SEC)
+
+        last_error = "GROQ_POOL_EXHAUSTED"
+        for model_name in models:
+            print(f"   ↳ 嘗試裝載聽打模型: {model_name}...")
+
+            def send(key):
+                if hasattr(audio_data, "seek"): audio_data.seek(0)
+                return get_client(GROQ_API_BASE).post(f"{GROQ_API_BASE}/audio/transcriptions", timeout=180.0,
+                                                      headers={"Authorization": f"Bearer {key}"},
+                                                      files={"file": (filename, audio_data, mime_type)},
+                                                      data={"model": model_name, "response_format": "text", "language": language})
+
+            resp, key = self._dispatch(model_name, 0, audio_sec, keys, max_wait, send)
+            if resp is None:
+                last_error = key
+                continue
+            if resp.status_code == 200: return resp.text, "SUCCESS", key
+            # 發生 400 (Bad Request) 等不可恢復錯誤，直接報錯不浪費時間
+            return None, f"GROQ_HTTP_{resp.status_code}_{resp.text[:50]}", key
+        return None, last_error, None
+
+    def chat(self, messages, models, temperature=0.3, max_tokens=2048, keys=None, max_wait=GROQ_MAX_WAIT_SEC):
+        """
+        【對話】依模型梯隊降級，回傳 (回覆, 模型)；金鑰全數耗盡拋出 GroqPoolError。
+        Token 預扣 = 訊息字元數 / 3 + max_tokens (寧可高估)，回應後由標頭校正。
+        """
+        if not (keys or self.keys): raise GroqPoolError("NO_API_KEY")
+        tokens = sum(len(m.get("content") or "") for m in messages) // 3 + max_tokens
+        last_error = "GROQ_POOL_EXHAUSTED"
+        for model_name in models:
+            payload = {"model": model_name, "messages": messages, "temperature": temperature, "max_tokens": max_tokens}
+
+            def send(key):
+                return get_client(GROQ_API_BASE).post(f"{GROQ_API_BASE}/chat/completions", timeout=180.0,
+                                                      headers={"Authorization": f"Bearer {key}"}, json=payload)
+
+            resp, key = self._dispatch(model_name, tokens, 0, keys, max_wait, send)
+            if resp is None:
+                last_error = key
+                print(f"⚠️ [Groq 調度] 模型 {model_name} 額度耗盡，嘗試切換備援裝甲...")
+                continue
+            if resp.status_code != 200:
+                raise GroqPoolError(f"GROQ_HTTP_{resp.status_code}_{resp.text[:80]}")
+            return resp.json()["choices"][0]["message"]["content"], model_name
+        raise GroqPoolError(last_error)
+
+def groq_keys_from_env():
+    """GROQ_API_KEYS (逗號分隔) 優先，相容單一 GROQ_API_KEY / GROQ_KEY"""
+    single = os.environ.get("GROQ_API_KEY", os.environ.get("GROQ_KEY"))
+    raw = os.environ.get("GROQ_API_KEYS", single or "")
+    keys = [k.strip() for k in raw.split(",") if k.strip()]
+    if single and single not in keys: keys.insert(0, single)
+    return keys
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_groq_pool(keys=None):
+    """【基礎建設】取得行程內共用的 Groq 調度中心 (依金鑰組快取，令牌桶跨呼叫端共享)"""
+    keys = tuple(keys or groq_keys_from_env())
+    with _pools_lock:
+        pool = _pools.get(keys)
+        if pool is None: pool = _pools[keys] = GroqPool(keys)
+        return pool
\ No newline at end of file
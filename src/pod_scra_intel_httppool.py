@@ -0,0 +1,60 @@
+# ---------------------------------------------------------
+# src/pod_scra_intel_httppool.py (V6.38 供應商連線池)
+# 職責：供應商呼叫原本混用各種客戶端：_call_deepgram 每次 new httpx.Client、Gladia / Speechmatics
+#       送單與輪詢走 curl_cffi 模組級 requests.post/get、NVIDIA / Telegram 亦是裸呼叫，
+#       每一次輪詢、每一次模型降級都重付一次 TCP + TLS 握手。本模組為全行程共用的連線池登記處：
+#       每個供應商主機一個 httpx.Client，首次使用時惰性建立，行程存活期間持續重用 (keep-alive)。
+# [HTTP/2] 有安裝 h2 時啟用 HTTP/2 (同一條連線多工併發請求)，否則自動退回 HTTP/1.1 keep-alive。
+# [逾時] 客戶端預設 DEFAULT_TIMEOUT，各呼叫端依舊以 timeout= 逐次指定 (上傳 180 秒、輪詢 15 秒...)。
+# [非同步] make_async_client() 以相同連線參數建立 AsyncClient (事件迴圈綁定，由呼叫端管理生命週期)。
+# [範圍] 僅限供應商 API 主機 (Gladia / Speechmatics / AssemblyAI / Deepgram / NVIDIA / Gemini / Groq / Telegram)：
+#        這些呼叫原本走 curl_cffi 時皆未帶 impersonate (即預設 libcurl 指紋，非瀏覽器偽裝)，官方 API 以金鑰認證，
+#        改走 httpx 不影響 TLS 指紋判定。需要瀏覽器指紋偽裝的 Podcast 來源下載 (trans 的 impersonate Session)
+#        與 R2 公開網址取貨仍維持 curl_cffi，不得改接本模組。
+# [相依] 本模組不引用任何 src 內部模組 (GHA 腳本可直接 import)。
+# ---------------------------------------------------------
+import threading
+from urllib.parse import urlparse
+import httpx
+
+try:
+    import h2  # noqa: F401
+    HTTP2_READY = True
+except ImportError:
+    HTTP2_READY = False
+
+DEFAULT_TIMEOUT = 60.0
+POOL_LIMITS = httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=120.0)
+
+_clients = {}
+_lock = threading.Lock()
+
+def _host_of(url_or_host):
+    return urlparse(url_or_host).netloc if "://" in url_or_host else url_or_host
+
+def get_client(url_or_host):
+    """【基礎建設】取得該主機共用的 keep-alive 客戶端 (可傳完整網址或主機名稱)"""
+    host = _host_of(url_or_host)
+    with _lock:
+        client = _clients.get(host)
+        if client is None or client.is_closed:
+            client = httpx.Client(http2=HTTP2_READY, timeout=DEFAULT_TIMEOUT, limits=POOL_LIMITS)
+            _clients[host] = client
+        return client
+
+def make_async_client(timeout=DEFAULT_TIMEOUT):
+    """以相同連線參數建立 AsyncClient (請以 async with 管理)"""
+    return httpx.AsyncClient(http2=HTTP2_READY, timeout=timeout, limits=POOL_LIMITS)
+
+def pooled_hosts():
+    """目前已建立連線池的主機 (監控用)"""
+    with _lock:
+        return sorted(_clients)
+
+def close_all():
+    """關閉全部連線池 (行程收工或測試用)"""
+    with _lock:
+        for client in _clients.values():
+            try: client.close()
+            except Exception: pass
+        _clients.clear()
\ No newline at end of file
@@ -5,11 +5,14 @@
 
 # 特色：128K 超大上下文，支援一次性處理 10 萬字逐字稿，無需切塊。
 # [V6.10 升級] 實裝 Llama 3.3-70B -> Llama 3.1-8B 降級輪詢防護。
+# [V6.29 升級] 聽寫改以 fetch_spooled 串流落地，httpx multipart 分塊上傳，不再整檔 resp.content 進記憶體。
+# [V6.38 升級] 聽寫與摘要共用 NVIDIA 主機的 keep-alive 連線池，模型降級不再重新握手。
 # ---------------------------------------------------------
 
 import os
-from curl_cffi import requests
+from src.pod_scra_intel_httppool import get_client
 from src.pod_scra_intel_control import get_secrets
+from src.pod_scra_intel_fetch import fetch_spooled
 
 class NvidiaAgent:
     def __init__(self):
@@ -30,17 +33,16 @@ class NvidiaAgent:
         s = get_secrets()
         audio_url = f"{s['R2_URL']}/{r2_url_path}"
         
-        resp = requests.get(audio_url, timeout=120)
-        resp.raise_for_status()
-        
-        files = {
-            'file': ('audio.opus', resp.content, 'audio/ogg'),
-            'model': (None, 'nvidia/whisper-large-v3'),
-            'response_format': (None, 'text')
-        }
-        headers = {"Authorization": f"Bearer {self.api_key}"}
-        
-        nv_resp = requests.post(f"{self.base_url}/audio/transcriptions", headers=headers, files=files, timeout=300)
+        audio_file, _ = fetch_spooled(audio_url, timeout=120)
+        try:
+            files = {'file': ('audio.opus', audio_file, 'audio/ogg')}
+            data = {'model': 'nvidia/whisper-large-v3', 'response_format': 'text'}
+            headers = {"Authorization": f"Bearer {self.api_key}"}
+            
+            nv_resp = get_client(self.base_url).post(f"{self.base_url}/audio/transcriptions", headers=headers,
+                                                     files=files, data=data, timeout=300.0)
+        finally:
+            audio_file.close()
         
         if nv_resp.status_code == 200:
             return nv_resp.text
@@ -73,7 +75,7 @@ class NvidiaAgent:
             }
 
             try:
-                nv_resp = requests.post(f"{self.base_url}/chat/completions", headers=headers, json=payload, timeout=240)
+                nv_resp = get_client(self.base_url).post(f"{self.base_url}/chat/completions", headers=headers, json=payload, timeout=240)
                 
                 if nv_resp.status_code == 200:
                     print(f"✅ [{model_name}] NVIDIA 摘要生成成功！")
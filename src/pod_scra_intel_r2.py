@@ -9,32 +9,236 @@
 # [V5.6.1 更新] 全面替換底層連線為 curl_cffi，統一全軍 HTTP 引擎。
 # [V5.9.1 補齊] 補回缺失的 compress_task_to_opus 核心壓縮邏輯，解救 KOYEB。
 # [V5.9.2 拆彈] 徹底移除 requests.get 的 with 語法，防止 curl_cffi 引發 __enter__ 崩潰。
+# [V6.16 升級] 新增 R2StreamUploader：分塊串流直灌 Multipart Upload，零落地、固定分片緩衝，
+#              失敗時主動 Abort，杜絕孤兒分片計費。
+# [V6.17 升級] 新增 R2OpusStreamTranscoder：下載分塊直灌 FFmpeg stdin，Opus 成品同步串流上 R2，
+#              一次搬運完成「下載 + 壓縮 + 入庫」，省去兵工廠的回頭下載。
+# [V6.18 升級] R2StreamUploader 支援續傳點匯出 (export_state) 與跨機甲接續 (resume)。
+# [V6.25 升級] 兵工廠壓縮改由轉檔勤務中心 (pod_scra_intel_transcoder) 的有界工作池執行。
+# [V6.26 升級] 壓縮前先探測片長，依位元率階梯挑選能落在 Groq 輕型區的規格，並回傳規格與大小/片長比。
+# [V6.27 升級] 選配修剪階段 (trim=True)：剔除長靜音與片頭片尾配樂，回傳省下秒數與時間軸對照表。
+# [V6.31 升級] 兵工廠原檔經節點音檔快取取貨；Opus 成品上架後以 R2 ETag 預熱快取，供聽打與摘要命中。
+# [V6.32 升級] get_s3_client 改由 pod_scra_intel_s3pool 提供 (行程內共用、有界連線池)，上傳套用 TRANSFER_CONFIG。
+# [修補] 融合產線上傳端故障時立即終止 FFmpeg，stdin 寫入改為拋出 OpusStreamError 而非永久阻塞。
+# [修補] 融合產線同樣依位元率階梯選規格 (以 Content-Length 保守推估片長)，並回報實際片長供寫入 opus_profile 等欄位。
 # ---------------------------------------------------------
 
-import os, gc, subprocess, boto3
+import os, re, gc, subprocess, threading, tempfile
 from curl_cffi import requests # 🚀 換裝：統一使用 curl_cffi
-from botocore.config import Config
-import imageio_ffmpeg   
+from src.pod_scra_intel_s3pool import get_s3_client, TRANSFER_CONFIG, R2_MIN_PART_SIZE, S3_PART_SIZE
+from src.pod_scra_intel_transcoder import get_transcoder, get_ffmpeg_path, probe_duration, pick_opus_profile, PROFILES
+from src.pod_scra_intel_trim import plan_trim, trim_filter
+from src.pod_scra_intel_fetch import fetch_to_tempfile
+from src.pod_scra_intel_audiocache import CACHE_ENABLED, store
 
-def get_s3_client():
-    """【基礎建設】建立並回傳 R2/S3 連線物件 (具備嚴格超時防護)"""
-    boto_config = Config(connect_timeout=15, read_timeout=60, retries={'max_attempts': 3})
-    return boto3.client('s3', endpoint_url=os.environ.get("R2_ENDPOINT_URL"),
-                        aws_access_key_id=os.environ.get("R2_ACCESS_KEY_ID"),
-                        aws_secret_access_key=os.environ.get("R2_SECRET_ACCESS_KEY"), 
-                        region_name="auto", config=boto_config)
+# 🧱 R2 要求除最後一片外，所有分片等長且 >= 5MB (分片大小與傳輸參數由連線池模組統一管理)
+R2_PART_SIZE = S3_PART_SIZE
+
+# 🧠 融合產線至少需 512MB 戰力 (兩組分片緩衝 + FFmpeg 常駐)
+FUSED_OPUS_MIN_MEM = 512
+
+# 🪜 融合產線無法先探測片長：以 Content-Length ÷ 64kbps 推估 (多數節目 >= 64kbps，寧可高估片長、選低一級規格)
+FUSED_SOURCE_BYTES_PER_SEC = 8000
+FUSED_FALLBACK_PROFILE = "opus_auto_16k"     # 🧭 來源未回報大小時的保守規格 (約 3 小時仍落在輕型區)
+
+def fused_opus_profile(content_length):
+    """融合產線規格：依來源大小推估片長後走位元率階梯，未知大小時採保守規格"""
+    if not content_length: return FUSED_FALLBACK_PROFILE
+    return pick_opus_profile(content_length / FUSED_SOURCE_BYTES_PER_SEC)[0]
+
+class OpusStreamError(Exception):
+    """融合產線的 FFmpeg 端故障 (與下載端的泥沼/封鎖錯誤區隔，供呼叫端退回兩段式流程)"""
+    pass
+
+class R2StreamUploader:
+    """
+    【串流倉儲】將 iter_content 的分塊直接灌入 R2 Multipart Upload。
+    緩衝區滿一個固定分片即上傳，峰值記憶體約為一至兩個分片，磁碟用量為零。
+    """
+    def __init__(self, s3, bucket, key, part_size=R2_PART_SIZE, upload_id=None, parts=None):
+        self.s3 = s3
+        self.bucket = bucket
+        self.key = key
+        self.part_size = max(part_size, R2_MIN_PART_SIZE)
+        self.buffer = bytearray()
+        self.parts = list(parts or [])
+        self.bytes_uploaded = self.part_size * len(self.parts)
+        self.closed = False
+        self.upload_id = upload_id or s3.create_multipart_upload(Bucket=bucket, Key=key)["UploadId"]
+
+    @classmethod
+    def resume(cls, s3, bucket, state):
+        """【續傳】依續傳點重新掛載未封箱的 Multipart，並向 R2 核對分片清單是否仍在"""
+        listed = s3.list_parts(Bucket=bucket, Key=state["key"], UploadId=state["upload_id"]).get("Parts", [])
+        live = {p["PartNumber"]: p["ETag"] for p in listed}
+        parts = state.get("parts") or []
+        if any(live.get(p["PartNumber"]) != p["ETag"] for p in parts):
+            raise ValueError("R2 分片清單與續傳點不符")
+        return cls(s3, bucket, state["key"], part_size=state["part_size"], upload_id=state["upload_id"], parts=parts)
+
+    def export_state(self):
+        """匯出續傳點：僅計入已送達 R2 的完整分片，緩衝區殘料不保留"""
+        return {"key": self.key, "upload_id": self.upload_id, "part_size": self.part_size,
+                "parts": list(self.parts), "offset": self.bytes_uploaded}
+
+    def detach(self):
+        """保留已送出的分片供下一位機甲續傳，本地不再 Abort"""
+        self.closed = True
+        self.buffer = bytearray()
+
+    @property
+    def bytes_received(self):
+        return self.bytes_uploaded + len(self.buffer)
+
+    def write(self, chunk):
+        self.buffer += chunk
+        while len(self.buffer) >= self.part_size:
+            self._flush_part(self.part_size)
+
+    def _flush_part(self, size):
+        view = memoryview(self.buffer)
+        body = bytes(view[:size])
+        view.release()
+        del self.buffer[:size]
+        part_no = len(self.parts) + 1
+        resp = self.s3.upload_part(Bucket=self.bucket, Key=self.key, PartNumber=part_no,
+                                   UploadId=self.upload_id, Body=body)
+        self.parts.append({"PartNumber": part_no, "ETag": resp["ETag"]})
+        self.bytes_uploaded += len(body)
+
+    def complete(self):
+        """封箱：送出尾片並合併，回傳總位元組數"""
+        if self.buffer or not self.parts:
+            self._flush_part(len(self.buffer))
+        self.s3.complete_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+                                          MultipartUpload={"Parts": self.parts})
+        self.closed = True
+        return self.bytes_uploaded
+
+    def abort(self):
+        """撤收：放棄本次上傳並清除已送出的分片，避免孤兒分片計費"""
+        if self.closed: return
+        self.closed = True
+        self.buffer = bytearray()
+        try:
+            self.s3.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id)
+        except Exception as e:
+            print(f"⚠️ [R2_STREAM] Multipart 撤收失敗 ({self.key}): {e}")
+
+class R2OpusStreamTranscoder:
+    """
+    【融合產線】下載分塊寫入 FFmpeg stdin，背景執行緒將 Opus 輸出串流灌入 R2 Multipart。
+    FFmpeg 端任何異常皆轉為 OpusStreamError，呼叫端據此退回「原檔入庫、兵工廠再壓」的兩段式流程。
+    """
+    def __init__(self, s3, bucket, key, profile="opus_auto_32k"):
+        self.key = key
+        self.profile = profile
+        self.error = None
+        self.duration = None
+        self.uploader = R2StreamUploader(s3, bucket, key, part_size=R2_MIN_PART_SIZE)
+        # ⏱️ 片長無法事先探測：由 -progress 報表取得實際編碼時長 (寫入暫存檔，不佔管線)
+        fd, self.progress_path = tempfile.mkstemp(prefix="opus_progress_", suffix=".txt")
+        os.close(fd)
+        cmd = [
+            get_ffmpeg_path(), "-i", "pipe:0", "-vn", *PROFILES[profile],
+            "-f", "ogg", "-loglevel", "error", "-progress", self.progress_path, "pipe:1"
+        ]
+        try:
+            self.proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        except Exception as e:
+            self.uploader.abort()
+            self._cleanup()
+            raise OpusStreamError(f"FFmpeg 無法啟動: {e}")
+        self.reader = threading.Thread(target=self._drain, daemon=True)
+        self.reader.start()
+
+    def _drain(self):
+        try:
+            while True:
+                data = self.proc.stdout.read(64 * 1024)
+                if not data: break
+                self.uploader.write(data)
+        except Exception as e:
+            self.error = e
+            # 💀 上傳端故障後不再讀取 stdout：立即終止 FFmpeg，否則輸出管線塞滿、stdin 寫入永久阻塞
+            try: self.proc.kill()
+            except Exception: pass
+
+    def write(self, chunk):
+        if self.error: raise OpusStreamError(f"Opus 上傳端故障: {self.error}")
+        if self.proc.poll() is not None: raise OpusStreamError(f"FFmpeg 已提前結束 (rc={self.proc.returncode})")
+        try:
+            self.proc.stdin.write(chunk)
+        except (BrokenPipeError, OSError, ValueError) as e:
+            raise OpusStreamError(f"FFmpeg 管線中斷 (rc={self.proc.poll()}): {e}")
+
+    def finish(self, timeout=600):
+        """封箱：關閉 stdin 等待 FFmpeg 收尾，成功則回傳 Opus 位元組數"""
+        try:
+            self.proc.stdin.close()
+            rc = self.proc.wait(timeout=timeout)
+            self.reader.join(timeout=timeout)
+        except Exception as e:
+            raise OpusStreamError(f"FFmpeg 收尾失敗: {e}")
+        if rc != 0: raise OpusStreamError(f"FFmpeg 壓縮失敗 (rc={rc})")
+        if self.error or self.reader.is_alive(): raise OpusStreamError(f"Opus 上傳端故障: {self.error}")
+        if self.uploader.bytes_received == 0: raise OpusStreamError("FFmpeg 未產出任何 Opus 資料")
+        self.duration = self._read_duration()
+        self._cleanup()
+        return self.uploader.complete()
+
+    def meta(self, opus_bytes):
+        """成品規格資訊 (欄位與兵工廠 compress_task_to_opus 一致)"""
+        meta = {"opus_profile": self.profile}
+        if self.duration:
+            meta["audio_duration_sec"] = round(self.duration, 1)
+            meta["opus_bytes_per_sec"] = round(opus_bytes / self.duration, 1)
+        return meta
+
+    def _read_duration(self):
+        try:
+            with open(self.progress_path, "rb") as f:
+                found = re.findall(rb"out_time_us=(\d+)", f.read())
+            return int(found[-1]) / 1e6 if found and int(found[-1]) > 0 else None
+        except Exception:
+            return None
+
+    def _cleanup(self):
+        try: os.remove(self.progress_path)
+        except Exception: pass
+
+    def abort(self):
+        try:
+            if self.proc.poll() is None: self.proc.kill()
+            self.proc.wait(timeout=10)
+        except Exception: pass
+        self.reader.join(timeout=10)
+        self.uploader.abort()
+        self._cleanup()
 
 def upload_to_r2(local_path, filename):
     """【倉儲物流】將本機物資上傳至 R2"""
     s3 = get_s3_client()
-    s3.upload_file(local_path, os.environ.get("R2_BUCKET_NAME"), filename)
+    s3.upload_file(local_path, os.environ.get("R2_BUCKET_NAME"), filename, Config=TRANSFER_CONFIG)
+
+def seed_cache(s3, bucket, key, local_path):
+    """【快取預熱】剛上架的成品以 R2 回報的 ETag 入節點快取，後續聽打/摘要直接命中"""
+    if not CACHE_ENABLED: return
+    try:
+        etag = s3.head_object(Bucket=bucket, Key=key).get("ETag")
+        f = store(key, etag, src_path=local_path)
+        if f: f.close()
+    except Exception as e:
+        print(f"⚠️ [音檔快取] 成品預熱失敗 (不影響入庫): {str(e)[:80]}")
 
-def compress_task_to_opus(task_id, original_r2_url):
+def compress_task_to_opus(task_id, original_r2_url, trim=False, mem_tier=None):
     """
     【兵工廠】從 R2 下載原檔，使用 FFmpeg 極限壓縮為 Opus，再回傳 R2。
-    使用 32k bitrate, 16k 採樣率，單聲道，追求極致的檔案縮小，專為 STT 打造。
+    16k 採樣率、單聲道；位元率依片長自 32k 起逐級下修，讓成品落在 Groq 輕型區內，專為 STT 打造。
+    mem_tier 為面板 MEM_TIER (轉檔勤務中心定編依據)，未提供時沿用現有工作池。
+    回傳 (成功與否, R2 名稱, 壓縮規格資訊 dict)。
     """
-    tmp_dl = f"/tmp/dl_{task_id}.tmp"
+    tmp_dl = None
     tmp_op = f"/tmp/opt_{task_id[:8]}.opus"
     
     pub_url = os.environ.get("R2_PUBLIC_URL", "").rstrip('/')
@@ -42,53 +246,48 @@ def compress_task_to_opus(task_id, original_r2_url):
     bucket = os.environ.get("R2_BUCKET_NAME")
 
     try:
-        ffmpeg_path = imageio_ffmpeg.get_ffmpeg_exe()
-        if not ffmpeg_path or not os.path.exists(ffmpeg_path):
-            print(f"⚠️ [R2_COMPRESS] 找不到 imageio_ffmpeg，嘗試使用系統內建 ffmpeg...")
-            ffmpeg_path = "ffmpeg"
-            
         file_url = f"{pub_url}/{original_r2_url}"
         print(f"📥 [R2_COMPRESS] 開始下載物資: {file_url}")
         
-        # 🚀 拆除 __enter__ 炸彈：不使用 with，直接賦值並使用 try...finally 關閉
-        r = requests.get(file_url, stream=True, timeout=120)
-        try:
-            r.raise_for_status()
-            with open(tmp_dl, 'wb') as f:
-                for chunk in r.iter_content(chunk_size=1024 * 1024):
-                    if chunk: f.write(chunk)
-        finally:
-            r.close()
+        # 📦 [V6.31] 經節點音檔快取取貨 (重試時免再下載原檔)
+        tmp_dl, _ = fetch_to_tempfile(file_url, suffix=f"_dl_{task_id}.tmp", timeout=120)
                     
-        print(f"⚙️ [R2_COMPRESS] 啟動壓縮產線...")
-        cmd = [
-            ffmpeg_path, "-y", "-i", tmp_dl,
-            "-c:a", "libopus", "-b:a", "32k", "-vbr", "on", 
-            "-compression_level", "10", "-ac", "1", "-ar", "16000",
-            "-loglevel", "error", "-nostdin", tmp_op
-        ]
-        
-        subprocess.run(cmd, check=True, timeout=600)
+        # 🪜 [V6.26] 片長導向選規格 (有修剪計畫時以修剪後片長計算)
+        duration = probe_duration(tmp_dl)
+        plan = plan_trim(tmp_dl, duration) if trim else None
+        encoded_duration = plan["kept_seconds"] if plan else duration
+        profile, kbps = pick_opus_profile(encoded_duration)
+        if plan:
+            print(f"✂️ [R2_COMPRESS] 修剪計畫：剔除 {plan['seconds_saved']:.0f}s 靜音/配樂 (保留 {len(plan['keep'])} 段)")
+        print(f"⚙️ [R2_COMPRESS] 片長 {encoded_duration or 0:.0f}s，選用 {profile}，送交轉檔勤務中心...")
+        ok, err = get_transcoder(mem_tier).transcode(tmp_dl, tmp_op, profile, timeout=600,
+                                             af=trim_filter(plan["keep"]) if plan else None)
+        if not ok:
+            print(f"❌ [R2_COMPRESS] FFmpeg 壓縮失敗 (超時或檔案損壞): {err}")
+            return False, original_r2_url, None
         
         new_r2_name = os.path.basename(tmp_op)
-        print(f"📤 [R2_COMPRESS] 壓縮完畢，上傳成品: {new_r2_name}")
-        s3.upload_file(tmp_op, bucket, new_r2_name)
+        size_bytes = os.path.getsize(tmp_op)
+        print(f"📤 [R2_COMPRESS] 壓縮完畢 ({size_bytes / 1048576:.1f}MB)，上傳成品: {new_r2_name}")
+        s3.upload_file(tmp_op, bucket, new_r2_name, Config=TRANSFER_CONFIG)
+        seed_cache(s3, bucket, new_r2_name, tmp_op)
         
-        return True, new_r2_name
+        meta = {"opus_profile": profile, "size_bytes": size_bytes}
+        if duration:
+            meta["audio_duration_sec"] = round(duration, 1)
+            meta["opus_bytes_per_sec"] = round(size_bytes / encoded_duration, 1)
+        if plan:
+            meta["trim_seconds_saved"] = plan["seconds_saved"]
+            meta["trim_map"] = plan["trim_map"]
+        return True, new_r2_name, meta
 
     except requests.exceptions.HTTPError as he:
         print(f"❌ [R2_COMPRESS] 下載原檔 HTTP 失敗: {he}")
-        return False, original_r2_url
-    except subprocess.TimeoutExpired:
-        print(f"❌ [R2_COMPRESS] 壓縮超時 (600s)，強制中斷任務！")
-        return False, original_r2_url
-    except subprocess.CalledProcessError as e:
-        print(f"❌ [R2_COMPRESS] FFmpeg 壓縮失敗，可能檔案已損壞: {e}")
-        return False, original_r2_url
+        return False, original_r2_url, None
     except Exception as e:
         print(f"❌ [R2_COMPRESS] 壓縮流程發生未預期錯誤: {e}")
-        return False, original_r2_url
+        return False, original_r2_url, None
     finally:
-        if os.path.exists(tmp_dl): os.remove(tmp_dl)
+        if tmp_dl and os.path.exists(tmp_dl): os.remove(tmp_dl)
         if os.path.exists(tmp_op): os.remove(tmp_op)
         gc.collect()
\ No newline at end of file
@@ -0,0 +1,55 @@
+# ---------------------------------------------------------
+# src/pod_scra_intel_s3pool.py (V6.32 R2 連線池)
+# 職責：全軍共用的 boto3 S3 客戶端。原本每次 upload_to_r2 / 壓縮 / 物流批次都重建客戶端
+#       (數百毫秒的憑證與端點解析，且連線池隨之丟棄)；改為行程內惰性建立、依端點與金鑰快取。
+# [連線] max_pool_connections = S3_POOL_SIZE (預設 16)，與 TransferConfig 併發數對齊，
+#        boto3 客戶端本身執行緒安全，各車道共用同一個連線池。
+# [傳輸] TRANSFER_CONFIG：超過門檻的上傳走 Multipart 併發分片，下載走 Range 平行分段 GET；
+#        分片大小 R2_PART_SIZE_MB (R2 規定除最後一片外 >= 5MB)。
+# [相依] 本模組不引用任何 src 內部模組 (GHA 腳本可直接 import)。
+# ---------------------------------------------------------
+import os, threading
+import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+
+MB = 1024 * 1024
+R2_MIN_PART_SIZE = 5 * MB
+S3_POOL_SIZE = int(os.environ.get("S3_POOL_SIZE", 16))
+S3_PART_SIZE = max(int(float(os.environ.get("R2_PART_SIZE_MB", 8)) * MB), R2_MIN_PART_SIZE)
+S3_MAX_CONCURRENCY = max(1, min(int(os.environ.get("S3_MAX_CONCURRENCY", 8)), S3_POOL_SIZE))
+
+def make_transfer_config(part_size=S3_PART_SIZE, concurrency=S3_MAX_CONCURRENCY):
+    """Multipart 上傳 / Range 平行下載的傳輸參數 (門檻 = 單一分片大小)"""
+    part_size = max(int(part_size), R2_MIN_PART_SIZE)
+    return TransferConfig(multipart_threshold=part_size, multipart_chunksize=part_size,
+                          max_concurrency=concurrency, use_threads=True)
+
+TRANSFER_CONFIG = make_transfer_config()
+
+_clients = {}
+_lock = threading.Lock()
+
+def get_s3_client(endpoint_url=None, access_key_id=None, secret_access_key=None):
+    """【基礎建設】取得行程內共用的 R2/S3 客戶端 (具備嚴格超時與有界連線池)，未指定時讀取環境變數"""
+    endpoint_url = endpoint_url or os.environ.get("R2_ENDPOINT_URL")
+    access_key_id = access_key_id or os.environ.get("R2_ACCESS_KEY_ID")
+    secret_access_key = secret_access_key or os.environ.get("R2_SECRET_ACCESS_KEY")
+    cache_key = (endpoint_url, access_key_id)
+    with _lock:
+        client = _clients.get(cache_key)
+        if client is None:
+            boto_config = Config(connect_timeout=15, read_timeout=60, retries={'max_attempts': 3},
+                                 max_pool_connections=S3_POOL_SIZE, tcp_keepalive=True)
+            client = boto3.client('s3', endpoint_url=endpoint_url, aws_access_key_id=access_key_id,
+                                  aws_secret_access_key=secret_access_key, region_name="auto", config=boto_config)
+            _clients[cache_key] = client
+        return client
+
+def upload_file(s3, local_path, bucket, key, config=TRANSFER_CONFIG):
+    """Multipart 併發上傳 (小於分片大小時單次 PUT)"""
+    s3.upload_file(local_path, bucket, key, Config=config)
+
+def download_file(s3, bucket, key, local_path, config=TRANSFER_CONFIG):
+    """Range 平行分段下載 (小於分片大小時單次 GET)"""
+    s3.download_file(bucket, key, local_path, Config=config)
\ No newline at end of file
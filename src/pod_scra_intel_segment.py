@@ -0,0 +1,96 @@
+# ---------------------------------------------------------
+# src/pod_scra_intel_segment.py (V6.28 分段平行聽打)
+# 職責：重型任務 (>24.5MB) 原本只能排隊給 Gladia/Speechmatics 慢速輪詢 (單集最長約 400 秒)。
+#       本模組將 Opus 於靜音處切成「每段都在 Groq 上限內」的重疊分段，平行聽打後再縫合，
+#       端到端延遲約為「分段數 ÷ 併發數」個輕型任務。
+# [切段] 1. 目標段長 = min(SEGMENT_SECONDS, 單段上限大小 ÷ 位元組/秒)；於目標切點前 SEARCH_SECONDS 秒內找最近靜音。
+#        2. 相鄰分段各向外延伸 OVERLAP_SECONDS，避免切點上的字詞遺失；以 -c copy 封裝，不重新編碼。
+# [縫合] 前段尾端與後段開頭以 difflib 做詞級對齊，保留前段至重疊起點、後段自對齊處接續；
+#        對不上 (少於 STITCH_MIN_MATCH 詞) 時直接串接。
+# ---------------------------------------------------------
+import os, re, shutil, difflib, tempfile, subprocess
+from concurrent.futures import ThreadPoolExecutor
+from src.pod_scra_intel_transcoder import get_ffmpeg_path, probe_duration, GROQ_LIGHT_ZONE_MB, SIZE_SAFETY
+from src.pod_scra_intel_trim import analyze_audio
+
+SEGMENT_SECONDS = int(os.environ.get("STT_SEGMENT_SECONDS", 600))   # ⏱️ 預設 10 分鐘一段
+OVERLAP_SECONDS = 4.0
+SEARCH_SECONDS = 45.0
+STITCH_WINDOW_WORDS = 60         # 🔗 對齊時只比對前段尾端 / 後段開頭各 60 詞
+STITCH_MIN_MATCH = 3
+
+def plan_segments(src, duration, size_bytes, limit_mb=GROQ_LIGHT_ZONE_MB):
+    """【切段計畫】回傳 [(起, 迄), ...] (已含重疊)；不需分段時回傳單一區間"""
+    bytes_per_sec = size_bytes / max(duration, 1.0)
+    target = min(SEGMENT_SECONDS, limit_mb * SIZE_SAFETY * 1024 * 1024 / bytes_per_sec - 2 * OVERLAP_SECONDS)
+    target = max(target, 60.0)
+    if duration <= target: return [(0.0, duration)]
+
+    silences, _ = analyze_audio(src)
+    mids = sorted((a + b) / 2 for a, b in (silences or []))
+
+    cuts, cursor = [], 0.0
+    while duration - cursor > target:
+        # ⚖️ 剩餘長度不足「一段 + 1 分鐘」時對半切，避免尾端只剩零碎短段
+        remaining = duration - cursor
+        ideal = cursor + (target if remaining > target + 60 else remaining / 2)
+        near = [m for m in mids if ideal - SEARCH_SECONDS <= m <= ideal and m > cursor + 60]
+        cut = max(near) if near else ideal    # 🔪 寧可略短也不超過目標長度 (大小上限)
+        cuts.append(cut)
+        cursor = cut
+    bounds = [0.0] + cuts + [duration]
+    return [(max(a - OVERLAP_SECONDS, 0.0), min(b + OVERLAP_SECONDS, duration)) for a, b in zip(bounds[:-1], bounds[1:])]
+
+def cut_segment(src, start, end, dst, timeout=120):
+    """以串流複製 (-c copy) 切出分段，不重新編碼"""
+    cmd = [get_ffmpeg_path(), "-nostdin", "-loglevel", "error", "-y", "-ss", f"{start:.3f}", "-i", src,
+           "-t", f"{end - start:.3f}", "-vn", "-c:a", "copy", dst]
+    res = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=timeout)
+    return res.returncode == 0 and os.path.exists(dst)
+
+def _norm(word):
+    return re.sub(r"[^\w']", "", word.lower())
+
+def stitch_transcripts(texts):
+    """【縫合】依詞級對齊去除重疊段的重複字詞"""
+    words = []
+    for text in texts:
+        nxt = (text or "").split()
+        if not words:
+            words = nxt; continue
+        tail_start = max(len(words) - STITCH_WINDOW_WORDS, 0)
+        tail = [_norm(w) for w in words[tail_start:]]
+        head = [_norm(w) for w in nxt[:STITCH_WINDOW_WORDS]]
+        match = difflib.SequenceMatcher(None, tail, head, autojunk=False).find_longest_match(0, len(tail), 0, len(head))
+        if match.size >= STITCH_MIN_MATCH:
+            words = words[:tail_start + match.a] + nxt[match.b:]
+        else:
+            words = words + nxt
+    return " ".join(words)
+
+def transcribe_segmented(src, transcribe_fn, concurrency=2, size_bytes=None):
+    """
+    【分段平行聽打】切段後以 concurrency 條車道平行呼叫 transcribe_fn(分段路徑, 序號)，
+    任一分段失敗即回傳 (None, 錯誤清單)，成功回傳 (縫合逐字稿, 分段數)。
+    """
+    duration = probe_duration(src)
+    if not duration: return None, ["SEGMENT_PROBE_FAIL"]
+    size_bytes = size_bytes or os.path.getsize(src)
+    spans = plan_segments(src, duration, size_bytes)
+    print(f"✂️ [分段聽打] 片長 {duration:.0f}s -> {len(spans)} 段，{concurrency} 車道併發")
+
+    work_dir = tempfile.mkdtemp(prefix="stt_seg_")
+    try:
+        paths = []
+        for i, (a, b) in enumerate(spans):
+            path = os.path.join(work_dir, f"seg_{i:03d}.opus")
+            if not cut_segment(src, a, b, path): return None, [f"SEGMENT_CUT_FAIL_{i}"]
+            paths.append(path)
+
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+            results = list(pool.map(lambda p: transcribe_fn(p[1], p[0]), enumerate(paths)))
+        errors = [f"seg{i}:{err}" for i, (text, err) in enumerate(results) if not text]
+        if errors: return None, errors
+        return stitch_transcripts([text for text, _ in results]), len(paths)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
\ No newline at end of file
@@ -9,15 +9,39 @@
 # 3. 確立 24.5MB 輕重型任務分流點，極限壓榨 Groq 免費算力。
 #  Gladia -> 每月重置 10 小時(有2組) Speechmatics -> 每月重置 8 小時
 #  AssemblyAI ->每月提供約 5 小時(總額度免費一次使用) Deepgram(一次性 200 美元)
+# [V6.28 升級] 分段平行聽打：重型任務切成多個 Groq 輕型分段 (GROQ_API_KEYS 多組金鑰輪替) 平行聽打後縫合，
+#              分段若 Groq 全數失手，暫存 R2 改由 Gladia/Speechmatics 補打；整體失敗才退回整檔重型區。
+# [V6.29 升級] 輕型區改以 fetch_spooled 串流落地、檔案物件交 httpx 串流上傳，不再整檔 resp.content 進記憶體；
+#              FLY_LAX / ALWAYSDATA 的 8MB 以上跳過 Groq 限制隨之解除。
+# [V6.33 升級] URL 供應商拆成「送單 / 輪詢規格」：帶 task_id 呼叫時重型區送單後立即落帳 (pod_scra_stt_jobs) 返回，
+#              不再原地 sleep 輪詢數百秒；收件由 poll_stt_job 於後續巡邏完成，已失敗的供應商不再重送。
+# [V6.34 升級] 新增 poll_stt_job_async 供事件迴圈收件；送單依各金鑰在途上限分散，全數額滿時延後任務。
+# [V6.35 升級] 固定戰術順序改為計分板 (pod_scra_stt_scoreboard) 動態排序：依成功率與 p50 耗時決定先後，
+#              額度告警 / 連續失敗的供應商金鑰斷路冷卻，路由時直接略過，不再每件任務白燒下載與逾時。
+# [V6.36 升級] 重型區改以音訊秒數額度帳本 (pod_scra_stt_quota) 原子預留：放不下整段音訊的金鑰略過，
+#              剩餘額度最多者優先；成功結算、失敗退回，帳本不可用時退回舊版次數制滴流。
+# [V6.37 升級] Groq 呼叫改由調度中心 (pod_scra_intel_groqpool) 依多金鑰令牌桶派工，取代固定 10 秒冷卻。
+# [V6.38 升級] 送單 / 輪詢 / Deepgram 一律走供應商連線池 (pod_scra_intel_httppool)，輪詢不再每次重新握手。
+# [修補] 有工單帳本 (task_id) 時分段不再原地輪詢 Gladia/Speechmatics 補打：分段失手即整檔交重型區送單落帳，
+#        機甲重啟不會遺失工單、同段音訊不會付費兩次；同步補打僅保留給未接帳本的呼叫端。
 # ---------------------------------------------------------
 # [S_LOG 守則] 未來若新增 log_system_error，請務必放置於「最外層的 except 區塊」。
 # [防禦機制] 嚴禁置於 Retry 迴圈或高頻輪詢內，以防 API 崩潰時無限觸發寫入，導致資料庫超載。
 # ---------------------------------------------------------
 #
-import os, gc, time, json
-import httpx 
-from curl_cffi import requests 
+import os, time, json
+from src.pod_scra_intel_httppool import get_client
 from datetime import datetime, timezone
+from src.pod_scra_intel_segment import transcribe_segmented
+from src.pod_scra_intel_transcoder import probe_duration
+from src.pod_scra_intel_fetch import fetch_spooled, fetch_to_tempfile
+from src.pod_scra_intel_sttjobs import record_job, failed_providers, live_counts, has_capacity
+from src.pod_scra_intel_sttscore import load_board, allow, order_slots, record_outcome
+from src.pod_scra_intel_groqpool import get_groq_pool, groq_keys_from_env
+from src.pod_scra_intel_sttquota import estimate_audio_sec, load_remaining, rank_by_budget, reserve, commit, release
+
+# 📝 回傳純文字逐字稿的供應商標籤 (第二棒據此判定餵給摘要的是逐字稿而非原始音檔)
+TEXT_PROVIDERS = ("GROQ", "GROQ_SEG", "NVIDIA", "GLADIA", "SPEECHMATICS", "ASSEMBLYAI", "DEEPGRAM")
 
 # =========================================================
 # 🛡️ 戰術控制與基礎模組
@@ -27,9 +51,13 @@ def get_stt_secrets():
     # 如果有舊的 GLADIA_API_KEY 變數，它也能相容讀取
     raw_gladia = os.environ.get("GLADIA_API_KEYS", os.environ.get("GLADIA_API_KEY", ""))
     gladia_keys = [k.strip() for k in raw_gladia.split(",") if k.strip()]
+    # 🚀 [V6.28] Groq 多組金鑰 (分段平行聽打時輪替分攤限流)；[V6.37] 與 Groq 調度中心共用同一份金鑰清單
+    groq_key = os.environ.get("GROQ_API_KEY", os.environ.get("GROQ_KEY"))
+    groq_keys = groq_keys_from_env()
 
     return {
-        "GROQ_KEY": os.environ.get("GROQ_API_KEY", os.environ.get("GROQ_KEY")),
+        "GROQ_KEY": groq_key or (groq_keys[0] if groq_keys else None),
+        "GROQ_KEYS": groq_keys,
         "GLADIA_KEYS": gladia_keys,  # 變成陣列 (List)
         "SPEECHMATICS_KEY": os.environ.get("SPEECHMATICS_API_KEY"),
         "ASSEMBLYAI_KEY": os.environ.get("ASSEMBLYAI_API_KEY"),
@@ -109,86 +137,187 @@ def check_and_update_quota(sb, provider_name):
 # 🎯 此版本已實裝 Groq 雙核防爆輪詢機制 (與 GHA 同步)
 # ---------------------------------------------------------
 
-def _call_groq(api_key, audio_data, filename, mime_type):
-    """執行 Groq STT 聽寫，具備雙核模型自動降級功能"""
-    if not api_key: return None, "NO_API_KEY"
+def _call_groq(keys, audio_data, filename, mime_type):
+    """
+    執行 Groq STT 聽寫 (audio_data 可為 bytes 或可 seek 的檔案物件)，回傳 (逐字稿, 狀態, 使用的金鑰)。
+    🚀 [V6.37] 交由 Groq 調度中心：keys 中第一把有餘額的金鑰開火，Turbo 全數金鑰額度不足時才降級 Whisper-V3。
+    """
+    if not keys: return None, "NO_API_KEY", None
     print("🎯 [Plan B] 呼叫 Groq 聽寫...")
-    
-    # 🚀 [V6.16 穩固雙核版] 
-    # 首選極速 Turbo，限流時降級至原版 Whisper-V3 進行穩定輸出。
-    groq_stt_models = [
-        "whisper-large-v3-turbo", 
-        "whisper-large-v3"
-    ]
-    
-    last_error = ""
-    
-    for model_name in groq_stt_models:
+    return get_groq_pool().transcribe(audio_data, filename, mime_type, keys=keys)
+
+# ---------------------------------------------------------
+# 📮 [V6.33] 遠端工單供應商：送單 (submit) 與輪詢 (poll spec) 拆開，
+#    同步等候 (_await_job) 與帳本收件 (poll_stt_job) 共用同一套解析邏輯。
+# ---------------------------------------------------------
+def _retry_after(resp, default=10.0):
+    try: return max(float(resp.headers.get("Retry-After")), 1.0)
+    except (TypeError, ValueError): return default
+
+def _submit_gladia(api_key, audio_url, sb=None):
+    headers = {"x-gladia-key": api_key, "Content-Type": "application/json"}
+    url = "https://api.gladia.io/v2/transcription"
+    resp = get_client(url).post(url, headers=headers, json={"audio_url": audio_url}, timeout=30)
+
+    if resp.status_code in [401, 402, 403, 429]:
+        log_quota_exhaustion(sb, "Gladia", resp.status_code, resp.text)
+        return None, f"GLADIA_QUOTA_HIT_{resp.status_code}"
+
+    if resp.status_code not in [200, 201, 202]:
+        return None, f"GLADIA_INIT_FAIL_{resp.status_code}"
+
+    result_url = resp.json().get("result_url")
+    if not result_url: return None, "GLADIA_NO_RESULT_URL"
+    return result_url, "SUBMITTED"
+
+def _gladia_poll_spec(api_key, result_url):
+    def parse(resp):
+        if resp.status_code == 429: return "retry", _retry_after(resp)
+        if resp.status_code != 200: return "pending", None
+        data = resp.json()
+        status = data.get("status")
+        if status == "done":
+            result = data.get("result", {})
+            full_text = " ".join([utt.get("text", "") for utt in result.get("transcription", {}).get("utterances", [])])
+            return "done", full_text if full_text else "GLADIA_EMPTY_TEXT"
+        elif status in ["error", "aborted"]:
+            return "error", f"GLADIA_PROCESS_ERROR_{status}"
+        return "pending", None
+    return {"url": result_url, "headers": {"x-gladia-key": api_key}, "parse": parse}
+
+SPEECHMATICS_JOBS_URL = "https://asr.api.speechmatics.com/v2/jobs"
+
+def _submit_speechmatics(api_key, audio_url, sb=None):
+    headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
+
+    # 🚀 [V6.14 修復] 嚴格遵守 Speechmatics V2 巢狀參數格式
+    payload = {
+        "type": "transcription",
+        "fetch_data": {"url": audio_url},
+        "config": {
+            "type": "transcription",
+            "transcription_config": {
+                "operating_point": "enhanced",
+                "language": "en"
+            }
+        }
+    }
+
+    resp = get_client(SPEECHMATICS_JOBS_URL).post(SPEECHMATICS_JOBS_URL, headers=headers, json=payload, timeout=30)
+
+    if resp.status_code in [401, 402, 403, 429]:
+        log_quota_exhaustion(sb, "Speechmatics", resp.status_code, resp.text)
+        return None, f"SPEECHMATICS_QUOTA_HIT_{resp.status_code}"
+
+    if resp.status_code not in [200, 201]:
+        return None, f"SPEECHMATICS_INIT_FAIL_{resp.status_code}"
+
+    job_id = resp.json().get("id")
+    if not job_id: return None, "SPEECHMATICS_NO_JOB_ID"
+    return job_id, "SUBMITTED"
+
+def _speechmatics_poll_spec(api_key, job_id):
+    headers = {"Authorization": f"Bearer {api_key}"}
+    status_url = f"{SPEECHMATICS_JOBS_URL}/{job_id}"
+
+    def parse_transcript(resp):
+        if resp.status_code == 429: return "retry", _retry_after(resp)
+        if resp.status_code == 200: return "done", resp.text
+        return "error", f"SPEECHMATICS_DL_FAIL_{resp.status_code}"
+
+    def parse(resp):
+        if resp.status_code == 429: return "retry", _retry_after(resp)
+        if resp.status_code != 200: return "pending", None
+        status = resp.json().get("job", {}).get("status")
+        if status == "done":
+            return "next", {"url": f"{status_url}/transcript?format=txt", "headers": headers, "parse": parse_transcript}
+        elif status in ["rejected", "deleted"]:
+            return "error", f"SPEECHMATICS_REJECTED_{status}"
+        return "pending", None
+    return {"url": status_url, "headers": headers, "parse": parse}
+
+def _submit_assemblyai(api_key, audio_url, sb=None):
+    headers = {"authorization": api_key, "content-type": "application/json"}
+    url = "https://api.assemblyai.com/v2/transcript"
+    resp = get_client(url).post(url, json={"audio_url": audio_url, "language_code": "en_us"}, headers=headers, timeout=15)
+    if resp.status_code != 200: return None, f"ASSEMBLYAI_INIT_FAIL_{resp.status_code}"
+    transcript_id = resp.json().get("id")
+    if not transcript_id: return None, "ASSEMBLYAI_NO_ID"
+    return transcript_id, "SUBMITTED"
+
+def _assemblyai_poll_spec(api_key, transcript_id):
+    def parse(resp):
+        if resp.status_code == 429: return "retry", _retry_after(resp)
+        if resp.status_code != 200: return "pending", None
+        data = resp.json()
+        if data["status"] == "completed": return "done", data["text"]
+        elif data["status"] == "error": return "error", f"ASSEMBLYAI_PROCESS_ERROR_{data.get('error')}"
+        return "pending", None
+    return {"url": f"https://api.assemblyai.com/v2/transcript/{transcript_id}", "headers": {"authorization": api_key}, "parse": parse}
+
+# 🗂️ 供應商名稱 -> (送單, 輪詢規格, 同步等候輪數)
+STT_JOB_PROVIDERS = {
+    "GLADIA":       (_submit_gladia, _gladia_poll_spec, 40),
+    "SPEECHMATICS": (_submit_speechmatics, _speechmatics_poll_spec, 40),
+    "ASSEMBLYAI":   (_submit_assemblyai, _assemblyai_poll_spec, 30),
+}
+
+def _job_api_key(s, provider, key_index=0):
+    """依帳本的金鑰序號取回金鑰 (帳本不存金鑰本體)"""
+    if provider == "GLADIA":
+        keys = s['GLADIA_KEYS']
+        return keys[key_index] if 0 <= key_index < len(keys) else None
+    return s.get(f"{provider}_KEY")
+
+POLL_TIMEOUT = 15.0
+
+def _run_poll(client, spec):
+    """執行輪詢規格 (含 Speechmatics 完工後的逐字稿下載)，回傳 (狀態, 值)；client 為 None 時走該主機共用連線池"""
+    while True:
+        resp = (client or get_client(spec["url"])).get(spec["url"], headers=spec["headers"], timeout=POLL_TIMEOUT)
+        state, value = spec["parse"](resp)
+        if state != "next": return state, value
+        spec = value
+
+def _await_job(provider, api_key, job_ref, interval=10):
+    """【同步等候】送單後原地輪詢至完工 (僅限未接帳本的呼叫端，如無 task_id 的分段補打)"""
+    polls = STT_JOB_PROVIDERS[provider][2]
+    for _ in range(polls):
+        time.sleep(interval)
         try:
-            print(f"   ↳ 嘗試裝載聽打模型: {model_name}...")
-            headers = {"Authorization": f"Bearer {api_key}"}
-            files = {'file': (filename, audio_data, mime_type)}
-            data = {'model': model_name, 'response_format': 'text', 'language': 'en'}
-            
-            with httpx.Client(timeout=180.0) as client:
-                resp = client.post("https://api.groq.com/openai/v1/audio/transcriptions", headers=headers, files=files, data=data)
-            
-            if resp.status_code == 200: 
-                return resp.text, "SUCCESS"
-            
-            # 🛡️ 捕捉 429 限流或 502/503 伺服器抖動
-            elif resp.status_code in [429, 502, 503]:
-                last_error = f"GROQ_HTTP_{resp.status_code}_{resp.text[:50]}"
-                print(f"   ⚠️ 模型 {model_name} 暫時無法連線或限流 (HTTP {resp.status_code})。")
-                print("   ⏳ 進入 10 秒戰術冷卻，準備切換下一順位...")
-                time.sleep(10) # 讓 Groq 的 Token 桶稍微恢復
-                continue
-            else:
-                # 發生 400 (Bad Request) 等不可恢復錯誤，直接報錯不浪費時間
-                return None, f"GROQ_HTTP_{resp.status_code}_{resp.text[:50]}"
-                
-        except Exception as e:
-            last_error = f"GROQ_EXC_{str(e)[:50]}"
-            print(f"   ❌ 模型 {model_name} 通訊崩潰，嘗試備援...")
+            state, value = _run_poll(None, STT_JOB_PROVIDERS[provider][1](api_key, job_ref))
+        except Exception:
             continue
-            
-    # 如果兩個模型都失敗，回傳最後的錯誤訊息
-    return None, last_error
+        if state == "done": return value, "SUCCESS"
+        if state == "error": return None, value
+    return None, f"{provider}_TIMEOUT"
 
+def poll_stt_job(s, job, client=None):
+    """【收件】對帳本工單輪詢一次，回傳 ("done", 逐字稿) / ("pending", None) / ("retry", 秒) / ("error", 原因)"""
+    api_key = _job_api_key(s, job["provider"], job.get("key_index") or 0)
+    if not api_key: return "error", f"{job['provider']}_NO_API_KEY"
+    spec = STT_JOB_PROVIDERS[job["provider"]][1](api_key, job["job_ref"])
+    return _run_poll(client, spec)
 
+async def poll_stt_job_async(s, job, client):
+    """【收件 (非同步)】與 poll_stt_job 相同的輪詢規格，供事件迴圈多工單併行輪詢"""
+    api_key = _job_api_key(s, job["provider"], job.get("key_index") or 0)
+    if not api_key: return "error", f"{job['provider']}_NO_API_KEY"
+    spec = STT_JOB_PROVIDERS[job["provider"]][1](api_key, job["job_ref"])
+    while True:
+        resp = await client.get(spec["url"], headers=spec["headers"], timeout=POLL_TIMEOUT)
+        state, value = spec["parse"](resp)
+        if state != "next": return state, value
+        spec = value
 
 def _call_gladia(api_key, audio_url, sb=None):
     if not api_key: return None, "NO_API_KEY"
     print("🎯 [Plan C] 呼叫 Gladia 聽寫 (URL 模式)...")
     try:
-        headers = {"x-gladia-key": api_key, "Content-Type": "application/json"}
-        resp = requests.post("https://api.gladia.io/v2/transcription", headers=headers, json={"audio_url": audio_url}, timeout=30)
-        
-        if resp.status_code in [401, 402, 403, 429]:
-            log_quota_exhaustion(sb, "Gladia", resp.status_code, resp.text)
-            return None, f"GLADIA_QUOTA_HIT_{resp.status_code}"
-            
-        if resp.status_code not in [200, 201, 202]:
-            return None, f"GLADIA_INIT_FAIL_{resp.status_code}"
-            
-        result_url = resp.json().get("result_url")
-        if not result_url: return None, "GLADIA_NO_RESULT_URL"
-        
+        result_url, status = _submit_gladia(api_key, audio_url, sb)
+        if not result_url: return None, status
         print("⏳ [Gladia] 等待遠端處理...")
-        for _ in range(40):
-            time.sleep(10)
-            try:
-                poll_resp = requests.get(result_url, headers=headers, timeout=15)
-                if poll_resp.status_code == 200:
-                    status = poll_resp.json().get("status")
-                    if status == "done":
-                        result = poll_resp.json().get("result", {})
-                        full_text = " ".join([utt.get("text", "") for utt in result.get("transcription", {}).get("utterances", [])])
-                        return full_text if full_text else "GLADIA_EMPTY_TEXT", "SUCCESS"
-                    elif status in ["error", "aborted"]:
-                        return None, f"GLADIA_PROCESS_ERROR_{status}"
-            except: pass
-        return None, "GLADIA_TIMEOUT"
+        return _await_job("GLADIA", api_key, result_url)
     except Exception as e:
         return None, f"GLADIA_EXCEPTION_{str(e)[:50]}"
 
@@ -196,50 +325,10 @@ def _call_speechmatics(api_key, audio_url, sb=None):
     if not api_key: return None, "NO_API_KEY"
     print("🎯 [Plan D] 呼叫 Speechmatics 聽寫 (URL 模式)...")
     try:
-        url = "https://asr.api.speechmatics.com/v2/jobs"
-        headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
-        
-        # 🚀 [V6.14 修復] 嚴格遵守 Speechmatics V2 巢狀參數格式
-        payload = {
-            "type": "transcription", 
-            "fetch_data": {"url": audio_url}, 
-            "config": {
-                "type": "transcription",
-                "transcription_config": {
-                    "operating_point": "enhanced", 
-                    "language": "en"
-                }
-            }
-        }
-        
-        resp = requests.post(url, headers=headers, json=payload, timeout=30)
-        
-        if resp.status_code in [401, 402, 403, 429]:
-            log_quota_exhaustion(sb, "Speechmatics", resp.status_code, resp.text)
-            return None, f"SPEECHMATICS_QUOTA_HIT_{resp.status_code}"
-            
-        if resp.status_code not in [200, 201]:
-            return None, f"SPEECHMATICS_INIT_FAIL_{resp.status_code}"
-            
-        job_id = resp.json().get("id")
-        if not job_id: return None, "SPEECHMATICS_NO_JOB_ID"
-        
+        job_id, status = _submit_speechmatics(api_key, audio_url, sb)
+        if not job_id: return None, status
         print("⏳ [Speechmatics] 等待遠端處理...")
-        status_url = f"{url}/{job_id}"
-        for _ in range(40):
-            time.sleep(10)
-            try:
-                poll_resp = requests.get(status_url, headers=headers, timeout=15)
-                if poll_resp.status_code == 200:
-                    status = poll_resp.json().get("job", {}).get("status")
-                    if status == "done":
-                        transcript_resp = requests.get(f"{status_url}/transcript?format=txt", headers=headers, timeout=15)
-                        if transcript_resp.status_code == 200: return transcript_resp.text, "SUCCESS"
-                        return None, f"SPEECHMATICS_DL_FAIL_{transcript_resp.status_code}"
-                    elif status in ["rejected", "deleted"]:
-                        return None, f"SPEECHMATICS_REJECTED_{status}"
-            except: pass
-        return None, "SPEECHMATICS_TIMEOUT"
+        return _await_job("SPEECHMATICS", api_key, job_id)
     except Exception as e:
         return None, f"SPEECHMATICS_EXCEPTION_{str(e)[:50]}"
 
@@ -247,24 +336,10 @@ def _call_assemblyai(api_key, audio_url):
     if not api_key: return None, "NO_API_KEY"
     print("🎯 [Plan E] 呼叫 AssemblyAI 聽寫 (URL 模式)...")
     try:
-        headers = {"authorization": api_key, "content-type": "application/json"}
-        resp = requests.post("https://api.assemblyai.com/v2/transcript", json={"audio_url": audio_url, "language_code": "en_us"}, headers=headers, timeout=15)
-        if resp.status_code != 200: return None, f"ASSEMBLYAI_INIT_FAIL_{resp.status_code}"
-        transcript_id = resp.json().get("id")
-        if not transcript_id: return None, "ASSEMBLYAI_NO_ID"
-
+        transcript_id, status = _submit_assemblyai(api_key, audio_url)
+        if not transcript_id: return None, status
         print("⏳ [AssemblyAI] 等待遠端處理...")
-        poll_url = f"https://api.assemblyai.com/v2/transcript/{transcript_id}"
-        for _ in range(30):
-            time.sleep(10)
-            try:
-                poll_resp = requests.get(poll_url, headers=headers, timeout=15)
-                if poll_resp.status_code == 200:
-                    data = poll_resp.json()
-                    if data["status"] == "completed": return data["text"], "SUCCESS"
-                    elif data["status"] == "error": return None, f"ASSEMBLYAI_PROCESS_ERROR_{data.get('error')}"
-            except: pass
-        return None, "ASSEMBLYAI_TIMEOUT"
+        return _await_job("ASSEMBLYAI", api_key, transcript_id)
     except Exception as e:
         return None, f"ASSEMBLYAI_EXCEPTION_{str(e)[:50]}"
 
@@ -274,8 +349,7 @@ def _call_deepgram(api_key, audio_url):
     try:
         url = "https://api.deepgram.com/v1/listen?model=nova-2&smart_format=true"
         headers = {"Authorization": f"Token {api_key}", "Content-Type": "application/json"}
-        with httpx.Client(timeout=180.0) as client:
-            resp = client.post(url, headers=headers, json={"url": audio_url})
+        resp = get_client(url).post(url, headers=headers, json={"url": audio_url}, timeout=180.0)
         if resp.status_code == 200:
             result = resp.json()
             transcript = result.get("results", {}).get("channels", [{}])[0].get("alternatives", [{}])[0].get("transcript", "")
@@ -286,10 +360,120 @@ def _call_deepgram(api_key, audio_url):
         return None, f"DEEPGRAM_EXCEPTION_{str(e)[:50]}"
 
 
+# =========================================================
+# ✂️ [V6.28] 分段平行聽打
+# =========================================================
+SEGMENT_MAX_CONCURRENCY = 4
+
+def _groq_fire(s, sb, board, audio_file, filename, mime_type):
+    """Groq 開火 (略過斷路中的金鑰，由調度中心派工)，並將戰績記在實際開火的金鑰上"""
+    keys = [k for i, k in enumerate(s['GROQ_KEYS']) if allow(sb, board, "GROQ", i)]
+    if not keys: return None, "GROQ_CIRCUIT_OPEN" if s['GROQ_KEYS'] else "GROQ_NO_KEYS"
+    t0 = time.time()
+    text, status, key = _call_groq(keys, audio_file, filename, mime_type)
+    ok = status == "SUCCESS" and bool(text)
+    if key: record_outcome(sb, "GROQ", s['GROQ_KEYS'].index(key), ok, time.time() - t0, status, board)
+    return (text if ok else None), status
+
+def _segment_url_fallback(s, sb, board, seg_url, seg_sec):
+    """分段補打：免費矩陣依計分板與剩餘額度排序，略過斷路中的車道，逐車道原子預留分段秒數後開火並回報戰績"""
+    free_slots = [("GLADIA", idx) for idx in range(len(s['GLADIA_KEYS']))] + [("SPEECHMATICS", 0)]
+    ranked, short = rank_by_budget(order_slots(board, free_slots), load_remaining(sb, free_slots), seg_sec)
+    status = "SEG_BUDGET_SHORT" if short else "SEG_NO_URL_LANE"
+    abandoned = set()
+    for provider, idx in ranked:
+        if provider in abandoned: continue
+        if not allow(sb, board, provider, idx):
+            status = f"{_lane_label(provider, idx)}:CIRCUIT_OPEN"; continue
+        hold = reserve(sb, provider, idx, seg_sec)
+        if hold is False:
+            status = f"{_lane_label(provider, idx)}:BUDGET_SHORT"; continue
+        t0 = time.time()
+        if provider == "GLADIA": text, status = _call_gladia(s['GLADIA_KEYS'][idx], seg_url, sb)
+        else: text, status = _call_speechmatics(s['SPEECHMATICS_KEY'], seg_url, sb)
+        record_outcome(sb, provider, idx, status == "SUCCESS" and bool(text), time.time() - t0, status, board)
+        if status == "SUCCESS" and text:
+            commit(sb, hold)
+            return text, None
+        release(sb, hold)
+        if provider == "GLADIA" and "QUOTA_HIT" not in status: abandoned.add("GLADIA")
+    return None, status
+
+def _segment_transcriber(s, sb, tag, board=None, url_fallback=True):
+    """
+    產生單一分段的聽打函式：Groq 調度中心派工 (略過斷路中的金鑰) -> 暫存 R2 交 Gladia/Speechmatics 補打。
+    url_fallback=False (有工單帳本) 時不補打，分段失手即回報，由重型區整檔送單落帳。
+    """
+    board = {} if board is None else board
+
+    def run(path, idx):
+        with open(path, "rb") as audio_file:
+            text, status = _groq_fire(s, sb, board, audio_file, os.path.basename(path), "audio/ogg")
+            if text: return text, None
+        if not url_fallback: return None, f"{status}|SEG_DEFERRED_TO_LEDGER"
+
+        # 🛟 Groq 全數失手：分段暫存 R2，改走 URL 供應商
+        try:
+            from src.pod_scra_intel_r2 import get_s3_client
+            s3, bucket = get_s3_client(), os.environ.get("R2_BUCKET_NAME")
+            seg_key = f"stt_seg/{tag}_{idx:03d}.opus"
+            s3.upload_file(path, bucket, seg_key)
+        except Exception as e:
+            return None, f"{status}|STAGE_FAIL_{str(e)[:30]}"
+        try:
+            # 💸 [V6.36] 分段補打同樣經額度帳本預留 (片長探測失敗時依大小估算)
+            seg_sec = probe_duration(path) or estimate_audio_sec(os.path.getsize(path) / 1048576, "audio/ogg")
+            return _segment_url_fallback(s, sb, board, f"{s['R2_URL']}/{seg_key}", seg_sec)
+        finally:
+            try: s3.delete_object(Bucket=bucket, Key=seg_key)
+            except Exception: pass
+    return run
+
+def _run_segmented_stt(s, sb, url, filename, board=None, url_fallback=True):
+    """下載至 /tmp (不佔記憶體) 後分段平行聽打，回傳 (逐字稿 or None, 錯誤清單)"""
+    tmp_path = None
+    try:
+        tmp_path, _ = fetch_to_tempfile(url, suffix=f"_{filename}", timeout=120)
+        concurrency = min(len(s['GROQ_KEYS']) * 2, SEGMENT_MAX_CONCURRENCY)
+        tag = os.path.splitext(filename)[0]
+        text, info = transcribe_segmented(tmp_path, _segment_transcriber(s, sb, tag, board, url_fallback), concurrency=concurrency)
+        if text:
+            print(f"✅ [STT Router] 分段聽打完成 ({info} 段縫合)")
+            return text, []
+        return None, info
+    except Exception as e:
+        return None, [f"SEGMENT_EXC_{str(e)[:40]}"]
+    finally:
+        if tmp_path and os.path.exists(tmp_path): os.remove(tmp_path)
+
 # =========================================================
 # ⚙️ STT 火力協調中心主入口 (The Router V6.14)
 # =========================================================
-def execute_stt_routing(sb, r2_url_path, file_size_mb=0):
+def _submit_and_record(sb, s, provider, key_index, url, task_id, worker_id, quota_hold_id=None):
+    """【送單落帳】送出遠端工單並寫入帳本，回傳 (None, "SUBMITTED")；帳本寫入失敗時原地等候，不浪費已付費的工單"""
+    api_key = _job_api_key(s, provider, key_index)
+    if not api_key: return None, "NO_API_KEY"
+    print(f"📮 [STT Router] {provider} 送單 (非同步收件模式)...")
+    try:
+        job_ref, status = STT_JOB_PROVIDERS[provider][0](api_key, url, sb)
+    except Exception as e:
+        return None, f"{provider}_EXCEPTION_{str(e)[:50]}"
+    if not job_ref: return None, status
+    if record_job(sb, task_id, provider, key_index, job_ref, url, worker_id, quota_hold_id):
+        return None, "SUBMITTED"
+    print(f"⏳ [{provider}] 工單未能落帳，改為原地等候...")
+    return _await_job(provider, api_key, job_ref)
+
+def _lane_label(provider, key_index):
+    return f"Gladia_Acc{key_index+1}" if provider == "GLADIA" else provider.title()
+
+def execute_stt_routing(sb, r2_url_path, file_size_mb=0, segment=False, task_id=None, audio_sec=None):
+    """
+    【STT 路由】回傳 (逐字稿, 供應商, 錯誤清單)。
+    提供 task_id 時重型區改為「送單落帳」：逐字稿為 None 代表工單已送出，由收件階段回收；
+    逐字稿與供應商皆為 None 代表遠端供應商在途額滿，任務延後。
+    audio_sec 為實測片長 (額度帳本扣帳依據)，未提供時依檔案大小估算。
+    """
     s = get_stt_secrets()
     url = f"{s['R2_URL']}/{r2_url_path}"
     m_type = "audio/ogg" if ".opus" in url.lower() else "audio/mpeg"
@@ -298,75 +482,129 @@ def execute_stt_routing(sb, r2_url_path, file_size_mb=0):
     
     stt_text = None
     all_errors = []
+    # 📊 [V6.35] 每次路由讀一次計分板，之後的斷路判定皆為字典查詢
+    board = load_board(sb)
     
     # -----------------------------------------------------
     # 🚀 階段一：輕型任務區 (處理 24.5MB 以下，極限壓榨 Groq)
     # -----------------------------------------------------
-    if file_size_mb < 24.5:
-        skip_groq = (worker_id in ["FLY_LAX", "ALWAYSDATA"] and file_size_mb >= 8.0)
-        if not skip_groq:
-            print(f"📥 [STT Router] 下載物資供 Groq 使用: {filename}...")
+    if file_size_mb < 24.5 and not s['GROQ_KEYS']:
+        all_errors.append("Groq:NO_API_KEY")
+    elif file_size_mb < 24.5:
+        # 📼 [V6.29] 串流落地 (超過門檻溢寫磁碟)，記憶體峰值與檔案大小脫鉤，低記憶體節點不再跳過 Groq
+        print(f"📥 [STT Router] 下載物資供 Groq 使用: {filename}...")
+        try:
+            audio_file, _ = fetch_spooled(url, timeout=60)
             try:
-                resp = requests.get(url, timeout=60)
-                resp.raise_for_status()
-                audio_data = resp.content
-                
-                # 第一順位：Groq
-                stt_text, status = _call_groq(s['GROQ_KEY'], audio_data, filename, m_type)
-                
-                # 💥 不管成功或失敗，立刻銷毀二進位檔案
-                del audio_data; gc.collect()
+                # 第一順位：Groq (調度中心依各金鑰令牌桶派工)
+                stt_text, status = _groq_fire(s, sb, board, audio_file, filename, m_type)
+            finally:
+                # 💥 不管成功或失敗，立刻銷毀暫存音檔
+                audio_file.close()
                 print("🧹 [STT Router] 本地音檔已焚毀，釋放記憶體。")
-                
-                if status == "SUCCESS" and stt_text:
-                    return stt_text, "GROQ", all_errors
-                all_errors.append(f"Groq:{status}")
-                
-            except Exception as e:
-                all_errors.append(f"Light_Zone_DL_FAIL:{str(e)[:30]}")
-
-# -----------------------------------------------------
+            
+            if status == "SUCCESS" and stt_text:
+                return stt_text, "GROQ", all_errors
+            all_errors.append(f"Groq:{status}")
+            
+        except Exception as e:
+            all_errors.append(f"Light_Zone_DL_FAIL:{str(e)[:30]}")
+
+    # -----------------------------------------------------
+    # ✂️ [V6.28] 階段 1.5：重型 Opus 切成輕型分段，平行交 Groq 聽打
+    # -----------------------------------------------------
+    if segment and file_size_mb >= 24.5 and m_type == "audio/ogg" and s['GROQ_KEYS']:
+        print(f"✂️ [STT Router] 重型任務啟動分段平行聽打: {filename}...")
+        # 📮 有工單帳本時分段不原地輪詢補打，失手即整檔交由下方重型區送單落帳
+        stt_text, seg_errors = _run_segmented_stt(s, sb, url, filename, board, url_fallback=not (sb and task_id))
+        if stt_text: return stt_text, "GROQ_SEG", all_errors
+        all_errors.append(f"Segmented:{','.join(seg_errors)[:120]}")
+
+    # -----------------------------------------------------
     # 🛡️ 階段二：重型任務區 (處理 >24.5MB 或 Groq 掉棒任務)
     # -----------------------------------------------------
     if not stt_text:
         print(f"🛡️ [STT Router] 進入 URL 降維輪詢區 (重型/備援)...")
+        # 📮 [V6.33] 有任務編號即走送單落帳；已失敗過的遠端供應商不再重送
+        async_jobs = bool(sb and task_id)
+        skip = failed_providers(sb, task_id) if async_jobs else set()
+        # 🚦 [V6.34] 在途額滿的金鑰/供應商先略過；全數額滿時延後 (不動用滴流額度)
+        live = live_counts(sb) if async_jobs else None
+        deferred = False
+        # 💸 [V6.36] 額度帳本：各金鑰本期剩餘秒數 (帳本不可用時為 None，維持計分板順序)
+        audio_sec = audio_sec or estimate_audio_sec(file_size_mb, m_type)
+        free_slots = [("GLADIA", idx) for idx in range(len(s['GLADIA_KEYS']))] + [("SPEECHMATICS", 0)]
+        drip_slots = [("ASSEMBLYAI", 0), ("DEEPGRAM", 0)]
+        remaining = load_remaining(sb, free_slots + drip_slots)
         
-        # 🚀 [V6.15] Plan C: Gladia (多帳號矩陣輪詢)
-        if s['GLADIA_KEYS']:
-            for idx, g_key in enumerate(s['GLADIA_KEYS']):
+        # 📊 [V6.35] 依計分板動態排序：免費矩陣 (Gladia 各金鑰 + Speechmatics) 分數高者先開火，斷路中的 O(1) 略過
+        # 💸 [V6.36] 再依剩餘額度由多到少重排，放不下整段音訊的金鑰直接剔除
+        if not s['GLADIA_KEYS']: all_errors.append("Gladia:NO_API_KEYS_CONFIGURED")
+        abandoned = set(skip)
+        all_errors.extend(f"{p.title()}:JOB_FAILED_BEFORE" for p in ("GLADIA", "SPEECHMATICS") if p in skip)
+        ranked, short = rank_by_budget(order_slots(board, free_slots), remaining, audio_sec)
+        all_errors.extend(f"{_lane_label(p, i)}:BUDGET_SHORT" for p, i in short if p not in skip)
+        for provider, idx in ranked:
+            if provider in abandoned: continue
+            label = _lane_label(provider, idx)
+            if not allow(sb, board, provider, idx):
+                all_errors.append(f"{label}:CIRCUIT_OPEN"); continue
+            if async_jobs and not has_capacity(live, provider, idx):
+                all_errors.append(f"{label}:LIVE_FULL"); deferred = True
+                continue
+            hold = reserve(sb, provider, idx, audio_sec, task_id)
+            if hold is False:
+                all_errors.append(f"{label}:BUDGET_SHORT"); continue
+            t0 = time.time()
+            if async_jobs: stt_text, status = _submit_and_record(sb, s, provider, idx, url, task_id, worker_id, hold)
+            elif provider == "GLADIA":
                 print(f"🎯 [Plan C] 呼叫 Gladia 聽寫 (切換彈匣 {idx+1}/{len(s['GLADIA_KEYS'])})...")
-                stt_text, status = _call_gladia(g_key, url, sb)
-                
-                if status == "SUCCESS" and stt_text: 
-                    # 打擊成功，直接跳出並回傳
-                    return stt_text, "GLADIA", all_errors
-                
-                # 紀錄該帳號的失敗原因
-                all_errors.append(f"Gladia_Acc{idx+1}:{status}")
-                
-                # 🧠 戰術優化：判斷是否需要換帳號
-                if "QUOTA_HIT" not in status:
-                    # 如果不是因為「沒錢(402,429)」失敗，代表是音檔有問題或主機當機
-                    # 換帳號也沒用，為了省時間直接 break 跳出 Gladia 陣列，交棒給 Speechmatics
-                    break 
-        else:
-            all_errors.append("Gladia:NO_API_KEYS_CONFIGURED")
+                stt_text, status = _call_gladia(s['GLADIA_KEYS'][idx], url, sb)
+            else: stt_text, status = _call_speechmatics(s['SPEECHMATICS_KEY'], url, sb)
 
-        # Plan D: Speechmatics (如果 Gladia 矩陣全數陣亡，則輪到它)
-        if not stt_text:
-            stt_text, status = _call_speechmatics(s['SPEECHMATICS_KEY'], url, sb)
-            if status == "SUCCESS" and stt_text: return stt_text, "SPEECHMATICS", all_errors
-            all_errors.append(f"Speechmatics:{status}")
-            
+            # 📮 送單成功的戰績與額度由收件階段結算 (含遠端處理耗時)
+            if status == "SUBMITTED": return None, provider, all_errors
+            ok = status == "SUCCESS" and bool(stt_text)
+            record_outcome(sb, provider, idx, ok, time.time() - t0, status, board)
+            if ok:
+                commit(sb, hold)
+                return stt_text, provider, all_errors
+            release(sb, hold)
+            all_errors.append(f"{label}:{status}")
 
+            # 🧠 戰術優化：Gladia 不是因為「沒錢(402,429)」失敗，代表音檔有問題或主機當機，換帳號也沒用
+            if provider == "GLADIA" and "QUOTA_HIT" not in status: abandoned.add("GLADIA")
 
-        # Plan E/F: 滴流管制最終防線
-        for provider in ["assemblyai", "deepgram"]:
-            if check_and_update_quota(sb, provider):
-                if provider == "assemblyai": stt_text, status = _call_assemblyai(s['ASSEMBLYAI_KEY'], url)
-                else: stt_text, status = _call_deepgram(s['DEEPGRAM_KEY'], url)
-                
-                if status == "SUCCESS" and stt_text: return stt_text, provider.upper(), all_errors
-                all_errors.append(f"{provider}:{status}")
+        if deferred:
+            print("🚦 [STT Router] 遠端供應商在途工單額滿，任務延後至下一輪。")
+            return None, None, all_errors
+
+        # Plan E/F: 滴流管制最終防線 (同樣依計分板與剩餘額度排序；斷路中的不動用額度)
+        ranked, short = rank_by_budget(order_slots(board, drip_slots), remaining, audio_sec)
+        all_errors.extend(f"{p.lower()}:BUDGET_SHORT" for p, _ in short if p not in skip)
+        for provider, idx in ranked:
+            if provider in skip: continue
+            if not allow(sb, board, provider, idx):
+                all_errors.append(f"{provider.lower()}:CIRCUIT_OPEN"); continue
+            if provider == "ASSEMBLYAI" and async_jobs and not has_capacity(live, "ASSEMBLYAI"):
+                all_errors.append("assemblyai:LIVE_FULL"); continue
+            # 💸 [V6.36] 帳本原子預留；帳本不可用 (None) 時退回舊版次數制滴流
+            hold = reserve(sb, provider, idx, audio_sec, task_id)
+            if hold is False:
+                all_errors.append(f"{provider.lower()}:BUDGET_SHORT"); continue
+            if hold is None and not check_and_update_quota(sb, provider.lower()): continue
+            t0 = time.time()
+            if provider == "ASSEMBLYAI" and async_jobs: stt_text, status = _submit_and_record(sb, s, "ASSEMBLYAI", 0, url, task_id, worker_id, hold)
+            elif provider == "ASSEMBLYAI": stt_text, status = _call_assemblyai(s['ASSEMBLYAI_KEY'], url)
+            else: stt_text, status = _call_deepgram(s['DEEPGRAM_KEY'], url)
+            
+            if status == "SUBMITTED": return None, provider, all_errors
+            ok = status == "SUCCESS" and bool(stt_text)
+            record_outcome(sb, provider, idx, ok, time.time() - t0, status, board)
+            if ok:
+                commit(sb, hold)
+                return stt_text, provider, all_errors
+            release(sb, hold)
+            all_errors.append(f"{provider.lower()}:{status}")
 
     raise Exception(f"STT 聯合火力網全軍覆沒: {' | '.join(all_errors)}")
\ No newline at end of file
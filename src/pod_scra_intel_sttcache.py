@@ -0,0 +1,76 @@
+# ---------------------------------------------------------
+# src/pod_scra_intel_sttcache.py (V6.39 逐字稿快取)
+# 職責：逐字稿原本只存在 mission_intel，而第二棒 404、Router 例外處理都會 delete_intel_task 並清空 r2_url，
+#       任務重新下載後 STT 產線從零再打一次，付費秒數重燒一遍。本模組以「音檔 SHA-256 + 語言」為鍵，
+#       將逐字稿另存於 pod_scra_stt_transcripts，生命週期與 mission_intel 脫鉤。
+# [查詢] STT 產線於呼叫任何供應商 (甚至壓縮) 之前先查快取，命中即直接寫回 mission_intel (Sum.-pre)。
+# [寫入] 同步聽打成功與收件中心完工時 store_transcript (已存在則不覆寫，保留最早的逐字稿)。
+# [戰果] 每次命中累計 hit_count / seconds_saved，並寫入 pod_scra_log (STT_CACHE_HIT)。
+# [容錯] 快取讀寫失敗一律視為未命中，照常交給 Router 聽打。
+# [相依] 本模組不引用任何 src 內部模組。
+# ---------------------------------------------------------
+from datetime import datetime, timezone
+
+CACHE_TABLE = "pod_scra_stt_transcripts"
+DEFAULT_LANGUAGE = "en"          # 🗣️ 與 Router 送單語言一致 (各供應商皆以英文聽打)
+
+def lookup_transcript(sb, sha256, language=DEFAULT_LANGUAGE):
+    """查詢逐字稿快取，回傳快取列或 None"""
+    if not sb or not sha256: return None
+    try:
+        res = sb.table(CACHE_TABLE).select("*").eq("audio_sha256", sha256).eq("language", language).limit(1).execute()
+        row = res.data[0] if res.data else None
+        return row if row and row.get("stt_text") else None
+    except Exception as e:
+        print(f"⚠️ [逐字稿快取] 查詢失敗，視為未命中: {str(e)[:80]}")
+        return None
+
+def store_transcript(sb, sha256, stt_text, provider=None, task_id=None, audio_sec=None, language=DEFAULT_LANGUAGE):
+    """存入逐字稿 (已存在則不覆寫)"""
+    if not sb or not sha256 or not stt_text: return
+    row = {"audio_sha256": sha256, "language": language, "stt_text": stt_text,
+           "provider": provider, "task_id": task_id,
+           "audio_sec": round(audio_sec, 1) if audio_sec else None}
+    try:
+        sb.table(CACHE_TABLE).upsert(row, on_conflict="audio_sha256,language", ignore_duplicates=True).execute()
+    except Exception as e:
+        print(f"⚠️ [逐字稿快取] 寫入失敗: {str(e)[:80]}")
+
+def restore_transcript(sb, task_id, sha256, language=DEFAULT_LANGUAGE, worker_id="UNKNOWN"):
+    """
+    【快取命中】將快取逐字稿寫回 mission_intel (Sum.-pre)，任務直接交給第二棒。
+    成功回傳省下的音訊秒數 (片長未知時為 0)；未命中或寫回失敗回傳 None。
+    """
+    row = lookup_transcript(sb, sha256, language)
+    if not row: return None
+    try:
+        sb.table("mission_intel").upsert({
+            "task_id": task_id, "intel_status": "Sum.-pre",
+            "ai_provider": row.get("provider"), "stt_text": row["stt_text"]
+        }, on_conflict="task_id").execute()
+    except Exception as e:
+        print(f"⚠️ [逐字稿快取] 寫回失敗，交回 STT 產線: {str(e)[:80]}")
+        return None
+
+    seconds = row.get("audio_sec") or 0
+    try:
+        sb.table(CACHE_TABLE).update({
+            "hit_count": (row.get("hit_count") or 0) + 1,
+            "seconds_saved": round((row.get("seconds_saved") or 0) + seconds, 1),
+            "last_hit_at": datetime.now(timezone.utc).isoformat(),
+        }).eq("audio_sha256", sha256).eq("language", language).execute()
+        sb.table("pod_scra_log").insert({
+            "worker_id": worker_id, "task_type": "STT_CACHE_HIT", "status": "INFO",
+            "message": f"🗃️ [{str(task_id)[:8]}] 逐字稿快取命中 {sha256[:12]}，省下 {seconds / 60:.0f} 分鐘 STT"
+        }).execute()
+    except Exception: pass
+    return seconds
+
+def cache_savings_report(sb):
+    """【戰果統計】彙總逐字稿快取累計命中次數與省下的聽打時數"""
+    res = sb.table(CACHE_TABLE).select("hit_count, seconds_saved").gt("hit_count", 0).execute()
+    rows = res.data or []
+    return {
+        "cached_hits": sum(r.get("hit_count") or 0 for r in rows),
+        "hours_saved": round(sum(r.get("seconds_saved") or 0 for r in rows) / 3600, 2),
+    }
\ No newline at end of file
@@ -0,0 +1,108 @@
+# ---------------------------------------------------------
+# src/pod_scra_intel_sttjobs.py (V6.33 STT 遠端工單帳本)
+# 職責：Gladia / Speechmatics / AssemblyAI 皆為「送單 -> 遠端處理 -> 輪詢取件」。原本送單後以
+#       time.sleep 迴圈死守 300~400 秒，機甲重啟 (Render 重啟、app.py 看門狗重置) 即遺失工單編號，
+#       下一輪重新送單，同一段音訊付費兩次。本模組將已送出的工單落帳於 pod_scra_stt_jobs，
+#       STT 產線拆成「送單」與「收件」兩階段，任何機甲都能在後續巡邏收回已完工的逐字稿。
+# [狀態] submitted (在途) -> done (已收件) / failed (遠端失敗或逾時)。
+# [防重] 同一任務同時只允許一張在途工單 (部分唯一索引)，送單前先查 live_job。
+# [收件] claim_job 以「status = submitted」為條件更新，多台機甲同時收件時只有一台寫入逐字稿。
+# [V6.34 升級] 每把金鑰設在途上限 (MAX_LIVE_PER_KEY)，送單依在途數分散到各金鑰與供應商。
+# [V6.36 升級] 工單記下額度預留單號 (quota_hold_id)，收件完工結算、退件退回。
+# ---------------------------------------------------------
+import os
+from collections import Counter
+from datetime import datetime, timezone, timedelta
+
+JOB_TABLE = "pod_scra_stt_jobs"
+STT_WAIT_STATUS = "STT-wait"      # 📮 mission_intel：已送單、等待收件
+JOB_TTL_MINUTES = 120             # ⌛ 在途超過 2 小時視為遺失，改判失敗讓任務重新排隊
+
+# 🚦 [V6.34] 每把金鑰的在途工單上限 (免費方案的併發限制)，額滿即換下一把金鑰 / 下一家供應商
+MAX_LIVE_PER_KEY = {
+    "GLADIA": int(os.environ.get("STT_MAX_LIVE_GLADIA", 2)),
+    "SPEECHMATICS": int(os.environ.get("STT_MAX_LIVE_SPEECHMATICS", 2)),
+    "ASSEMBLYAI": int(os.environ.get("STT_MAX_LIVE_ASSEMBLYAI", 5)),
+}
+
+def record_job(sb, task_id, provider, key_index, job_ref, audio_url, worker_id, quota_hold_id=None):
+    """【落帳】送單成功立即寫入帳本，回傳工單列；寫入失敗回傳 None (呼叫端改為同步等候)"""
+    try:
+        payload = {
+            "task_id": task_id, "provider": provider, "key_index": key_index, "job_ref": job_ref,
+            "audio_url": audio_url, "worker_id": worker_id, "status": "submitted",
+        }
+        # 💸 [V6.36] 額度預留單號 (收件時結算 / 退回)
+        if quota_hold_id: payload["quota_hold_id"] = quota_hold_id
+        res = sb.table(JOB_TABLE).insert(payload).execute()
+        return (res.data or [None])[0]
+    except Exception as e:
+        print(f"⚠️ [STT 帳本] 工單落帳失敗: {str(e)[:80]}")
+        return None
+
+def live_job(sb, task_id):
+    """任務是否已有在途工單 (有則不得重複送單)"""
+    try:
+        res = sb.table(JOB_TABLE).select("id, provider").eq("task_id", task_id).eq("status", "submitted").limit(1).execute()
+        return (res.data or [None])[0]
+    except Exception:
+        return None
+
+def live_counts(sb):
+    """全軍在途工單數，以 (供應商, 金鑰序號) 分組"""
+    try:
+        res = sb.table(JOB_TABLE).select("provider, key_index").eq("status", "submitted").execute()
+        return Counter((row["provider"], row.get("key_index") or 0) for row in (res.data or []))
+    except Exception:
+        return Counter()
+
+def has_capacity(counts, provider, key_index=0):
+    return counts[(provider, key_index)] < MAX_LIVE_PER_KEY.get(provider, 1)
+
+def failed_providers(sb, task_id):
+    """此任務已失敗過的遠端供應商 (重新路由時略過)"""
+    try:
+        res = sb.table(JOB_TABLE).select("provider").eq("task_id", task_id).eq("status", "failed").execute()
+        return {row["provider"] for row in (res.data or [])}
+    except Exception:
+        return set()
+
+def open_jobs(sb, limit=20):
+    """在途工單 (最久未輪詢者優先)"""
+    try:
+        res = sb.table(JOB_TABLE).select("*").eq("status", "submitted") \
+                .order("polled_at", desc=False, nullsfirst=True).limit(limit).execute()
+        return res.data or []
+    except Exception as e:
+        print(f"⚠️ [STT 帳本] 讀取在途工單失敗: {str(e)[:80]}")
+        return []
+
+def touch_job(sb, job):
+    """記錄一次輪詢 (尚未完工)"""
+    try:
+        sb.table(JOB_TABLE).update({"polled_at": datetime.now(timezone.utc).isoformat(),
+                                    "poll_count": (job.get("poll_count") or 0) + 1}).eq("id", job["id"]).execute()
+    except Exception: pass
+
+def claim_job(sb, job, status, error=None):
+    """【結案】僅在工單仍為 submitted 時更新，回傳是否由本機取得結案權"""
+    try:
+        payload = {"status": status, "finished_at": datetime.now(timezone.utc).isoformat()}
+        if error: payload["error"] = str(error)[:250]
+        res = sb.table(JOB_TABLE).update(payload).eq("id", job["id"]).eq("status", "submitted").execute()
+        return bool(res.data)
+    except Exception as e:
+        print(f"⚠️ [STT 帳本] 工單結案失敗: {str(e)[:80]}")
+        return False
+
+def job_age_sec(job):
+    """送單至今秒數 (無法解析時回傳 None)"""
+    try:
+        submitted = datetime.fromisoformat(str(job["submitted_at"]).replace("Z", "+00:00"))
+    except Exception:
+        return None
+    return (datetime.now(timezone.utc) - submitted).total_seconds()
+
+def is_expired(job, ttl_minutes=JOB_TTL_MINUTES):
+    age = job_age_sec(job)
+    return age is not None and age > ttl_minutes * 60
\ No newline at end of file
@@ -0,0 +1,134 @@
+# ---------------------------------------------------------
+# src/pod_scra_intel_sttpoller.py (V6.34 事件迴圈收件中心)
+# 職責：遠端 STT 輪詢原本是同步 sleep，一台機甲同時只能等一份逐字稿，DBOS 等重裝面板的
+#       SAFE_DURATION_SECONDS 大半耗在睡眠。本模組以單一 asyncio 事件迴圈同時輪詢帳本內所有在途工單，
+#       完工即寫入 mission_intel，吞吐量隨在途工單數 N 線性放大。
+# [節奏] 每張工單各自計時：首輪 POLL_BASE_INTERVAL 秒，之後每次未完工乘 1.5 倍，上限 POLL_MAX_INTERVAL。
+# [退避] 以供應商為單位：429 依 Retry-After 暫停該供應商所有輪詢；連線錯誤指數退避 (上限 BACKOFF_MAX)。
+# [併發] 每家供應商同時最多 PER_PROVIDER_CONCURRENCY 個請求在飛。
+# [同步] 每 REFRESH_SECONDS 重新讀取帳本：納入新送出的工單、剔除已被友軍收件的工單。
+# [V6.35 升級] 取得結案權的工單將成敗與「送單至完工」耗時回報計分板 (record_outcome)。
+# [V6.36 升級] 同時結算 (完工) 或退回 (退件) 工單的額度預留。
+# [V6.38 升級] AsyncClient 改由連線池登記處建立 (有 h2 時 HTTP/2 多工，同主機輪詢共用一條連線)。
+# [TTL] 逾期判定不限於「未完工」：持續 429 / 連線錯誤的工單同樣逾期結案，不再霸佔在途名額與額度預留。
+# ---------------------------------------------------------
+import time, asyncio
+from collections import defaultdict
+from src.pod_scra_intel_httppool import make_async_client
+from src.pod_scra_intel_stt_router import poll_stt_job_async
+from src.pod_scra_intel_sttjobs import open_jobs, claim_job, touch_job, is_expired, job_age_sec
+from src.pod_scra_intel_sttscore import record_outcome
+from src.pod_scra_intel_sttquota import commit, release
+
+POLL_BASE_INTERVAL = 10.0
+POLL_MAX_INTERVAL = 60.0
+BACKOFF_MAX = 120.0
+REFRESH_SECONDS = 60.0
+PER_PROVIDER_CONCURRENCY = 4
+OPEN_JOBS_LIMIT = 50
+
+class _ProviderGate:
+    """單一供應商的退避閘門"""
+    def __init__(self):
+        self.next_at = 0.0
+        self.backoff = 0.0
+        self.sem = asyncio.Semaphore(PER_PROVIDER_CONCURRENCY)
+
+    def hold(self, seconds, now):
+        self.next_at = max(self.next_at, now + seconds)
+
+    def fail(self, now):
+        self.backoff = min(max(self.backoff * 2, POLL_BASE_INTERVAL), BACKOFF_MAX)
+        self.hold(self.backoff, now)
+
+    def ok(self):
+        self.backoff = 0.0
+
+async def _poll_loop(sb, s, worker_id, budget_sec, on_done, on_fail):
+    loop_start = time.monotonic()
+    deadline = loop_start + budget_sec
+    jobs, due, interval = {}, {}, {}
+    gates = defaultdict(_ProviderGate)
+    stats = {"done": 0, "failed": 0, "polls": 0}
+    last_refresh = None
+
+    async def poll_one(client, job):
+        gate = gates[job["provider"]]
+        async with gate.sem:
+            try:
+                return job, await poll_stt_job_async(s, job, client)
+            except Exception as e:
+                return job, ("exception", str(e)[:80])
+
+    async def settle(job, status, reason=None):
+        jobs.pop(job["id"], None)
+        if not await asyncio.to_thread(claim_job, sb, job, status, reason): return
+        await asyncio.to_thread(record_outcome, sb, job["provider"], job.get("key_index") or 0,
+                                status == "done", job_age_sec(job), None if status == "done" else reason)
+        await asyncio.to_thread(commit if status == "done" else release, sb, job.get("quota_hold_id"))
+        if status == "done":
+            await asyncio.to_thread(on_done, sb, job, reason, worker_id)
+            stats["done"] += 1
+        else:
+            await asyncio.to_thread(on_fail, sb, job, reason, worker_id)
+            stats["failed"] += 1
+
+    async with make_async_client(timeout=15.0) as client:
+        while time.monotonic() < deadline:
+            now = time.monotonic()
+            if last_refresh is None or now - last_refresh >= REFRESH_SECONDS:
+                fresh = {j["id"]: j for j in await asyncio.to_thread(open_jobs, sb, OPEN_JOBS_LIMIT)}
+                for job_id in list(jobs):
+                    if job_id not in fresh: jobs.pop(job_id)       # 🤝 已被友軍收件
+                for job_id, job in fresh.items():
+                    if job_id not in jobs:
+                        jobs[job_id] = job
+                        due.setdefault(job_id, now)
+                        interval.setdefault(job_id, POLL_BASE_INTERVAL)
+                last_refresh = now
+            if not jobs: break
+
+            ready = [j for j in jobs.values() if due[j["id"]] <= now and gates[j["provider"]].next_at <= now]
+            if ready:
+                results = await asyncio.gather(*(poll_one(client, j) for j in ready))
+                now = time.monotonic()
+                stats["polls"] += len(results)
+                for job, (state, value) in results:
+                    gate = gates[job["provider"]]
+                    if state == "done":
+                        gate.ok(); await settle(job, "done", value)
+                        continue
+                    if state == "error":
+                        gate.ok(); await settle(job, "failed", value)
+                        continue
+                    if state == "retry":
+                        # 🚦 429：依 Retry-After 暫停整家供應商
+                        gate.hold(value, now); due[job["id"]] = now + value
+                    elif state == "exception":
+                        gate.fail(now); due[job["id"]] = gate.next_at
+                    else:
+                        gate.ok()
+                    if is_expired(job):
+                        # ⌛ 逾期判定涵蓋 429 / 連線錯誤：持續失聯的工單同樣結案，釋放在途名額與額度預留
+                        await settle(job, "failed", "JOB_TTL_EXPIRED")
+                    elif state not in ("retry", "exception"):
+                        due[job["id"]] = now + interval[job["id"]]
+                        interval[job["id"]] = min(interval[job["id"]] * 1.5, POLL_MAX_INTERVAL)
+                        await asyncio.to_thread(touch_job, sb, job)
+                continue
+
+            wake = [max(due[j["id"]], gates[j["provider"]].next_at) for j in jobs.values()]
+            wake.append(last_refresh + REFRESH_SECONDS)
+            await asyncio.sleep(max(0.5, min(min(wake), deadline) - time.monotonic()))
+
+    stats["seconds"] = round(time.monotonic() - loop_start, 1)
+    return stats
+
+def run_stt_poller(sb, s, worker_id, budget_sec, on_done, on_fail):
+    """
+    【收件中心】於 budget_sec 內以事件迴圈輪詢全部在途工單，帳本清空即提前收工。
+    on_done(sb, job, 逐字稿, worker_id) / on_fail(sb, job, 原因, worker_id) 僅在本機取得結案權時呼叫。
+    回傳 {"done", "failed", "polls", "seconds"}。
+    """
+    if budget_sec <= 0: return {"done": 0, "failed": 0, "polls": 0, "seconds": 0.0}
+    return asyncio.run(_poll_loop(sb, s, worker_id, budget_sec, on_done, on_fail))
\ No newline at end of file
@@ -0,0 +1,120 @@
+# ---------------------------------------------------------
+# src/pod_scra_intel_sttquota.py (V6.36 STT 額度帳本)
+# 職責：check_and_update_quota 對 pod_scra_metadata.STT_QUOTA_PACING 做「讀 JSON -> 改 -> 寫回」，
+#       兩台機甲可能同時看到 count < limit 而一起開火；且以「次數」計費，但供應商實際以音訊時數計費
+#       (Gladia 每帳號 10 小時/月、Speechmatics 8 小時/月)。本模組改用 pod_scra_stt_quota 帳本，
+#       以資料庫 RPC 原子地「預留 -> 結算 / 退回」音訊秒數。
+# [帳本] 以 (金鑰車道, 計費週期) 為鍵：車道 = 供應商#金鑰序號 (與計分板一致)，週期 = 月 (2026-10) 或 ISO 週 (2026-W42)。
+# [預留] reserve：剩餘額度放得下整段音訊才預留 (單一 UPDATE 條件式檢查，杜絕競態)，回傳預留單號。
+# [結算] commit：同步聽打成功 / 收件完工時扣帳；release：失敗或退件時退回預留秒數。
+# [防漏] 機甲陣亡遺留的預留單超過 HOLD_STALE_MINUTES 由下一次 reserve 自動退回。
+# [降級] RPC 不可用時 reserve 回傳 None，呼叫端退回舊版次數制 check_and_update_quota (滴流) 或照常開火 (免費矩陣)。
+# ---------------------------------------------------------
+import os
+from datetime import datetime, timezone
+from src.pod_scra_intel_sttscore import slot_id
+
+QUOTA_TABLE = "pod_scra_stt_quota"
+HOLD_STALE_MINUTES = 180          # ⌛ 須大於遠端工單 TTL (JOB_TTL_MINUTES = 120)
+
+# 💸 各供應商每把金鑰的計費週期與時數 (可由 STT_BUDGET_HOURS_<供應商> 覆寫)
+#    滴流供應商 (一次性額度) 沿用「每週配給」精神，改以每週時數控管
+QUOTA_PLANS = {
+    "GLADIA":       ("month", float(os.environ.get("STT_BUDGET_HOURS_GLADIA", 10))),
+    "SPEECHMATICS": ("month", float(os.environ.get("STT_BUDGET_HOURS_SPEECHMATICS", 8))),
+    "ASSEMBLYAI":   ("week",  float(os.environ.get("STT_BUDGET_HOURS_ASSEMBLYAI", 1))),
+    "DEEPGRAM":     ("week",  float(os.environ.get("STT_BUDGET_HOURS_DEEPGRAM", 4))),
+}
+
+# 🧮 片長未知時依檔案大小估算 (opus 約 32kbps、mp3 約 128kbps)，寧可高估不超支
+EST_BYTES_PER_SEC = {"audio/ogg": 4000, "audio/mpeg": 16000}
+
+def billing_period(provider, now=None):
+    """目前計費週期標籤；未列入計畫的供應商回傳 None (不受帳本控管)"""
+    plan = QUOTA_PLANS.get(provider)
+    if not plan: return None
+    now = now or datetime.now(timezone.utc)
+    if plan[0] == "week":
+        year, week, _ = now.isocalendar()
+        return f"{year}-W{week:02d}"
+    return now.strftime("%Y-%m")
+
+def budget_sec(provider):
+    plan = QUOTA_PLANS.get(provider)
+    return plan[1] * 3600 if plan else None
+
+def estimate_audio_sec(file_size_mb, mime_type="audio/ogg"):
+    """依檔案大小估算片長 (秒)"""
+    return (file_size_mb or 0) * 1024 * 1024 / EST_BYTES_PER_SEC.get(mime_type, 4000)
+
+def load_remaining(sb, lanes):
+    """
+    讀取各車道本期剩餘秒數，回傳 {(供應商, 金鑰序號): 秒數}；
+    尚無帳列者視為整期額度；帳本不可用時回傳 None (呼叫端維持原順序)。
+    """
+    if not sb: return None
+    try:
+        periods = {billing_period(p) for p, _ in lanes if p in QUOTA_PLANS}
+        res = sb.table(QUOTA_TABLE).select("lane, period, budget_sec, used_sec, reserved_sec") \
+                .in_("period", sorted(periods)).execute()
+        rows = {(r["lane"], r["period"]): r for r in (res.data or [])}
+    except Exception as e:
+        print(f"⚠️ [額度帳本] 讀取失敗，改用舊版配額: {str(e)[:80]}")
+        return None
+    remaining = {}
+    for provider, idx in lanes:
+        if provider not in QUOTA_PLANS: continue
+        row = rows.get((slot_id(provider, idx), billing_period(provider)))
+        budget = budget_sec(provider)
+        used = (row.get("used_sec") or 0) + (row.get("reserved_sec") or 0) if row else 0
+        remaining[(provider, idx)] = budget - used
+    return remaining
+
+def reserve(sb, provider, key_index, seconds, task_id=None):
+    """
+    【預留】原子地預留 seconds 秒額度。
+    回傳預留單號 (int)；額度不足回傳 False；帳本不可用或供應商未列入計畫回傳 None。
+    """
+    if not sb or provider not in QUOTA_PLANS: return None
+    try:
+        res = sb.rpc("pod_scra_stt_quota_reserve", {
+            "p_lane": slot_id(provider, key_index), "p_period": billing_period(provider),
+            "p_budget_sec": budget_sec(provider), "p_seconds": round(seconds, 1),
+            "p_task_id": task_id, "p_stale_minutes": HOLD_STALE_MINUTES,
+        }).execute()
+    except Exception as e:
+        print(f"⚠️ [額度帳本] 預留失敗，改用舊版配額: {str(e)[:80]}")
+        return None
+    hold_id = res.data
+    if isinstance(hold_id, list): hold_id = hold_id[0] if hold_id else None
+    if isinstance(hold_id, dict): hold_id = next(iter(hold_id.values()), None)
+    if not hold_id:
+        print(f"💸 [額度帳本] {slot_id(provider, key_index)} 本期剩餘額度不足 {seconds / 60:.0f} 分鐘，略過。")
+        return False
+    return hold_id
+
+def commit(sb, hold_id, seconds=None):
+    """【結算】預留轉為實際用量 (seconds 為 None 時以預留秒數扣帳)"""
+    if not sb or not hold_id: return
+    try:
+        sb.rpc("pod_scra_stt_quota_commit", {"p_hold_id": hold_id, "p_seconds": seconds}).execute()
+    except Exception as e:
+        print(f"⚠️ [額度帳本] 結算失敗 (#{hold_id}): {str(e)[:80]}")
+
+def release(sb, hold_id):
+    """【退回】聽打失敗 / 退件時歸還預留秒數"""
+    if not sb or not hold_id: return
+    try:
+        sb.rpc("pod_scra_stt_quota_release", {"p_hold_id": hold_id}).execute()
+    except Exception as e:
+        print(f"⚠️ [額度帳本] 退回失敗 (#{hold_id}): {str(e)[:80]}")
+
+def rank_by_budget(slots, remaining, seconds):
+    """
+    依本期剩餘額度由多到少排列 (穩定排序，同額度維持原順序)，放不下整段音訊的車道剔除。
+    回傳 (可開火車道, 額度不足車道)；帳本不可用 (remaining 為 None) 時原樣回傳。
+    """
+    if remaining is None: return list(slots), []
+    fits = [sl for sl in slots if sl not in remaining or remaining[sl] >= seconds]
+    short = [sl for sl in slots if sl in remaining and remaining[sl] < seconds]
+    return sorted(fits, key=lambda sl: -remaining.get(sl, float("inf"))), short
\ No newline at end of file
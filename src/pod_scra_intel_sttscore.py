@@ -0,0 +1,160 @@
+# ---------------------------------------------------------
+# src/pod_scra_intel_sttscore.py (V6.35 STT 供應商計分板)
+# 職責：Router 原本以固定順序逐一嘗試供應商，連續數小時回 429/402 的供應商仍在每件任務最前面
+#       白白燒掉一次下載、10 秒冷卻或 30 秒送單逾時。本模組將每個「供應商 + 金鑰」的戰績寫入
+#       pod_scra_stt_scoreboard (全軍共用)，並以斷路器與即時計分決定路由順序。
+# [戰績] 成功率 EWMA (alpha=0.3)、最近 LATENCY_WINDOW 筆耗時的 p50/p95、最後額度告警時間。
+# [斷路] closed (正常) -> open (額度告警立即跳脫；連續失敗 FAIL_THRESHOLD 次跳脫) -> 冷卻期滿
+#        half_open (全軍僅一台取得試射權) -> 成功回 closed / 失敗再 open，冷卻時間加倍 (上限 COOLDOWN_MAX)。
+# [路由] load_board 每次路由讀一次整張表 (列數 = 金鑰數)，allow() 為 O(1) 字典查詢；
+#        order_slots() 依「成功率 ÷ (1 + p50 / 基準耗時)」排序，未有紀錄者以樂觀預設值參與。
+# [容錯] 計分板讀寫失敗一律靜默降級為固定順序，絕不阻斷聽打主流程。
+# [原子] 戰績回報走 RPC pod_scra_stt_record_outcome (列鎖內完成計數與斷路器轉換，多台機甲同時回報不再互相覆寫)；
+#        RPC 尚未部署時退回「讀 -> 改 -> 寫回」。
+# ---------------------------------------------------------
+from datetime import datetime, timezone, timedelta
+
+BOARD_TABLE = "pod_scra_stt_scoreboard"
+EWMA_ALPHA = 0.3
+LATENCY_WINDOW = 40
+LATENCY_BASELINE_SEC = 120.0     # ⏱️ 計分用的基準耗時 (p50 等於基準時分數減半)
+FAIL_THRESHOLD = 3               # 💥 連續失敗次數門檻
+FAIL_COOLDOWN_SEC = 600          # 🧊 一般跳脫首次冷卻 10 分鐘
+QUOTA_COOLDOWN_SEC = 3600        # 🧊 額度告警首次冷卻 1 小時
+COOLDOWN_MAX_SEC = 6 * 3600
+PROBE_TIMEOUT_SEC = 900          # 🔍 半開試射逾時未回報 (機甲陣亡) 即開放下一次試射
+
+def slot_id(provider, key_index=0):
+    return f"{provider}#{key_index}"
+
+def is_quota_status(status):
+    """額度 / 限流類失敗 (供應商沒錢或被限流，換下一家才有意義)"""
+    status = str(status or "")
+    return "QUOTA_HIT" in status or "_HTTP_429" in status or "_HTTP_402" in status
+
+def _ewma(prev, value, alpha=EWMA_ALPHA):
+    return value if prev is None else alpha * value + (1 - alpha) * prev
+
+def _percentile(samples, q):
+    if not samples: return None
+    ordered = sorted(samples)
+    return ordered[min(int(round(q * (len(ordered) - 1))), len(ordered) - 1)]
+
+def _now():
+    return datetime.now(timezone.utc)
+
+def _parse_ts(value):
+    try: return datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except Exception: return None
+
+def load_board(sb):
+    """讀取整張計分板，回傳 {slot: row}；失敗回傳空表 (等同全部 closed)"""
+    if not sb: return {}
+    try:
+        res = sb.table(BOARD_TABLE).select("*").execute()
+        return {row["slot"]: row for row in (res.data or [])}
+    except Exception as e:
+        print(f"⚠️ [計分板] 讀取失敗，改用固定順序: {str(e)[:80]}")
+        return {}
+
+def breaker_state(board, provider, key_index=0):
+    """回傳 closed / open / half_open (冷卻期滿的 open 視為可試射的 half_open；試射在途時仍視為 open)"""
+    row = board.get(slot_id(provider, key_index))
+    if not row or row.get("breaker_state") in (None, "closed"): return "closed"
+    if row.get("breaker_state") == "half_open":
+        probed = _parse_ts(row.get("updated_at"))
+        if probed and _now() - probed < timedelta(seconds=PROBE_TIMEOUT_SEC): return "open"
+        return "half_open"
+    until = _parse_ts(row.get("cooldown_until"))
+    if until and until > _now(): return "open"
+    return "half_open"
+
+def allow(sb, board, provider, key_index=0):
+    """【斷路器】O(1) 判定是否可開火；half_open 時以條件更新搶試射權，全軍只放行一台"""
+    state = breaker_state(board, provider, key_index)
+    if state == "closed": return True
+    if state == "open": return False
+    row = board[slot_id(provider, key_index)]
+    try:
+        res = sb.table(BOARD_TABLE).update({"breaker_state": "half_open", "updated_at": _now().isoformat()}) \
+                .eq("slot", row["slot"]).eq("breaker_state", row.get("breaker_state")) \
+                .eq("updated_at", row.get("updated_at")).execute()
+        won = bool(res.data)
+    except Exception:
+        won = False
+    if won:
+        row.update({"breaker_state": "half_open", "updated_at": _now().isoformat()})
+        print(f"🔌 [計分板] {row['slot']} 冷卻期滿，取得半開試射權。")
+    return won
+
+def score(board, provider, key_index=0):
+    """路由分數：成功率 ÷ (1 + p50 / 基準耗時)；無紀錄者以成功率 1、p50 = 基準的一半樂觀估計"""
+    row = board.get(slot_id(provider, key_index)) or {}
+    rate = row.get("success_rate")
+    rate = 1.0 if rate is None else rate
+    p50 = row.get("p50_sec")
+    p50 = LATENCY_BASELINE_SEC / 2 if p50 is None else p50
+    return rate / (1.0 + p50 / LATENCY_BASELINE_SEC)
+
+def order_slots(board, slots):
+    """依分數由高到低排列 [(供應商, 金鑰序號), ...]；斷路中的排到最後 (穩定排序，同分維持原順序)"""
+    return sorted(slots, key=lambda sl: (breaker_state(board, *sl) == "open", -score(board, *sl)))
+
+def record_outcome(sb, provider, key_index=0, ok=True, latency_sec=None, status=None, board=None):
+    """【戰績回報】更新成功率 / 耗時分位數 / 斷路器；額度告警立即跳脫"""
+    if not sb or "NO_API_KEY" in str(status or ""): return    # 🔑 未配置金鑰屬設定問題，不計入戰績
+    slot = slot_id(provider, key_index)
+    quota = not ok and is_quota_status(status)
+    try:
+        res = sb.rpc("pod_scra_stt_record_outcome", {
+            "p_slot": slot, "p_provider": provider, "p_key_index": key_index, "p_ok": bool(ok),
+            "p_latency_sec": round(latency_sec, 1) if ok and latency_sec is not None else None,
+            "p_quota": quota, "p_error": None if ok else str(status or "")[:120],
+            "p_alpha": EWMA_ALPHA, "p_window": LATENCY_WINDOW, "p_fail_threshold": FAIL_THRESHOLD,
+            "p_fail_cooldown": FAIL_COOLDOWN_SEC, "p_quota_cooldown": QUOTA_COOLDOWN_SEC,
+            "p_cooldown_max": COOLDOWN_MAX_SEC,
+        }).execute()
+        row = res.data[0] if isinstance(res.data, list) and res.data else res.data
+        if isinstance(row, dict):
+            if row.pop("tripped", False):
+                print(f"🔌 [計分板] {slot} 斷路跳脫 {(row.get('cooldown_sec') or 0) // 60:.0f} 分鐘 "
+                      f"({'額度告警' if quota else '連續失敗 ' + str(row.get('consecutive_failures')) + ' 次'})")
+            if board is not None: board[slot] = row
+        return
+    except Exception as e:
+        print(f"⚠️ [計分板] RPC 回報失敗，改用讀寫回報 ({slot}): {str(e)[:80]}")
+    try:
+        res = sb.table(BOARD_TABLE).select("*").eq("slot", slot).execute()
+        prev = (res.data or [{}])[0]
+        now = _now()
+        row = {
+            "slot": slot, "provider": provider, "key_index": key_index,
+            "success_count": (prev.get("success_count") or 0) + (1 if ok else 0),
+            "failure_count": (prev.get("failure_count") or 0) + (0 if ok else 1),
+            "success_rate": round(_ewma(prev.get("success_rate"), 1.0 if ok else 0.0), 4),
+            "updated_at": now.isoformat(),
+        }
+        if ok and latency_sec is not None:
+            samples = ((prev.get("latency_samples") or []) + [round(latency_sec, 1)])[-LATENCY_WINDOW:]
+            row.update({"latency_samples": samples, "p50_sec": _percentile(samples, 0.5), "p95_sec": _percentile(samples, 0.95)})
+
+        if ok:
+            row.update({"consecutive_failures": 0, "breaker_state": "closed", "cooldown_sec": None,
+                        "cooldown_until": None, "last_success_at": now.isoformat()})
+        else:
+            fails = (prev.get("consecutive_failures") or 0) + 1
+            row.update({"consecutive_failures": fails, "last_failure_at": now.isoformat(),
+                        "last_error": str(status or "")[:120]})
+            if quota: row["last_quota_hit_at"] = now.isoformat()
+            if quota or fails >= FAIL_THRESHOLD or prev.get("breaker_state") == "half_open":
+                # 🧊 跳脫：連續跳脫時冷卻加倍
+                base = QUOTA_COOLDOWN_SEC if quota else FAIL_COOLDOWN_SEC
+                last = prev.get("cooldown_sec") if prev.get("breaker_state") in ("open", "half_open") else None
+                cooldown = min(max(base, (last or 0) * 2), COOLDOWN_MAX_SEC)
+                row.update({"breaker_state": "open", "cooldown_sec": cooldown,
+                            "cooldown_until": (now + timedelta(seconds=cooldown)).isoformat()})
+                print(f"🔌 [計分板] {slot} 斷路跳脫 {cooldown // 60:.0f} 分鐘 ({'額度告警' if quota else f'連續失敗 {fails} 次'})")
+        sb.table(BOARD_TABLE).upsert(row, on_conflict="slot").execute()
+        if board is not None: board[slot] = {**prev, **row}
+    except Exception as e:
+        print(f"⚠️ [計分板] 回報失敗 ({slot}): {str(e)[:80]}")
\ No newline at end of file
@@ -9,10 +9,17 @@
 # 適用：RENDER, KOYEB, ZEABUR (純 REST 輕快版，無 SDK 依賴)
 # [V6.1] 新增def send_tg_report(secrets,..)顯示 AI 提供者
 # [V6.8 重大更新] 已將所有聽寫 (STT) API 呼叫剝離，全數移交 stt_router.py 接管。
+# [V6.29 升級] Gemini 摘要改以 fetch_spooled 串流取貨，重裝路徑以分塊複製落地暫存檔，不再持有整檔 bytes。
+# [V6.30 升級] Gemini 請求體改為串流 base64 JSON (精算 Content-Length)，模型降級輪詢共用同一請求體；
+#              大檔改走 REST Files API，移除 genai SDK 依賴與重裝權限攔截，內嵌上限由 14MB 放寬至 20MB 請求體。
+# [V6.38 升級] Gemini 與 Telegram 改走供應商連線池 (keep-alive，有 h2 時 HTTP/2)，模型降級與重送不再重新握手。
+# [V6.39 升級] 檢視表未必帶出新欄位：雷達結果一次批次回補 mission_queue 的 audio_sha256 / audio_duration_sec
+#              (逐字稿快取、去重成品回填與額度帳本片長皆依賴這兩欄)。
 # ---------------------------------------------------------
-import base64, re, gc, os
+import re, os, json, time
 from datetime import datetime, timezone, timedelta
-from curl_cffi import requests 
+from src.pod_scra_intel_fetch import fetch_spooled, Base64JsonBody
+from src.pod_scra_intel_httppool import get_client
 
 # =========================================================
 # 📡 戰略雷達 (Strategic Radar)
@@ -32,7 +39,23 @@ def fetch_stt_tasks(sb, mem_tier, worker_id="UNKNOWN", fetch_limit=50):
         query = query.order("soft_failure_count", desc=False, nullsfirst=True) \
                      .order("audio_size_mb", desc=True, nullsfirst=True)
         
-    return query.limit(fetch_limit).execute().data or []
+    return _backfill_queue_fields(sb, query.limit(fetch_limit).execute().data or [])
+
+QUEUE_BACKFILL_FIELDS = ("audio_sha256", "audio_duration_sec")
+
+def _backfill_queue_fields(sb, tasks):
+    """以單次 in_ 查詢自 mission_queue 回補檢視表缺少的欄位 (失敗則原樣回傳)"""
+    ids = [t["id"] for t in tasks if any(f not in t for f in QUEUE_BACKFILL_FIELDS)]
+    if not ids: return tasks
+    try:
+        res = sb.table("mission_queue").select("id, " + ", ".join(QUEUE_BACKFILL_FIELDS)).in_("id", ids).execute()
+        rows = {r["id"]: r for r in (res.data or [])}
+        for t in tasks:
+            for f in QUEUE_BACKFILL_FIELDS:
+                if f not in t: t[f] = rows.get(t["id"], {}).get(f)
+    except Exception as e:
+        print(f"⚠️ [雷達] 任務欄位回補失敗: {str(e)[:80]}")
+    return tasks
 
 def increment_soft_failure(sb, task_id):
     try:
@@ -92,61 +115,80 @@ def parse_intel_metrics(text):
 # 🧠 AI 火控與通訊 (AI & Comms)
 # =========================================================
 
+GEMINI_API = "https://generativelanguage.googleapis.com/v1beta"
+GEMINI_UPLOAD_API = "https://generativelanguage.googleapis.com/upload/v1beta/files"
+GEMINI_INLINE_MAX_BODY_MB = 19.5     # 📦 generateContent 單一請求上限 20MB (含 base64 膨脹)，約等於 14.6MB 原始音檔
+_AUDIO_MARK = "@@AUDIO_B64@@"
+
+def _gemini_upload_file(client, api_key, audio_file, size_bytes, m_type, timeout=120):
+    """【Files API】以 REST 可續傳協定串流上傳，等待檔案轉為 ACTIVE 後回傳 file 資訊"""
+    start = client.post(f"{GEMINI_UPLOAD_API}?key={api_key}", json={"file": {"display_name": "podcast_audio"}}, headers={
+        "X-Goog-Upload-Protocol": "resumable", "X-Goog-Upload-Command": "start",
+        "X-Goog-Upload-Header-Content-Length": str(size_bytes), "X-Goog-Upload-Header-Content-Type": m_type})
+    upload_url = start.headers.get("x-goog-upload-url")
+    if not upload_url: raise Exception(f"Files API 開檔失敗 HTTP {start.status_code}: {start.text[:150]}")
+
+    audio_file.seek(0)
+    resp = client.post(upload_url, content=audio_file, timeout=180.0, headers={
+        "Content-Length": str(size_bytes), "X-Goog-Upload-Offset": "0", "X-Goog-Upload-Command": "upload, finalize"})
+    if resp.status_code != 200: raise Exception(f"Files API 上傳失敗 HTTP {resp.status_code}: {resp.text[:150]}")
+    info = resp.json().get("file", {})
+
+    deadline = time.time() + timeout
+    while info.get("state") == "PROCESSING" and time.time() < deadline:
+        time.sleep(3)
+        info = client.get(f"{GEMINI_API}/{info['name']}?key={api_key}").json()
+    if info.get("state") not in (None, "ACTIVE"): raise Exception(f"Files API 檔案狀態異常: {info.get('state')}")
+    return info
+
 def call_gemini_summary(secrets, r2_url_path, sys_prompt):
     gem_api_key = secrets.get('GEMINI_API_KEY', secrets.get('GEMINI_KEY'))
     # 🚀 修正 404 錯誤：更新為正確的 Gemini API 模型名稱
-    gemini_models = ["gemini-2.5-flash", "gemini-1.5-flash-latest", "gemini-1.5-pro-latest"]    
-    payload_rest = None; uploaded_file = None; tmp_path = None; use_sdk = False
-    
-    if not r2_url_path or r2_url_path.lower() == 'null':
-        payload_rest = {"contents": [{"parts": [{"text": sys_prompt}]}]}
-    else:
-        url = f"{secrets['R2_URL']}/{r2_url_path}"
-        m_type = "audio/ogg" if ".opus" in url.lower() or ".ogg" in url.lower() else "audio/mpeg"
-        resp = requests.get(url, timeout=120); resp.raise_for_status()
-        raw_bytes = resp.content
-        file_size_mb = len(raw_bytes) / (1024 * 1024)
-
-        if file_size_mb <= 14.0:
-            b64_audio = base64.b64encode(raw_bytes).decode('utf-8')
-            del raw_bytes; gc.collect()
-            payload_rest = {"contents": [{"parts": [{"text": sys_prompt}, {"inline_data": {"mime_type": m_type, "data": b64_audio}}]}]}
-        else:
-            use_sdk = True
-            if os.environ.get("WORKER_ID") not in ["HUGGINGFACE", "DBOS", "AUDIO_EAT", "RAILWAY"]:
-                del raw_bytes; raise Exception(f"越權攔截：檔案達 {file_size_mb:.1f}MB，中型機甲無重裝權限。")
-            import tempfile, google.generativeai as genai
-            genai.configure(api_key=gem_api_key)
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".opus") as tmp: 
-                tmp.write(raw_bytes); tmp_path = tmp.name
-            del raw_bytes; gc.collect()
-            uploaded_file = genai.upload_file(path=tmp_path, mime_type=m_type)
-
+    gemini_models = ["gemini-2.5-flash", "gemini-1.5-flash-latest", "gemini-1.5-pro-latest"]
+    audio_file = None; uploaded = None
     last_error = ""; result_text = ""
-    for model_name in gemini_models:
-        print(f"🎯 [Gemini 輪詢] 嘗試呼叫模型: {model_name}...")
-        try:
-            if not use_sdk:
-                g_url = f"https://generativelanguage.googleapis.com/v1beta/models/{model_name}:generateContent?key={gem_api_key}"
-                ai_resp = requests.post(g_url, json=payload_rest, timeout=180)
+    envelope = {"contents": [{"parts": [{"text": sys_prompt}]}]}
+
+    client = get_client(GEMINI_API)
+    try:
+        if not r2_url_path or r2_url_path.lower() == 'null':
+            body = json.dumps(envelope).encode('utf-8')
+        else:
+            url = f"{secrets['R2_URL']}/{r2_url_path}"
+            m_type = "audio/ogg" if ".opus" in url.lower() or ".ogg" in url.lower() else "audio/mpeg"
+            # 📼 [V6.29] 串流落地：大檔溢寫磁碟，不再整檔 resp.content 常駐記憶體
+            audio_file, size_bytes = fetch_spooled(url, timeout=120)
+            parts = envelope["contents"][0]["parts"]
+
+            # 📦 [V6.30] 單一路徑：小檔 base64 串流內嵌，大檔走 REST Files API 後以 file_uri 引用
+            parts.append({"inline_data": {"mime_type": m_type, "data": _AUDIO_MARK}})
+            prefix, suffix = json.dumps(envelope).split(_AUDIO_MARK)
+            body = Base64JsonBody(prefix, audio_file, size_bytes, suffix)
+            if len(body) > GEMINI_INLINE_MAX_BODY_MB * 1024 * 1024:
+                print(f"📤 [Gemini] 檔案 {size_bytes / (1024 * 1024):.1f}MB 超過內嵌上限，改走 Files API...")
+                uploaded = _gemini_upload_file(client, gem_api_key, audio_file, size_bytes, m_type)
+                parts[-1] = {"file_data": {"mime_type": m_type, "file_uri": uploaded["uri"]}}
+                body = json.dumps(envelope).encode('utf-8')
+
+        for model_name in gemini_models:
+            print(f"🎯 [Gemini 輪詢] 嘗試呼叫模型: {model_name}...")
+            try:
+                # ♻️ 同一個請求體跨模型重複使用 (串流請求體每次自檔案開頭重新編碼)
+                g_url = f"{GEMINI_API}/models/{model_name}:generateContent?key={gem_api_key}"
+                ai_resp = client.post(g_url, content=body, timeout=180.0, headers={
+                    "Content-Type": "application/json", "Content-Length": str(len(body))})
                 if ai_resp.status_code == 200:
                     cands = ai_resp.json().get('candidates', [])
                     result_text = cands[0]['content']['parts'][0].get('text', "") if cands else ""
                     break
                 else: raise Exception(f"HTTP {ai_resp.status_code}: {ai_resp.text[:150]}")
-            else:
-                import google.generativeai as genai
-                model = genai.GenerativeModel(model_name)
-                response = model.generate_content([sys_prompt, uploaded_file])
-                result_text = response.text; break
-        except Exception as e:
-            last_error = str(e); print(f"⚠️ [Gemini 戰損] 模型 {model_name} 遭遇阻礙: {last_error}"); continue 
-
-    if payload_rest: del payload_rest; gc.collect()
-    if use_sdk and uploaded_file:
-        import google.generativeai as genai
-        try: genai.delete_file(uploaded_file.name); os.remove(tmp_path)
-        except: pass
+            except Exception as e:
+                last_error = str(e); print(f"⚠️ [Gemini 戰損] 模型 {model_name} 遭遇阻礙: {last_error}"); continue
+    finally:
+        if audio_file: audio_file.close()
+        if uploaded:
+            try: client.delete(f"{GEMINI_API}/{uploaded['name']}?key={gem_api_key}")
+            except: pass
 
     if result_text: return result_text
     else: raise Exception(f"所有 Gemini 梯隊均已陣亡。最後錯誤: {last_error}")
@@ -163,10 +205,11 @@ def send_tg_report(secrets, source, title, summary, task_id, sb=None, worker_id=
     payload = {"chat_id": secrets["TG_CHAT"], "text": report_msg, "parse_mode": "Markdown"}
 
     try:
-        resp = requests.post(url, json=payload, timeout=15)
+        client = get_client(url)
+        resp = client.post(url, json=payload, timeout=15)
         if resp.status_code != 200:
             payload["parse_mode"] = None
-            resp = requests.post(url, json=payload, timeout=15)
+            resp = client.post(url, json=payload, timeout=15)
         if resp.status_code == 200: return True
         else: raise Exception(f"Telegram 終極發送失敗: {resp.text}")
     except Exception as e: 
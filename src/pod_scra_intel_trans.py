@@ -19,15 +19,106 @@
 # [V6.13 升級] 實裝網域分散度動態偵測 (Dynamic Dispersion)，智能切換游擊/併發模式。
 # [V6.14 升級] 戰術校準：全面轉向「App 離線下載」行為擬真，消除 Range 矛盾。
 #              擴大泥沼戰術防禦圈，將 curl 56 等連線斷裂錯誤納入軟失敗重試機制。
+# [V6.15 升級] 網域車道平行搬運：同網域排成一條車道依序下載，不同網域由 DL_CONCURRENCY
+#              條車道平行推進，單拍耗時由「各網域加總」降為「最慢的單一網域」。
+# [V6.16 升級] 零落地串流：下載分塊直灌 R2 Multipart (STREAM_TO_R2)，失敗即 Abort 撤收。
+# [V6.17 升級] 融合產線：具備 CAN_COMPRESS 且 MEM_TIER >= 512 的機甲，下載同時灌入 FFmpeg
+#              產出 Opus 直送 R2；FFmpeg 任何異常即退回原檔入庫，由兵工廠沿用兩段式壓縮。
+# [V6.18 升級] 斷點續傳：泥沼戰術斬斷時，已送達 R2 的分片與來源 ETag/Last-Modified 寫入
+#              mission_queue.dl_resume_state；下一位機甲以 Range + If-Range 接續，來源變更則重頭搬運。
+# [V6.19 升級] 測速哨兵：以移動視窗追蹤吞吐量，依 Content-Length 預估完工時間，
+#              超出單拍剩餘預算或跌破 DL_MIN_KBPS 即提早斬斷並走泥沼記帳；各網域實測速率留存供排程參考。
+# [V6.20 升級] 網域戰情表：每筆搬運回報吞吐量/TTFB/成功率；FASTEST_FIRST 模式依預估完工時間選貨，
+#              已知慢速網域由輕裝兵轉交重裝兵 (dl_heavy_only)。
+# [V6.21 升級] 選貨下放資料庫：pod_scra_pick_dl_candidates RPC 一次完成黑名單、分散度與網域上限，
+#              僅回傳搬運欄位；RPC 未部署或失敗時自動退回 50 筆樣本的 Python 篩選。
+# [V6.22 升級] 網域禁區快取：規則載入一次後依 TTL 增量刷新，字尾樹 O(標籤數) 判定封鎖；
+#              局中封鎖本地立即生效，收工時批次寫回 pod_scra_rules。
+# [V6.23 升級] 內容定址去重：下載同步計算 SHA-256，命中 pod_scra_audio_index 即撤收本次上傳，
+#              直接掛回既有原檔/Opus/逐字稿 (續傳任務因缺前段位元組，不參與去重)。
 # ---------------------------------------------------------
 
-import os, time, random, gc, json
+import os, time, random, gc, json, threading, hashlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from curl_cffi import requests 
 from urllib.parse import urlparse
 from datetime import datetime, timezone, timedelta
-from src.pod_scra_intel_r2 import get_s3_client 
+from src.pod_scra_intel_r2 import (
+    get_s3_client, TRANSFER_CONFIG, R2StreamUploader, R2OpusStreamTranscoder, OpusStreamError, FUSED_OPUS_MIN_MEM,
+    fused_opus_profile
+)
 from src.pod_scra_intel_camouflage import get_tactical_camouflage
 from src.pod_scra_intel_control import get_tactical_panel
+from src.pod_scra_intel_domainpolicy import get_domain_policy
+from src.pod_scra_intel_dedup import lookup_audio, register_audio, apply_dedup_hit
+from src.pod_scra_intel_domainstats import (
+    load_domain_stats, record_transfer, order_by_expected_time, is_known_slow
+)
+
+HEAVY_ARMORS = ["HUGGINGFACE", "GITHUB"]
+DL_MAX_RESUMES = 4  # 🧷 單一任務最多接續次數，超過則回歸原本的軟失敗升級流程
+
+# 📈 [V6.19] 各網域實測吞吐量 (EWMA，bytes/s)，供後續排程判斷快慢
+DOMAIN_THROUGHPUT = {}
+_throughput_lock = threading.Lock()
+
+class SlowTransferAbort(TimeoutError):
+    """測速哨兵斬斷 (訊息含 timeout 字樣，沿用泥沼戰術記帳)"""
+    pass
+
+class ThroughputWatchdog:
+    """
+    【測速哨兵】以移動視窗追蹤下載速率。
+    寬限期過後，若視窗速率跌破底線，或依 Content-Length 預估的完工時間超出截止點，立即斬斷。
+    """
+    def __init__(self, expected_bytes, deadline, floor_bps, window=10.0, grace=8.0):
+        self.start = time.time()
+        self.expected = expected_bytes or 0
+        self.deadline = deadline
+        self.floor_bps = floor_bps
+        self.window = window
+        self.grace = grace
+        self.total = 0
+        self.end = None
+        self.samples = deque([(self.start, 0)])
+
+    def feed(self, n):
+        now = time.time()
+        self.total += n
+        self.samples.append((now, self.total))
+        while len(self.samples) > 2 and now - self.samples[0][0] > self.window:
+            self.samples.popleft()
+        if now > self.deadline:
+            raise SlowTransferAbort(f"Download budget timeout exceeded ({self.total / 1048576:.1f}MB received).")
+        if now - self.start < self.grace: return
+
+        t0, b0 = self.samples[0]
+        rate = (self.total - b0) / max(now - t0, 1e-3)
+        if rate < self.floor_bps:
+            raise SlowTransferAbort(f"Throughput timeout: {rate / 1024:.1f}KB/s below floor {self.floor_bps / 1024:.0f}KB/s.")
+        if self.expected > self.total and now + (self.expected - self.total) / rate > self.deadline:
+            eta = (self.expected - self.total) / rate
+            raise SlowTransferAbort(f"Projected finish timeout: ETA {eta:.0f}s exceeds remaining budget {self.deadline - now:.0f}s.")
+
+    def stop(self):
+        """串流結束即凍結計時，封箱 / 壓縮收尾 / 寫庫的耗時不計入吞吐量"""
+        if self.end is None: self.end = time.time()
+
+    @property
+    def elapsed(self):
+        return (self.end or time.time()) - self.start
+
+    @property
+    def avg_bps(self):
+        return self.total / max(self.elapsed, 1e-3)
+
+def record_domain_throughput(domain, bps, alpha=0.3):
+    """以 EWMA 累積各網域實測吞吐量"""
+    if not domain or bps <= 0: return
+    with _throughput_lock:
+        prev = DOMAIN_THROUGHPUT.get(domain)
+        DOMAIN_THROUGHPUT[domain] = bps if prev is None else (alpha * bps + (1 - alpha) * prev)
 
 def execute_fortress_stages(sb, config, s_log_func):
     now_iso = datetime.now(timezone.utc).isoformat()
@@ -76,16 +167,16 @@ def execute_fortress_stages(sb, config, s_log_func):
             dl_limit = 1 
             
         max_same_domain = panel.get("MAX_SAME_DOMAIN", 1)
+        dl_concurrency = panel.get("DL_CONCURRENCY", 1)
         
         s_log_func(sb, "STATE_M", "INFO", f"{role_name} 執行階段 1/{max_ticks}: 外部下載 (目標總量 {dl_limit}, 同網域上限 {max_same_domain})")
         
-        rule_res = sb.table("pod_scra_rules").select("domain").in_("worker_id", [worker_id, "ALL"]).gte("expired_at", now_iso).execute()
-        db_blacklist = [r['domain'] for r in rule_res.data] if rule_res.data else []
-        
-        panel_blacklist = panel.get("GLOBAL_DOMAIN_BLACKLIST", [])
-        combined_blacklist = list(set(db_blacklist + panel_blacklist))
+        # 🌲 [V6.22] 網域禁區快取：TTL 內免查 pod_scra_rules，逾時僅增量補貨
+        domain_policy = get_domain_policy([worker_id, "ALL"])
+        domain_policy.add_static(panel.get("GLOBAL_DOMAIN_BLACKLIST", []))
+        domain_policy.refresh(sb)
         
-        run_logistics_engine(sb, config, now_iso, s_log_func, combined_blacklist, dl_limit, max_same_domain, is_duty_officer) 
+        run_logistics_engine(sb, config, now_iso, s_log_func, domain_policy, dl_limit, max_same_domain, is_duty_officer, dl_concurrency, panel) 
     
     elif current_tick % 2 != 0:
         s_log_func(sb, "STATE_M", "INFO", f"{role_name} 啟動轉譯產線 (由面板接管)")
@@ -94,156 +185,426 @@ def execute_fortress_stages(sb, config, s_log_func):
         s_log_func(sb, "STATE_M", "INFO", f"{role_name} 啟動摘要發報 (由面板接管)")
         run_stt_to_summary_mission(sb) 
 
-def run_logistics_engine(sb, config, now_iso, s_log_func, my_blacklist, dl_limit=2, max_same_domain=1, is_duty_officer=True):
+def run_logistics_engine(sb, config, now_iso, s_log_func, domain_policy, dl_limit=2, max_same_domain=1, is_duty_officer=True, dl_concurrency=1, panel=None):
     worker_id = config.get('WORKER_ID', 'UNKNOWN')
+    panel = panel or get_tactical_panel(worker_id)
+    tick_deadline = time.time() + panel.get("DL_TICK_BUDGET_SECONDS", 600)
     
-    HEAVY_ARMORS = ["HUGGINGFACE", "GITHUB"]
     allowed_statuses = ["success", "dl_heavy_only"] if worker_id in HEAVY_ARMORS else ["success"]
 
-    # 🚀 將抽取樣本數擴大至 50 筆，確保有足夠樣本進行網域篩選
-    query = sb.table("mission_queue").select("*, mission_program_master(*)").in_("scrape_status", allowed_statuses).is_("r2_url", "null").lte("troop2_start_at", now_iso).order("created_at", desc=True)\
-        .limit(50)  
-    
-    tasks = query.execute().data or []
-    if not tasks: return
+    # 🛰️ [V6.21] 優先交由資料庫 RPC 完成黑名單、分散度與同網域上限篩選，僅回傳搬運所需欄位
+    picked = _pick_candidates_rpc(sb, worker_id, allowed_statuses, dl_limit, max_same_domain, domain_policy.active_domains(worker_id), now_iso)
+    if picked is not None:
+        tasks = picked
+        if not tasks: return
+        dynamic_max_domain = tasks[0].get("domain_cap") or max_same_domain
+        sample_domains = tasks[0].get("sample_domains") or 0
+        available_domains = set([urlparse(t['audio_url']).netloc for t in tasks if t.get('audio_url')])
+    else:
+        # 🚀 將抽取樣本數擴大至 50 筆，確保有足夠樣本進行網域篩選
+        query = sb.table("mission_queue").select("*, mission_program_master(*)").in_("scrape_status", allowed_statuses).is_("r2_url", "null").lte("troop2_start_at", now_iso).order("created_at", desc=True)\
+            .limit(50)  
+        
+        tasks = query.execute().data or []
+        if not tasks: return
+
+        # =========================================================
+        # 🚀 [V6.13] 網域分散度動態偵測 (Dynamic Dispersion)
+        # =========================================================
+        available_domains = set([urlparse(t['audio_url']).netloc for t in tasks if t.get('audio_url')])
+        sample_domains = len(available_domains)
+        dynamic_max_domain = 1 if sample_domains >= dl_limit else max_same_domain
+
+    if sample_domains >= dl_limit:
+        s_log_func(sb, "DOWNLOAD", "INFO", f"🌐 貨源極度分散 (獨立網域: {sample_domains} 個 >= 目標 {dl_limit})。動態併發降為 1。")
+    else:
+        s_log_func(sb, "DOWNLOAD", "INFO", f"🌐 貨源相對集中 (獨立網域: {sample_domains} 個 < 目標 {dl_limit})。動態併發維持 {dynamic_max_domain}。")
     
     s3 = get_s3_client()
     bucket = os.environ.get("R2_BUCKET_NAME")
     
     time.sleep(random.uniform(2.0, 5.0))
-    
+
     # =========================================================
-    # 🚀 [V6.13] 網域分散度動態偵測 (Dynamic Dispersion)
+    # 🏁 [V6.20] 最短預估完工優先：依網域戰情表重排候選，慢速網域轉交重裝兵
     # =========================================================
-    available_domains = set([urlparse(t['audio_url']).netloc for t in tasks if t.get('audio_url')])
-    
-    if len(available_domains) >= dl_limit:
-        dynamic_max_domain = 1
-        s_log_func(sb, "DOWNLOAD", "INFO", f"🌐 貨源極度分散 (獨立網域: {len(available_domains)} 個 >= 目標 {dl_limit})。動態併發降為 1。")
-    else:
-        dynamic_max_domain = max_same_domain  
-        s_log_func(sb, "DOWNLOAD", "INFO", f"🌐 貨源相對集中 (獨立網域: {len(available_domains)} 個 < 目標 {dl_limit})。動態併發維持 {dynamic_max_domain}。")
+    if panel.get("DL_SELECTION_MODE", "NEWEST_FIRST") == "FASTEST_FIRST":
+        domain_of = lambda t: urlparse(t['audio_url']).netloc if t.get('audio_url') else ""
+        stats = load_domain_stats(sb, available_domains)
+        if worker_id not in HEAVY_ARMORS:
+            kept = []
+            for t in tasks:
+                stat = stats.get(domain_of(t))
+                if t.get("scrape_status") == "success" and is_known_slow(stat):
+                    s_log_func(sb, "DOWNLOAD", "INFO", f"🐌 [{domain_of(t)}] 已知慢速網域 ({stat.get('bps_ewma', 0) / 1024:.0f}KB/s)，轉交重裝兵: {t['id'][:8]}")
+                    try: sb.table("mission_queue").update({"scrape_status": "dl_heavy_only"}).eq("id", t['id']).execute()
+                    except Exception: pass
+                    continue
+                kept.append(t)
+            tasks = kept
+        with _throughput_lock:
+            local_bps = dict(DOMAIN_THROUGHPUT)
+        tasks = order_by_expected_time(tasks, stats, domain_of, local_bps)
 
-    domain_counts = {} 
-    downloaded_count = 0    
-    
+    # =========================================================
+    # 🛣️ [V6.15] 網域車道編組：同網域排成一條車道 (依序搬運)，不同車道平行推進
+    # =========================================================
+    lanes = {}
     for m in tasks:
-        if downloaded_count >= dl_limit: break
-            
         f_url = m.get('audio_url')
         if not f_url: continue
         target_domain = urlparse(f_url).netloc
         
         # 🛡️ 局中即時黑名單過濾
-        if any(b in target_domain for b in my_blacklist): 
+        if domain_policy.is_blocked(target_domain, worker_id): 
             continue
-        
-        # 🛡️ 同網域動態併發控制
-        current_domain_usage = domain_counts.get(target_domain, 0)
-        if current_domain_usage >= dynamic_max_domain:
-            if current_domain_usage == dynamic_max_domain:
+        lanes.setdefault(target_domain, []).append(m)
+
+    if not lanes:
+        domain_policy.flush(sb)
+        return
+
+    lane_workers = max(1, min(dl_concurrency, len(lanes), dl_limit))
+    s_log_func(sb, "DOWNLOAD", "INFO", f"🛣️ 編組 {len(lanes)} 條網域車道，平行車道數 {lane_workers}。")
+
+    # 🔐 共享戰況：reserved = 進行中名額，done = 已入庫數量 (成功才計數，失敗即釋出名額讓候補遞補)
+    ledger = {"reserved": 0, "done": 0}
+    cond = threading.Condition()
+
+    def is_blocked(domain):
+        return domain_policy.is_blocked(domain, worker_id)
+
+    def block_domain(domain):
+        # 🚫 受害機甲冷卻 24 小時、全軍警戒 12 小時；本地立即生效，收工時批次寫回
+        domain_policy.block(domain, worker_id, 24, "AUTO_COOLDOWN")
+        domain_policy.block(domain, "ALL", 12, "VIGILANCE")
+
+    def run_lane(target_domain, lane_tasks, lane_idx):
+        # 🎲 錯開各車道起跑時間，避免同一瞬間齊射
+        time.sleep(lane_idx * random.uniform(0.5, 2.0))
+        lane_done = 0
+        for pos, m in enumerate(lane_tasks):
+            # 🛡️ 同網域動態併發控制
+            if lane_done >= dynamic_max_domain:
                 s_log_func(sb, "DOWNLOAD", "INFO", f"🕵️ [{target_domain}] 已達動態上限 ({dynamic_max_domain})，跳過。")
-            continue
+                return
+
+            with cond:
+                while ledger["done"] < dl_limit and ledger["done"] + ledger["reserved"] >= dl_limit:
+                    cond.wait()
+                if ledger["done"] >= dl_limit: return
+                ledger["reserved"] += 1
 
-        if downloaded_count > 0:
-            time.sleep(random.uniform(5.0, 12.0))
+            ok = False
+            try:
+                # 🛡️ 友軍車道可能已在局中將此網域列入黑名單
+                if is_blocked(target_domain): return
+                if pos > 0:
+                    time.sleep(random.uniform(5.0, 12.0))
+                ok = _download_one(sb, config, m, target_domain, s3, bucket, s_log_func, block_domain, is_duty_officer, panel, tick_deadline)
+            finally:
+                with cond:
+                    ledger["reserved"] -= 1
+                    if ok:
+                        ledger["done"] += 1
+                        lane_done += 1
+                    cond.notify_all()
 
-        ext = os.path.splitext(urlparse(f_url).path)[1] or ".mp3"
-        tmp_path = f"/tmp/dl_{m['id'][:8]}{ext}"
+    # 🚀 車道依照貨源新鮮度 (created_at desc) 的首見順序排入，整體耗時取決於最慢的單一網域
+    with ThreadPoolExecutor(max_workers=lane_workers) as pool:
+        futures = [pool.submit(run_lane, d, lane_tasks, idx % lane_workers) for idx, (d, lane_tasks) in enumerate(lanes.items())]
+        for f in futures:
+            try: f.result()
+            except Exception as lane_err:
+                s_log_func(sb, "DOWNLOAD", "ERROR", f"❌ 車道異常: {str(lane_err)}")
+
+    flushed = domain_policy.flush(sb)
+    if flushed: s_log_func(sb, "DOWNLOAD", "INFO", f"🌲 局中封鎖規則批次寫回 {flushed} 筆。")
+    s_log_func(sb, "DOWNLOAD", "INFO", f"📦 本拍搬運結算: {ledger['done']} / {dl_limit}")
+
+def _download_one(sb, config, m, target_domain, s3, bucket, s_log_func, block_domain, is_duty_officer=True, panel=None, tick_deadline=None):
+    """【單筆搬運】執行一筆下載與入庫，回傳是否成功；軟失敗與封鎖記帳皆在此完成。"""
+    worker_id = config.get('WORKER_ID', 'UNKNOWN')
+    panel = panel or {}
+    f_url = m.get('audio_url')
+
+    ext = os.path.splitext(urlparse(f_url).path)[1] or ".mp3"
+    tmp_path = f"/tmp/dl_{m['id'][:8]}{ext}"
+    r2_key = os.path.basename(tmp_path)
+    stream_to_r2 = panel.get("STREAM_TO_R2", False)
+    fused_opus = stream_to_r2 and panel.get("CAN_COMPRESS", False) and panel.get("MEM_TIER", 0) >= FUSED_OPUS_MIN_MEM
+    opus_key = f"opt_{m['id'][:8]}.opus"
+    uploader = None
+    transcoder = None
+    resume_state = m.get('dl_resume_state') if stream_to_r2 else None
+    if resume_state and resume_state.get("key") != r2_key: resume_state = None
+    validators = {}
+    resumable = False
+    watchdog = None
+    succeeded = False
+    ttfb_ms = None
+    hasher = None
+    
+    current_dl_fails = m.get('dl_soft_failure_count', 0)
+    prog_info = f"{m.get('source_name', '未知')} - {m.get('episode_title', '未知')[:15]}..."
+
+    try:
+        camo_gear = get_tactical_camouflage(worker_id, is_duty_officer)
+        dynamic_headers = camo_gear["headers"]
+        tls_fingerprint = camo_gear["impersonate"]
+        
+        # 🚀 [V6.14] 蘋果離線下載擬真：動態掛載單次行動特徵，拔除 Range
+        is_apple = "AppleCoreMedia" in dynamic_headers.get("User-Agent", "")
+        if is_apple:
+            import uuid
+            dynamic_headers["X-Playback-Session-Id"] = str(uuid.uuid4()).upper()
         
-        current_dl_fails = m.get('dl_soft_failure_count', 0)
-        prog_info = f"{m.get('source_name', '未知')} - {m.get('episode_title', '未知')[:15]}..."
+        # 🧷 [V6.18] 掛載續傳點：需具備強驗證 (ETag / Last-Modified) 才敢接續
+        if resume_state:
+            validator = resume_state.get("etag") if not str(resume_state.get("etag") or "").startswith("W/") else None
+            validator = validator or resume_state.get("last_modified")
+            try:
+                if not validator: raise ValueError("續傳點缺少來源驗證碼")
+                uploader = R2StreamUploader.resume(s3, bucket, resume_state)
+                dynamic_headers["Range"] = f"bytes={uploader.bytes_uploaded}-"
+                dynamic_headers["If-Range"] = validator
+                s_log_func(sb, "DOWNLOAD", "INFO", f"🧷 [{worker_id}] 接續搬運 {m['id'][:8]}，自 {uploader.bytes_uploaded / 1048576:.1f}MB 起跳。")
+            except Exception as re_err:
+                s_log_func(sb, "DOWNLOAD", "WARNING", f"⚠️ 續傳點失效，重頭搬運: {re_err}")
+                _discard_resume_state(sb, s3, bucket, m['id'], resume_state)
+                resume_state = None
 
-        try:
-            camo_gear = get_tactical_camouflage(worker_id, is_duty_officer)
-            dynamic_headers = camo_gear["headers"]
-            tls_fingerprint = camo_gear["impersonate"]
+        with requests.Session(impersonate=tls_fingerprint) as session:
             
-            # 🚀 [V6.14] 蘋果離線下載擬真：動態掛載單次行動特徵，拔除 Range
-            is_apple = "AppleCoreMedia" in dynamic_headers.get("User-Agent", "")
-            if is_apple:
-                import uuid
-                dynamic_headers["X-Playback-Session-Id"] = str(uuid.uuid4()).upper()
-            
-            with requests.Session(impersonate=tls_fingerprint) as session:
-                
-                # 🍎 探測階段維持原樣 (針對 current_dl_fails == 1)
-                if current_dl_fails == 1:
-                    s_log_func(sb, "DOWNLOAD", "INFO", f"🍎 [{worker_id}] 對目標 [{target_domain}] 啟動媒體連線預熱 (Probe)...")
-                    probe_headers = dynamic_headers.copy()
-                    if "X-Playback-Session-Id" not in probe_headers:
-                        import uuid
-                        probe_headers["X-Playback-Session-Id"] = str(uuid.uuid4()).upper()
-                    probe_headers["Icy-MetaData"] = "1"
-                    probe_headers["Range"] = "bytes=0-100" 
-                    try:
-                        probe_r = session.get(f_url, timeout=15, headers=probe_headers)
-                        probe_r.close()
-                        time.sleep(random.uniform(0.8, 2.0)) 
-                    except Exception as probe_err:
-                        s_log_func(sb, "DOWNLOAD", "WARNING", f"⚠️ 探測階段遇阻: {probe_err}，繼續強行突破...")
-
-                final_timeout = 300 if worker_id in HEAVY_ARMORS else 120
-                dl_start_time = time.time()
-                realistic_chunk_size = random.choice([16384, 32768, 65536]) 
-                
-                # 🚀 執行真實下載
-                r = session.get(f_url, stream=True, timeout=final_timeout, headers=dynamic_headers)
-                
+            # 🍎 探測階段維持原樣 (針對 current_dl_fails == 1)
+            if current_dl_fails == 1:
+                s_log_func(sb, "DOWNLOAD", "INFO", f"🍎 [{worker_id}] 對目標 [{target_domain}] 啟動媒體連線預熱 (Probe)...")
+                probe_headers = dynamic_headers.copy()
+                if "X-Playback-Session-Id" not in probe_headers:
+                    import uuid
+                    probe_headers["X-Playback-Session-Id"] = str(uuid.uuid4()).upper()
+                probe_headers["Icy-MetaData"] = "1"
+                probe_headers["Range"] = "bytes=0-100" 
                 try:
-                    r.raise_for_status()
-                    with open(tmp_path, 'wb') as f:
-                        for chunk in r.iter_content(chunk_size=realistic_chunk_size): 
-                            if time.time() - dl_start_time > final_timeout:
-                                raise TimeoutError(f"Absolute download timeout ({final_timeout}s) exceeded.")
-                            if chunk: f.write(chunk)
-                finally:
-                    r.close()
-                    
-            s3.upload_file(tmp_path, bucket, os.path.basename(tmp_path))
-            
-            sb.table("mission_queue").update({"scrape_status": "completed", "r2_url": os.path.basename(tmp_path), "dl_soft_failure_count": 0}).eq("id", m['id']).execute()
-            s_log_func(sb, "DOWNLOAD", "SUCCESS", f"✅ 物資入庫: {m['id'][:8]}")
+                    probe_r = session.get(f_url, timeout=15, headers=probe_headers)
+                    probe_r.close()
+                    time.sleep(random.uniform(0.8, 2.0)) 
+                except Exception as probe_err:
+                    s_log_func(sb, "DOWNLOAD", "WARNING", f"⚠️ 探測階段遇阻: {probe_err}，繼續強行突破...")
+
+            final_timeout = 300 if worker_id in HEAVY_ARMORS else 120
+            dl_start_time = time.time()
+            realistic_chunk_size = random.choice([16384, 32768, 65536]) 
             
-            downloaded_count += 1 
-            domain_counts[target_domain] = domain_counts.get(target_domain, 0) + 1
-
-        except requests.exceptions.HTTPError as he:
-            status_code = getattr(he.response, 'status_code', 0)
-            if status_code in [403, 401, 429]:
-                s_log_func(sb, "DOWNLOAD", "ERROR", f"🚫 [{worker_id}] 遭封鎖 ({status_code})")
-                victim_freeze = (datetime.now(timezone.utc) + timedelta(hours=24)).isoformat()
-                ally_freeze = (datetime.now(timezone.utc) + timedelta(hours=12)).isoformat()
-                sb.table("pod_scra_rules").insert([
-                    {"worker_id": worker_id, "domain": target_domain, "rule_type": "AUTO_COOLDOWN", "expired_at": victim_freeze},
-                    {"worker_id": "ALL", "domain": target_domain, "rule_type": "VIGILANCE", "expired_at": ally_freeze}
-                ]).execute()
-                # 🚀 局中防禦：立刻將該網域加入本次迴圈的黑名單，保護後續任務
-                my_blacklist.append(target_domain)
-            else:
-                s_log_func(sb, "DOWNLOAD", "ERROR", f"❌ 搬運異常: {status_code}")
-                
-        except Exception as e: 
-            err_str = str(e).lower()
-            # 🚀 [V6.14 修補] 將連線中斷 (connection closed/reset) 也納入泥沼戰術防禦網！
-            is_tarpit = any(kw in err_str for kw in ['timeout', 'timed out', 'connection closed', 'connection reset'])
+            # 🚀 執行真實下載
+            req_start = time.time()
+            r = session.get(f_url, stream=True, timeout=final_timeout, headers=dynamic_headers)
+            ttfb_ms = (time.time() - req_start) * 1000
             
-            if is_tarpit:
-                if current_dl_fails < 1:
-                    warning_msg = f"⚠️ [{worker_id}] 遭遇泥沼戰術 (超時或斷線)，強制斬斷。嫌疑犯: {prog_info}"
-                    s_log_func(sb, "DOWNLOAD", "WARNING", warning_msg)
-                    sb.table("mission_queue").update({"dl_soft_failure_count": current_dl_fails + 1}).eq("id", m['id']).execute()
-                    try:
-                        sb.table("pod_scra_log").insert({
-                            "worker_id": worker_id, "task_type": "TARPIT_WARNING", 
-                            "status": "WARNING", "message": warning_msg
-                        }).execute()
-                    except: pass
+            f = None
+            try:
+                r.raise_for_status()
+                if uploader:
+                    # 🧷 來源必須回 206 且起點吻合；回 200 代表檔案已變更或不支援 Range，撤收舊分片重頭來
+                    if r.status_code == 206 and _content_range_start(r) == uploader.bytes_uploaded:
+                        validators = {k: resume_state.get(k) for k in ("etag", "last_modified", "attempts")}
+                    else:
+                        s_log_func(sb, "DOWNLOAD", "WARNING", f"⚠️ 來源拒絕接續 (HTTP {r.status_code})，重頭搬運。")
+                        uploader.abort(); uploader = None
+                        resume_state = None
+                if not validators:
+                    validators = {"etag": r.headers.get("ETag"), "last_modified": r.headers.get("Last-Modified"), "attempts": 0}
+                resumable = r.status_code == 206 or r.headers.get("Accept-Ranges", "").lower() == "bytes"
+
+                # 🌊 [V6.16] 串流模式：分塊直灌 R2 Multipart；否則沿用 /tmp 落地再上傳
+                if stream_to_r2:
+                    uploader = uploader or R2StreamUploader(s3, bucket, r2_key)
+                    sink_write = uploader.write
                 else:
-                    s_log_func(sb, "DOWNLOAD", "WARNING", f"⚠️ [{worker_id}] 抓取再次超時或斷線，標記為 dl_heavy_only 移交重裝。死硬派: {prog_info}")
-                    sb.table("mission_queue").update({"scrape_status": "dl_heavy_only"}).eq("id", m['id']).execute()
+                    f = open(tmp_path, 'wb')
+                    sink_write = f.write
+                # 🐌 [V6.19] 測速哨兵：截止點取「單筆絕對超時」與「單拍剩餘預算」較早者
+                expected_bytes = int(r.headers.get("Content-Length") or 0)
+                deadline = dl_start_time + final_timeout
+                if tick_deadline: deadline = min(deadline, tick_deadline)
+                watchdog = ThroughputWatchdog(expected_bytes, deadline, panel.get("DL_MIN_KBPS", 24) * 1024)
+
+                # 🔥 融合產線僅適用於從第 0 byte 起跳的完整串流
+                if fused_opus and uploader.bytes_uploaded == 0:
+                    try:
+                        # 🪜 與兵工廠同一條位元率階梯 (片長以 Content-Length 保守推估)，成品落在輕型區內
+                        transcoder = R2OpusStreamTranscoder(s3, bucket, opus_key, fused_opus_profile(expected_bytes))
+                    except OpusStreamError as oe:
+                        s_log_func(sb, "DOWNLOAD", "WARNING", f"⚠️ 融合產線無法啟動，退回兩段式: {oe}")
+                # ♻️ [V6.23] 內容指紋：僅對從第 0 byte 起跳的完整串流計算
+                if not (uploader and uploader.bytes_uploaded): hasher = hashlib.sha256()
+                for chunk in r.iter_content(chunk_size=realistic_chunk_size): 
+                    if time.time() - dl_start_time > final_timeout:
+                        raise TimeoutError(f"Absolute download timeout ({final_timeout}s) exceeded.")
+                    if not chunk: continue
+                    watchdog.feed(len(chunk))
+                    if hasher: hasher.update(chunk)
+                    sink_write(chunk)
+                    if transcoder:
+                        try:
+                            transcoder.write(chunk)
+                        except OpusStreamError as oe:
+                            s_log_func(sb, "DOWNLOAD", "WARNING", f"⚠️ 融合產線中斷，退回兩段式: {oe}")
+                            transcoder.abort(); transcoder = None
+            finally:
+                r.close()
+                if f: f.close()
+                if watchdog:
+                    watchdog.stop()
+                    if watchdog.total: record_domain_throughput(target_domain, watchdog.avg_bps)
+
+        # ♻️ [V6.23] 去重查驗：封箱前比對內容雜湊，命中則撤收本次所有上傳並掛回既有成品
+        audio_sha = hasher.hexdigest() if hasher else None
+        dup = lookup_audio(sb, audio_sha)
+        if dup:
+            if transcoder: transcoder.abort(); transcoder = None
+            if uploader: uploader.abort()
+            # 🌊 串流模式的分片已全數送達 R2 才比對雜湊，入庫上傳並未省下
+            saved_bytes, saved_stt = apply_dedup_hit(sb, m['id'], dup, watchdog.total, worker_id,
+                                                     upload_skipped=not uploader)
+            s_log_func(sb, "DOWNLOAD", "SUCCESS", f"♻️ 物資去重命中: {m['id'][:8]} -> {dup.get('opus_key') or dup.get('r2_key')} (省 {saved_bytes / 1048576:.1f}MB{'、免 STT' if saved_stt else ''})")
+            succeeded = True
+            return True
+
+        # 🔥 融合產線收尾：Opus 成品入庫成功則撤收原檔分片，否則原檔照常入庫交兵工廠
+        opus_bytes, opus_meta = 0, {}
+        if transcoder:
+            try:
+                opus_bytes = transcoder.finish()
+                opus_meta = transcoder.meta(opus_bytes)
+            except OpusStreamError as oe:
+                s_log_func(sb, "DOWNLOAD", "WARNING", f"⚠️ 融合壓縮失敗，退回兩段式: {oe}")
+                transcoder.abort()
+            transcoder = None
+
+        if opus_bytes:
+            uploader.abort()
+            sb.table("mission_queue").update({
+                "scrape_status": "completed", "r2_url": opus_key, "audio_ext": ".opus",
+                "audio_size_mb": round(opus_bytes / (1024 * 1024), 1), "dl_soft_failure_count": 0,
+                "dl_resume_state": None, "audio_sha256": audio_sha, **opus_meta
+            }).eq("id", m['id']).execute()
+            register_audio(sb, audio_sha, watchdog.total, m['id'], opus_key=opus_key)
+            s_log_func(sb, "DOWNLOAD", "SUCCESS", f"✅ 物資入庫 (融合 Opus {opus_meta.get('opus_profile')}): {m['id'][:8]}")
+            succeeded = True
+            return True
+
+        if uploader:
+            uploader.complete()
+        else:
+            s3.upload_file(tmp_path, bucket, r2_key, Config=TRANSFER_CONFIG)
+        
+        done_payload = {"scrape_status": "completed", "r2_url": r2_key, "dl_soft_failure_count": 0}
+        if m.get('dl_resume_state'): done_payload["dl_resume_state"] = None
+        if audio_sha: done_payload["audio_sha256"] = audio_sha
+        sb.table("mission_queue").update(done_payload).eq("id", m['id']).execute()
+        register_audio(sb, audio_sha, watchdog.total, m['id'], r2_key=r2_key)
+        s_log_func(sb, "DOWNLOAD", "SUCCESS", f"✅ 物資入庫: {m['id'][:8]}")
+        succeeded = True
+        return True
+
+    except requests.exceptions.HTTPError as he:
+        status_code = getattr(he.response, 'status_code', 0)
+        if status_code in [403, 401, 429]:
+            s_log_func(sb, "DOWNLOAD", "ERROR", f"🚫 [{worker_id}] 遭封鎖 ({status_code})")
+            # 🚀 局中防禦：立刻將該網域加入本次迴圈的黑名單，保護後續任務 (含平行車道)
+            block_domain(target_domain)
+        else:
+            s_log_func(sb, "DOWNLOAD", "ERROR", f"❌ 搬運異常: {status_code}")
+            
+    except Exception as e: 
+        err_str = str(e).lower()
+        # 🚀 [V6.14 修補] 將連線中斷 (connection closed/reset) 也納入泥沼戰術防禦網！
+        is_tarpit = isinstance(e, SlowTransferAbort) or any(kw in err_str for kw in ['timeout', 'timed out', 'connection closed', 'connection reset'])
+        
+        # 🧷 [V6.18] 泥沼斬斷前先保存續傳點：已送達 R2 的分片留給下一位機甲接續
+        resume_saved = False
+        if is_tarpit and resumable and uploader and uploader.parts and not uploader.closed:
+            resume_saved = _save_resume_state(sb, m, uploader, validators, s_log_func)
+
+        if resume_saved:
+            pass
+        elif is_tarpit:
+            if current_dl_fails < 1:
+                warning_msg = f"⚠️ [{worker_id}] 遭遇泥沼戰術 (超時或斷線)，強制斬斷。嫌疑犯: {prog_info}"
+                s_log_func(sb, "DOWNLOAD", "WARNING", warning_msg)
+                sb.table("mission_queue").update({"dl_soft_failure_count": current_dl_fails + 1}).eq("id", m['id']).execute()
+                try:
+                    sb.table("pod_scra_log").insert({
+                        "worker_id": worker_id, "task_type": "TARPIT_WARNING", 
+                        "status": "WARNING", "message": warning_msg
+                    }).execute()
+                except: pass
             else:
-                s_log_func(sb, "DOWNLOAD", "ERROR", f"❌ 搬運失敗: {str(e)}")
-        finally:
-            if os.path.exists(tmp_path): os.remove(tmp_path)
-            gc.collect()
\ No newline at end of file
+                s_log_func(sb, "DOWNLOAD", "WARNING", f"⚠️ [{worker_id}] 抓取再次超時或斷線，標記為 dl_heavy_only 移交重裝。死硬派: {prog_info}")
+                sb.table("mission_queue").update({"scrape_status": "dl_heavy_only"}).eq("id", m['id']).execute()
+        else:
+            s_log_func(sb, "DOWNLOAD", "ERROR", f"❌ 搬運失敗: {str(e)}")
+    finally:
+        # 🧹 任何失敗路徑皆撤收未封箱的 Multipart，避免孤兒分片計費
+        if transcoder: transcoder.abort()
+        if uploader: uploader.abort()
+        # 📊 [V6.20] 戰情回報：不論成敗，每筆搬運都更新網域滾動統計
+        dl_bytes = watchdog.total if watchdog else 0
+        dl_secs = watchdog.elapsed if watchdog else 0.0
+        record_transfer(sb, target_domain, succeeded, dl_bytes, dl_secs, ttfb_ms)
+        if os.path.exists(tmp_path): os.remove(tmp_path)
+        gc.collect()
+    return False
+
+DL_CANDIDATE_SPARES = 1  # 🪑 每個網域額外保留的候補席次 (前一筆失敗時遞補)
+
+def _pick_candidates_rpc(sb, worker_id, allowed_statuses, dl_limit, max_same_domain, blacklist, now_iso):
+    """【伺服端選貨】呼叫 pod_scra_pick_dl_candidates，失敗回傳 None 交由呼叫端退回舊制"""
+    try:
+        res = sb.rpc("pod_scra_pick_dl_candidates", {
+            "p_statuses": allowed_statuses,
+            "p_dl_limit": dl_limit,
+            "p_max_same_domain": max_same_domain,
+            "p_blacklist": sorted(set(blacklist)),
+            "p_now": now_iso,
+            "p_spares": DL_CANDIDATE_SPARES
+        }).execute()
+        return res.data or []
+    except Exception as e:
+        print(f"⚠️ [選貨 RPC] 無法使用，退回本地篩選: {str(e)[:80]}")
+        return None
+
+def _content_range_start(r):
+    """解析 Content-Range: bytes START-END/TOTAL 的起點"""
+    try:
+        return int(r.headers.get("Content-Range", "").split(" ")[1].split("-")[0])
+    except Exception:
+        return -1
+
+def _save_resume_state(sb, m, uploader, validators, s_log_func):
+    """
+    【續傳記帳】將已送達的分片與來源驗證碼寫回任務，並回報本次是否有實質推進。
+    有推進且未超過接續上限時回傳 True，呼叫端據此略過軟失敗升級。
+    """
+    prev = m.get('dl_resume_state') or {}
+    attempts = (validators.get("attempts") or 0) + 1
+    state = uploader.export_state()
+    state.update({"etag": validators.get("etag"), "last_modified": validators.get("last_modified"),
+                  "attempts": attempts, "updated_at": datetime.now(timezone.utc).isoformat()})
+    try:
+        sb.table("mission_queue").update({"dl_resume_state": state}).eq("id", m['id']).execute()
+    except Exception as e:
+        s_log_func(sb, "DOWNLOAD", "WARNING", f"⚠️ 續傳點寫入失敗，分片撤收: {e}")
+        return False
+    uploader.detach()
+    progressed = state["offset"] > (prev.get("offset") or 0)
+    s_log_func(sb, "DOWNLOAD", "WARNING", f"🧷 續傳點已保存 {m['id'][:8]}: {state['offset'] / 1048576:.1f}MB (第 {attempts} 次)")
+    return progressed and attempts <= DL_MAX_RESUMES
+
+def _discard_resume_state(sb, s3, bucket, task_id, state):
+    """撤收失效的續傳點與其殘留分片"""
+    try: s3.abort_multipart_upload(Bucket=bucket, Key=state["key"], UploadId=state["upload_id"])
+    except Exception: pass
+    try: sb.table("mission_queue").update({"dl_resume_state": None}).eq("id", task_id).execute()
+    except Exception: pass
\ No newline at end of file
@@ -0,0 +1,159 @@
+# ---------------------------------------------------------
+# src/pod_scra_intel_transcoder.py (V6.25 轉檔勤務中心)
+# 職責：全軍唯一的 FFmpeg 轉檔入口，取代散落各處、一案一擋的 subprocess.run。
+#       1. 有界工作池：工人數 = min(CPU 核心數, (MEM_TIER - 常駐保留) ÷ 單工記憶體)，至少 1 名。
+#       2. 准入管制：排隊上限為工人數兩倍，滿載時 submit 等待空位，逾時拋出 TranscodeBusy。
+#       3. 單工超時：每件轉檔各自計時，超時強制終止該 FFmpeg，不拖垮整個工作池。
+#       4. -threads 調校：CPU 核心平均分給各工人，解碼與編碼端皆套用。
+#       5. 轉檔規格集中於 PROFILES，呼叫端只指定規格名稱。
+# [V6.26 升級] 片長導向自適應 Opus：先探測片長，再從位元率階梯挑選「成品落在 Groq 輕型區 (24.5MB) 內」
+#              的最高畫質規格，最低不低於 12kbps 品質底線。
+# [V6.27 升級] 轉檔可附加音訊濾鏡 (af)，供靜音/配樂修剪階段剔除無效片段。
+# [定編] 工作池依首次取得時的 MEM_TIER 定編；之後帶入不同 MEM_TIER 的呼叫會重新定編 (舊池收完在途工作後關閉)。
+#        未帶 MEM_TIER 的呼叫 (GHA 腳本、便捷入口) 沿用現有工作池，不會把已定編的池縮回預設值。
+# [相依] 本模組不引用任何 src 內部模組，imageio_ffmpeg 為選配 (GHA 腳本可直接 import)。
+# ---------------------------------------------------------
+import os, re, time, threading, subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+BASE_RESERVE_MB = 192       # 🧠 主行程與下載緩衝的常駐保留
+MEM_PER_JOB_MB = 160        # 🧠 單件 FFmpeg 轉檔預估峰值
+DEFAULT_TIMEOUT = 600
+
+# 🎛️ 轉檔規格：輸出端參數 (輸入端一律 -vn 去除封面圖軌)
+PROFILES = {
+    "stt_opus_32k": ["-c:a", "libopus", "-b:a", "32k", "-vbr", "on", "-compression_level", "10",
+                     "-ac", "1", "-ar", "16000"],                                   # 🏭 兵工廠主規格
+    "stt_opus_24k": ["-c:a", "libopus", "-b:a", "24k", "-ac", "1", "-ar", "16000"],  # 🚚 GHA 物流/備援
+    "stt_opus_16k": ["-c:a", "libopus", "-b:a", "16k", "-vbr", "on",
+                     "-ac", "1", "-ar", "16000"],                                   # 🪖 游擊隊隱蔽傳輸
+    "mono_8k_16k":  ["-ac", "1", "-ar", "8000", "-b:a", "16k"],                     # 📻 第一管道 (依副檔名選編碼)
+}
+
+# 🪜 [V6.26] 自適應位元率階梯 (高 -> 低)：constrained VBR 讓成品大小貼近預估值
+OPUS_LADDER_KBPS = (32, 24, 20, 16, 12)
+OPUS_FLOOR_KBPS = 12            # 🎚️ 品質底線：再低語音辨識率明顯下滑
+for _kbps in OPUS_LADDER_KBPS:
+    PROFILES[f"opus_auto_{_kbps}k"] = ["-c:a", "libopus", "-b:a", f"{_kbps}k", "-vbr", "constrained",
+                                       "-compression_level", "10", "-ac", "1", "-ar", "16000"]
+
+GROQ_LIGHT_ZONE_MB = 24.5       # 🎯 與 stt_router 輕型區分流點一致 (最便宜的供應商)
+SIZE_SAFETY = 0.92              # 🧮 預留 VBR 浮動與 Ogg 封裝開銷
+OGG_OVERHEAD = 1.03
+
+class TranscodeBusy(RuntimeError):
+    """工作池排隊已滿，於准入時限內等不到空位"""
+    pass
+
+def get_ffmpeg_path():
+    """取得 FFmpeg 執行檔，優先使用 imageio_ffmpeg 內建版本"""
+    try:
+        import imageio_ffmpeg
+        path = imageio_ffmpeg.get_ffmpeg_exe()
+        if path and os.path.exists(path): return path
+    except Exception: pass
+    return "ffmpeg"
+
+def probe_duration(src, timeout=60):
+    """【片長探測】解析 FFmpeg 讀取容器標頭時印出的 Duration (免 ffprobe)，失敗回傳 None"""
+    try:
+        res = subprocess.run([get_ffmpeg_path(), "-nostdin", "-hide_banner", "-i", src],
+                             stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, timeout=timeout)
+        m = re.search(rb"Duration:\s*(\d+):(\d+):(\d+(?:\.\d+)?)", res.stderr or b"")
+        if not m: return None
+        h, mi, sec = m.groups()
+        return int(h) * 3600 + int(mi) * 60 + float(sec)
+    except Exception:
+        return None
+
+def expected_opus_mb(duration_sec, kbps):
+    return duration_sec * kbps * 1000 / 8 * OGG_OVERHEAD / (1024 * 1024)
+
+def pick_opus_profile(duration_sec, limit_mb=GROQ_LIGHT_ZONE_MB, floor_kbps=OPUS_FLOOR_KBPS):
+    """
+    【規格挑選】回傳 (規格名稱, kbps)：預估成品低於 limit_mb 的最高位元率；
+    片長不明時沿用 32k，再長也不低於品質底線。
+    """
+    ladder = [k for k in OPUS_LADDER_KBPS if k >= floor_kbps]
+    if not duration_sec: return f"opus_auto_{ladder[0]}k", ladder[0]
+    for kbps in ladder:
+        if expected_opus_mb(duration_sec, kbps) <= limit_mb * SIZE_SAFETY:
+            return f"opus_auto_{kbps}k", kbps
+    return f"opus_auto_{ladder[-1]}k", ladder[-1]
+
+def pool_size_for(mem_tier=None, cpus=None):
+    """依 CPU 與記憶體戰力推算工人數 (未提供 MEM_TIER 時最多 2 名)"""
+    cpus = cpus or os.cpu_count() or 1
+    if not mem_tier: return max(1, min(cpus, 2))
+    return max(1, min(cpus, (mem_tier - BASE_RESERVE_MB) // MEM_PER_JOB_MB))
+
+class TranscodeService:
+    """【轉檔勤務中心】有界 FFmpeg 工作池 + 准入管制 + 單工超時"""
+    def __init__(self, mem_tier=None, max_workers=None, threads=None):
+        cpus = os.cpu_count() or 1
+        self.mem_tier = mem_tier
+        self.max_workers = max_workers or pool_size_for(mem_tier, cpus)
+        self.threads = threads or max(1, cpus // self.max_workers)
+        self.ffmpeg = get_ffmpeg_path()
+        self.pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="transcode")
+        self.slots = threading.BoundedSemaphore(self.max_workers * 2)
+        self.stats = {"done": 0, "failed": 0, "seconds": 0.0}
+        self.lock = threading.Lock()
+
+    def build_cmd(self, src, dst, profile, af=None):
+        t = str(self.threads)
+        filters = ["-af", af] if af else []
+        return [self.ffmpeg, "-nostdin", "-loglevel", "error", "-y", "-threads", t, "-i", src,
+                "-vn", *filters, *PROFILES[profile], "-threads", t, dst]
+
+    def _run(self, src, dst, profile, timeout, af=None):
+        start = time.time()
+        try:
+            res = subprocess.run(self.build_cmd(src, dst, profile, af), stdout=subprocess.DEVNULL,
+                                 stderr=subprocess.PIPE, timeout=timeout)
+            ok = res.returncode == 0 and os.path.exists(dst)
+            err = None if ok else (res.stderr or b"").decode(errors="ignore")[-300:] or f"exit {res.returncode}"
+        except subprocess.TimeoutExpired:
+            ok, err = False, f"timeout ({timeout}s)"
+        except Exception as e:
+            ok, err = False, str(e)
+        finally:
+            self.slots.release()
+        with self.lock:
+            self.stats["done" if ok else "failed"] += 1
+            self.stats["seconds"] += time.time() - start
+        return ok, err
+
+    def submit(self, src, dst, profile="stt_opus_32k", timeout=DEFAULT_TIMEOUT, admit_timeout=None, af=None):
+        """送廠：回傳 Future，結果為 (ok, 錯誤訊息)"""
+        if profile not in PROFILES: raise ValueError(f"未知轉檔規格: {profile}")
+        if not self.slots.acquire(timeout=admit_timeout):
+            raise TranscodeBusy(f"轉檔排隊已滿 ({self.max_workers * 2})")
+        try:
+            return self.pool.submit(self._run, src, dst, profile, timeout, af)
+        except Exception:
+            self.slots.release()
+            raise
+
+    def transcode(self, src, dst, profile="stt_opus_32k", timeout=DEFAULT_TIMEOUT, af=None):
+        """同步轉檔 (仍受工作池與准入管制約束)"""
+        return self.submit(src, dst, profile, timeout, af=af).result()
+
+_SERVICE = None
+_service_lock = threading.Lock()
+
+def get_transcoder(mem_tier=None):
+    """取得行程內共用的轉檔勤務中心 (依 MEM_TIER 定編；帶入不同 MEM_TIER 時重新定編)"""
+    global _SERVICE
+    with _service_lock:
+        if _SERVICE is None:
+            _SERVICE = TranscodeService(mem_tier=mem_tier)
+        elif mem_tier and mem_tier != _SERVICE.mem_tier:
+            old, _SERVICE = _SERVICE, TranscodeService(mem_tier=mem_tier)
+            old.pool.shutdown(wait=False)     # 🔁 在途轉檔照常完工，新工作改送新池
+            print(f"🔁 [轉檔勤務中心] 依 MEM_TIER {mem_tier}MB 重新定編：{old.max_workers} -> {_SERVICE.max_workers} 名工人")
+        return _SERVICE
+
+def transcode(src, dst, profile="stt_opus_32k", timeout=DEFAULT_TIMEOUT, af=None, mem_tier=None):
+    """便捷入口：以共用工作池同步轉檔，回傳 (ok, 錯誤訊息)"""
+    return get_transcoder(mem_tier).transcode(src, dst, profile, timeout, af=af)
\ No newline at end of file
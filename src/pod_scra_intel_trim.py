@@ -0,0 +1,120 @@
+# ---------------------------------------------------------
+# src/pod_scra_intel_trim.py (V6.27 靜音與配樂修剪)
+# 職責：Gladia / Speechmatics / AssemblyAI / Deepgram 皆以「音訊秒數」計費，長靜音與片頭片尾配樂純屬浪費。
+#       本模組於兵工廠壓縮前先做一次偵測 (FFmpeg 單趟解碼)，產出保留片段與時間軸對照表，
+#       壓縮時以 aselect 剔除無效片段。
+# [偵測] 1. silencedetect：低於 SILENCE_DB 且長於 MIN_SILENCE 秒的靜音，兩側各留 PAD 秒呼吸空間。
+#        2. astats 能量：每 0.5 秒 RMS。片頭/片尾連續 BED_WINDOW 秒內起伏小於 BED_SPREAD_DB 的段落視為
+#           配樂墊底 (語音有停頓，能量起伏大)，僅在頭尾掃描範圍內剔除。
+# [對照] trim_map = [[輸出起點, 原始起點, 長度], ...]，map_to_source() 可將逐字稿時間換回原始時間軸。
+# ---------------------------------------------------------
+import re, bisect, subprocess
+from src.pod_scra_intel_transcoder import get_ffmpeg_path
+
+SILENCE_DB = -35
+MIN_SILENCE = 1.5
+PAD = 0.25
+RMS_WINDOW = 0.5
+BED_WINDOW = 8.0
+BED_SPREAD_DB = 6.0
+BED_MIN_SECONDS = 10.0
+INTRO_SCAN_SECONDS = 90.0
+OUTRO_SCAN_SECONDS = 120.0
+MIN_KEEP = 0.05
+
+_RE_SIL_START = re.compile(r"silence_start:\s*(-?[\d.]+)")
+_RE_SIL_END = re.compile(r"silence_end:\s*(-?[\d.]+)")
+_RE_PTS = re.compile(r"pts_time:\s*([\d.]+)")
+_RE_RMS = re.compile(r"RMS_level=(\S+)")
+
+def analyze_audio(src, timeout=600):
+    """單趟 FFmpeg 解碼，回傳 (靜音區間清單, [(時間, RMS dB), ...])；失敗回傳 (None, None)"""
+    af = (f"silencedetect=noise={SILENCE_DB}dB:d={MIN_SILENCE},aresample=8000,"
+          f"asetnsamples=n={int(8000 * RMS_WINDOW)}:p=0,astats=metadata=1:reset=1,"
+          f"ametadata=print:key=lavfi.astats.Overall.RMS_level")
+    cmd = [get_ffmpeg_path(), "-nostdin", "-hide_banner", "-i", src, "-vn", "-af", af, "-f", "null", "-"]
+    try:
+        res = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, timeout=timeout)
+    except Exception as e:
+        print(f"⚠️ [修剪] 偵測失敗，略過修剪: {str(e)[:80]}")
+        return None, None
+    if res.returncode != 0: return None, None
+
+    silences, rms, sil_start, pts = [], [], None, None
+    for line in (res.stderr or b"").decode(errors="ignore").splitlines():
+        m = _RE_SIL_START.search(line)
+        if m: sil_start = max(float(m.group(1)), 0.0); continue
+        m = _RE_SIL_END.search(line)
+        if m and sil_start is not None:
+            silences.append((sil_start, float(m.group(1)))); sil_start = None; continue
+        m = _RE_PTS.search(line)
+        if m: pts = float(m.group(1)); continue
+        m = _RE_RMS.search(line)
+        if m and pts is not None:
+            try: rms.append((pts, float(m.group(1))))
+            except ValueError: rms.append((pts, float("-inf")))
+            pts = None
+    # 🔚 片尾靜音不會印出 silence_end，以最後一個能量窗收尾
+    if sil_start is not None and rms:
+        silences.append((sil_start, rms[-1][0] + RMS_WINDOW))
+    return silences, rms
+
+def _bed_span(rms, from_end=False, scan_seconds=INTRO_SCAN_SECONDS):
+    """自片頭 (或片尾) 起算，連續「低起伏且非靜音」的配樂段長度 (秒)"""
+    seq = list(reversed(rms)) if from_end else rms
+    n = int(BED_WINDOW / RMS_WINDOW)
+    limit = int(scan_seconds / RMS_WINDOW)
+    span = 0
+    i = 0
+    while i + n <= min(len(seq), limit):
+        window = [v for _, v in seq[i:i + n]]
+        if min(window) == float("-inf") or max(window) - min(window) > BED_SPREAD_DB or max(window) < SILENCE_DB:
+            break
+        span = (i + n) * RMS_WINDOW
+        i += 1
+    return span if span >= BED_MIN_SECONDS else 0.0
+
+def plan_trim(src, duration):
+    """
+    【修剪計畫】回傳 {"keep": [(起, 迄), ...], "trim_map": [...], "seconds_saved": 秒}；
+    偵測失敗或無可剔除片段時回傳 None。
+    """
+    if not duration: return None
+    silences, rms = analyze_audio(src)
+    if silences is None: return None
+
+    cuts = [(a + PAD, b - PAD) for a, b in silences if b - a > 2 * PAD]
+    intro = _bed_span(rms)
+    outro = _bed_span(rms, from_end=True, scan_seconds=OUTRO_SCAN_SECONDS)
+    if intro: cuts.append((0.0, intro - PAD))
+    if outro: cuts.append((duration - outro + PAD, duration))
+    if not cuts: return None
+
+    keep, cursor = [], 0.0
+    for a, b in sorted(cuts):
+        if a > cursor: keep.append((cursor, a))
+        cursor = max(cursor, b)
+    if cursor < duration: keep.append((cursor, duration))
+    keep = [(round(a, 3), round(b, 3)) for a, b in keep if b - a >= MIN_KEEP]
+    if not keep: return None
+
+    trim_map, out = [], 0.0
+    for a, b in keep:
+        trim_map.append([round(out, 3), a, round(b - a, 3)])
+        out += b - a
+    saved = round(duration - out, 1)
+    if saved < MIN_SILENCE: return None
+    return {"keep": keep, "trim_map": trim_map, "seconds_saved": saved, "kept_seconds": round(out, 1)}
+
+def trim_filter(keep):
+    """產生剔除無效片段的 FFmpeg 濾鏡 (aselect + 時間戳重排)"""
+    expr = "+".join(f"between(t,{a},{b})" for a, b in keep)
+    return f"aselect='{expr}',asetpts=N/SR/TB"
+
+def map_to_source(t, trim_map):
+    """將修剪後音檔的時間 (秒) 換回原始音檔時間軸"""
+    if not trim_map: return t
+    starts = [seg[0] for seg in trim_map]
+    i = max(bisect.bisect_right(starts, t) - 1, 0)
+    out_start, src_start, length = trim_map[i]
+    return src_start + min(max(t - out_start, 0.0), length)
\ No newline at end of file
@@ -4,19 +4,23 @@
 # 任務：1. 雙軌下載：常規 T2 支援 + T1_RESCUE 403 破門救援
 #       2. 403 檢舉與規避 3. 擬人化偽裝
 # [v7.3 升級] 加入「智能網域分流」機制：擴大掃描池，強制挑選相異網域下載，徹底避開重複敲擊。
+# [v7.4 升級] 黑名單改由共用的 DomainPolicy 字尾樹判定 (主網域範圍)，403 檢舉收工時批次寫回。
+# [v7.5 升級] 壓縮改由共用的轉檔勤務中心執行 (單工超時、-threads 調校)。
+# [v7.6 升級] R2 客戶端改用共用連線池 (pod_scra_intel_s3pool)，上傳套用 Multipart 併發傳輸參數。
 # ---------------------------------------------------------
 
-import os, time, random, requests, boto3, subprocess, json
+import os, time, random, requests, json
 from datetime import datetime, timezone, timedelta
 from supabase import create_client
 from urllib.parse import urlparse
+from pod_scra_intel_domainpolicy import DomainPolicy, root_domain
+from pod_scra_intel_transcoder import transcode
+from pod_scra_intel_s3pool import get_s3_client, TRANSFER_CONFIG
 
 def get_secret(k): return os.environ.get(k)
 def get_sb(): return create_client(get_secret("SUPABASE_URL"), get_secret("SUPABASE_KEY"))
 def get_s3():
-    return boto3.client('s3', endpoint_url=get_secret("R2_ENDPOINT_URL"),
-                        aws_access_key_id=get_secret("R2_ACCESS_KEY_ID"),
-                        aws_secret_access_key=get_secret("R2_SECRET_ACCESS_KEY"), region_name="auto")
+    return get_s3_client(get_secret("R2_ENDPOINT_URL"), get_secret("R2_ACCESS_KEY_ID"), get_secret("R2_SECRET_ACCESS_KEY"))
 
 def get_headers():
     ua_list = [
@@ -27,18 +31,14 @@ def get_headers():
 
 def compress_audio(input_path, output_path):
     try:
-        subprocess.run(['ffmpeg', '-y', '-i', input_path, '-ar', '16000', '-ac', '1', '-c:a', 'libopus', '-b:a', '24k', output_path], 
-                       check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        return True
+        ok, err = transcode(input_path, output_path, "stt_opus_24k")
+        if not ok: print(f"⚠️ 壓縮失敗: {err}")
+        return ok
     except: return False
 
 def get_root_domain(url):
     """提取主網域，將 a.libsyn.com 和 b.libsyn.com 歸類為相同的 libsyn.com"""
-    domain = urlparse(url).netloc
-    parts = domain.split('.')
-    if len(parts) > 2:
-        return ".".join(parts[-2:])
-    return domain
+    return root_domain(url)
 
 def run_logistics_mission():
     TARGET_LIMIT = 3 # 🎯 總計最多挑選 3 個不同網域的任務
@@ -47,10 +47,9 @@ def run_logistics_mission():
     sb = get_sb(); s3 = get_s3(); bucket = get_secret("R2_BUCKET_NAME")
     now_iso = datetime.now(timezone.utc).isoformat()
     
-    # 🕵️ 領取黑名單：確保不重複踩雷
-    rule_res = sb.table("pod_scra_rules").select("domain").eq("worker_id", "GITHUB_LOGISTICS").execute()
-    # 將黑名單轉換為主網域格式
-    my_blacklist = [get_root_domain(f"http://{r['domain']}") for r in rule_res.data] if rule_res.data else []
+    # 🕵️ 領取黑名單：確保不重複踩雷 (規則一律收斂為主網域)
+    policy = DomainPolicy(["GITHUB_LOGISTICS"], rule_scope="root")
+    policy.refresh(sb, force=True)
 
     # 🚀 雙軌查詢邏輯 (擴大掃描池20 +20 筆，方便後續篩選相異網域)
     rescue_query = sb.table("mission_queue").select("*")\
@@ -68,14 +67,15 @@ def run_logistics_mission():
 
     # 🛡️ 智能網域分流：從候選名單中，挑選網域不重複的任務
     download_list = []
-    visited_domains = set(my_blacklist) # 預先把黑名單當作已造訪過
+    visited_domains = set()
     
     for task in raw_list:
-        root_domain = get_root_domain(task['audio_url'])
+        task_root = get_root_domain(task['audio_url'])
+        if policy.is_blocked(task_root, "GITHUB_LOGISTICS"): continue
         
-        if root_domain not in visited_domains:
+        if task_root not in visited_domains:
             download_list.append(task)
-            visited_domains.add(root_domain) # 加入集合，同網域下一個就會被跳過
+            visited_domains.add(task_root) # 加入集合，同網域下一個就會被跳過
         
         if len(download_list) >= TARGET_LIMIT:
             break
@@ -99,7 +99,7 @@ def run_logistics_mission():
                         for chunk in r.iter_content(chunk_size=16384): f.write(chunk)
                 
                 if compress_audio(raw_path, opus_path):
-                    s3.upload_file(opus_path, bucket, file_name)
+                    s3.upload_file(opus_path, bucket, file_name, Config=TRANSFER_CONFIG)
                     # 無論原本是 success 還是 pending，成功後一律改為 completed
                     sb.table("mission_queue").update({"status": "completed", "scrape_status": "completed", "r2_url": file_name}).eq("id", task_id).execute()
                     print(f"✅ [成功] {file_name} 已入庫")
@@ -107,7 +107,7 @@ def run_logistics_mission():
             except requests.exceptions.HTTPError as he:
                 if he.response.status_code == 403:
                     print(f"🚫 [ROE檢舉] 遭遇 403！標記 domain: {target_domain}")
-                    sb.table("pod_scra_rules").insert({"worker_id": "GITHUB_LOGISTICS", "domain": target_domain, "expired_at": (datetime.now(timezone.utc) + timedelta(days=7)).isoformat()}).execute()
+                    policy.block(target_domain, "GITHUB_LOGISTICS", 24 * 7, rule_type=None)
                 else: print(f"❌ HTTP錯誤: {he}")
             except Exception as e: print(f"❌ 任務潰敗: {e}")
             finally:
@@ -115,6 +115,7 @@ def run_logistics_mission():
                     if os.path.exists(p): os.remove(p)
                 
             if idx < len(download_list) - 1: time.sleep(random.randint(SLEEP_MIN, SLEEP_MAX))
+        policy.flush(sb)
     else:
         print("☕ [待命] 目前無適合且不在黑名單內的 T2 支援任務或 T1 救援任務。")
 
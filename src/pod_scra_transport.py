@@ -4,11 +4,15 @@
 # [V3.7 升級] 1. 移除計分機制 (parse_intel_metrics)，杜絕 Regex 解析崩潰。
 # [V3.7 升級] 2. 嚴格實施「先 DB 後 TG」兩階段提交，消滅幽靈迴圈。
 # [V3.7 升級] 3. Telegram 標題強制鑲嵌 [任務ID前8碼]，精準對位 HF 歸檔。
+# [V3.8 升級] 轉碼改由共用的轉檔勤務中心執行 (單工超時、-threads 調校)。
+# [V3.9 升級] R2 客戶端改用共用連線池 (pod_scra_intel_s3pool)，下載套用 Range 平行分段傳輸參數。
 # ---------------------------------------------------------
-import os, requests, time, random, boto3, subprocess, json
+import os, requests, time, random, json
 from datetime import datetime, timezone
 from supabase import create_client, Client
 from podcast_ai_agent import AIAgent 
+from pod_scra_intel_transcoder import transcode
+from pod_scra_intel_s3pool import get_s3_client, TRANSFER_CONFIG
 
 def get_secret(key, default=None):
     vault_path = "/etc/secrets/render_secret_vault.json"
@@ -31,8 +35,7 @@ def run_transport_and_report():
 
     sb: Client = create_client(sb_url, sb_key)
     ai_agent = AIAgent()
-    s3 = boto3.client('s3', endpoint_url=f'https://{r2_acc}.r2.cloudflarestorage.com',
-                      aws_access_key_id=r2_id, aws_secret_access_key=r2_secret, region_name='auto')
+    s3 = get_s3_client(f'https://{r2_acc}.r2.cloudflarestorage.com', r2_id, r2_secret)
 
     # 🎯 篩選：已完成下載 (completed) 且擁有實體檔案 (r2_url 不為空) 且屬於 T2 產線的任務，按時間降序
     res = sb.table("mission_queue").select("id, r2_url, episode_title, source_name, audio_url")\
@@ -72,11 +75,11 @@ def run_transport_and_report():
 
         try:
             print(f"📡 [提取] 正在提取物資: {r2_key}")
-            s3.download_file(r2_bucket, r2_key, local_raw)
+            s3.download_file(r2_bucket, r2_key, local_raw, Config=TRANSFER_CONFIG)
 
             # 轉碼為輕量 Opus
-            subprocess.run(['ffmpeg', '-y', '-i', local_raw, '-ar', '16000', '-ac', '1', '-c:a', 'libopus', '-b:a', '24k', local_opus], 
-                           check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            ok, err = transcode(local_raw, local_opus, "stt_opus_24k")
+            if not ok: raise RuntimeError(f"FFmpeg 轉碼失敗: {err}")
 
             print(f"🧠 [摘要] 智囊團 (Gemini 2.5 Flash) 煉金中...")
             analysis, q_score, duration = ai_agent.generate_gold_analysis(local_opus)
@@ -6,7 +6,7 @@ import os
 import re
 import time
 from podcast_prompts import GEMINI_MAIN_PROMPT, WEEKLY_STRATEGIC_PROMPT, SIMPLE_FALLBACK_PROMPT
-from groq import Groq
+from pod_scra_intel_groqpool import get_groq_pool   # 🚀 共用 Groq 調度中心 (多金鑰令牌桶)
 
 class AIAgent:
     """
@@ -18,16 +18,15 @@ class AIAgent:
             genai.configure(api_key=self.api_key)
         # 🚀 升級為二代大腦 2.5 版本
         self.model = genai.GenerativeModel("gemini-2.5-flash")
-# --- [更新處：新增 Groq 配置] ---
-        self.groq_key = os.environ.get("GROQ_API_KEY")
-        self.groq_client = Groq(api_key=self.groq_key) if self.groq_key else None
+# --- [更新處：新增 Groq 配置] (改由調度中心持有整組金鑰) ---
+        self.groq_pool = get_groq_pool()
 
     # ---------------------------------------------------------
     # ⚔️ 游擊隊專用：Groq + Opus 極速摘要流程 [cite: 2026-01-16]
     # ---------------------------------------------------------
     def generate_groq_summary(self, opus_file_path):
         """🚀 [g-小隊] 使用 Groq 執行轉寫與摘要，徹底避開 GCP 流量 [cite: 2026-01-16]"""
-        if not self.groq_client:
+        if not self.groq_pool.keys:
             print("❌ [Groq 故障] 未偵測到 GROQ_API_KEY。")
             return None
 
@@ -36,27 +35,26 @@ class AIAgent:
             
             # Step 1: 語音轉文字 (使用 Whisper-large-v3 模型) [cite: 2026-01-16]
             with open(opus_file_path, "rb") as file:
-                transcription = self.groq_client.audio.transcriptions.create(
-                    file=(opus_file_path, file.read()),
-                    model="whisper-large-v3",
-                    response_format="text",
+                transcription, status, _ = self.groq_pool.transcribe(
+                    file, os.path.basename(opus_file_path), "audio/ogg",
+                    models=["whisper-large-v3"],
                     language="en"  # 強制英文識別以提高演講準確度
                 )
+            if status != "SUCCESS": raise Exception(status)
 
             # Step 2: 呼叫"llama-3.1-70b-versatile",摘要分析，引用 SIMPLE_FALLBACK_PROMPT 
             print(f"📝 [摘要中] 正在發起 Groq 輕量化策展...")
-            completion = self.groq_client.chat.completions.create(
-                
-                model="llama-3.3-70b-versatile",
-                messages=[
+            summary, _ = self.groq_pool.chat(
+                [
                     {"role": "system", "content": SIMPLE_FALLBACK_PROMPT},
                     {"role": "user", "content": f"請分析以下 Podcast 逐字稿內容：\n\n{transcription}"}
                 ],
+                ["llama-3.3-70b-versatile"],
                 temperature=0.5,
                 max_tokens=1024
             )
             
-            return completion.choices[0].message.content
+            return summary
 
         except Exception as e:
             print(f"❌ [Groq 崩潰] 執行異常：{str(e)}")
@@ -12,12 +12,12 @@ import os
 import sys
 import time
 import random
-import subprocess
-import boto3 # 🚀 新增：R2 兵工廠連線，負責將物資送回母港
 from datetime import datetime, timezone
 from podcast_processor import PodcastProcessor  # 繼承主力部隊核心
 from podcast_navigator import NetworkNavigator
 from podcast_g_db_linker import Troop1DBLinker # 🚀 新增：G-Squad 專屬雲端聯絡官
+from pod_scra_intel_transcoder import transcode # 🚀 共用轉檔勤務中心
+from pod_scra_intel_s3pool import get_s3_client, TRANSFER_CONFIG # 🚀 共用 R2 連線池，負責將物資送回母港
 
 class GuerrillaProcessor(PodcastProcessor):
     def __init__(self):
@@ -62,24 +62,14 @@ class GuerrillaProcessor(PodcastProcessor):
         """⚡ [FFmpeg] 將音檔轉為 16k Mono Opus (極限壓縮以利隱蔽傳輸) [cite: 2026-01-16]"""
         try:
             # 💡 30分鐘演講壓縮後僅約 3.5MB，極大節省上傳流量
-            cmd = [
-                "ffmpeg", "-i", input_f, 
-                "-ac", "1", "-ar", "16000", 
-                "-c:a", "libopus", "-b:a", "16k", "-vbr", "on", "-y", output_f
-            ]
-            res = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-            return res.returncode == 0
+            return transcode(input_f, output_f, "stt_opus_16k")[0]
         except: return False
 
     def upload_to_r2(self, local_path, filename):
         """📦 [後勤支援] 將壓縮好的 Opus 檔案送入 R2，交接給 T2 部隊 [新增功能]"""
         print(f"📦 [R2] 正在將戰利品 {filename} 送入雲端倉庫...")
-        s3 = boto3.client('s3', 
-                          endpoint_url=os.environ.get("R2_ENDPOINT_URL"),
-                          aws_access_key_id=os.environ.get("R2_ACCESS_KEY_ID"),
-                          aws_secret_access_key=os.environ.get("R2_SECRET_ACCESS_KEY"), 
-                          region_name="auto")
-        s3.upload_file(local_path, os.environ.get("R2_BUCKET_NAME"), filename)
+        s3 = get_s3_client()
+        s3.upload_file(local_path, os.environ.get("R2_BUCKET_NAME"), filename, Config=TRANSFER_CONFIG)
         print(f"✅ [R2] 入庫成功。")
 
     # ---------------------------------------------------------
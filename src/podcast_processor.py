@@ -6,7 +6,6 @@ import sys
 import time
 import random
 import json
-import subprocess # 🚀 引入子進程模組，修復音訊壓縮崩潰問題 [cite: 2026-02-15]
 from supabase import create_client, Client  # 🚀 引入雲端指揮官
 from datetime import datetime, timezone, timedelta
 from podcast_monitor import MemoryManager
@@ -16,6 +15,7 @@ from podcast_ai_agent import AIAgent
 from podcast_proxy_medic import ProxyMedic  # 🚀 引入軍需官系統 
 from email.utils import parsedate_to_datetime       # 🚀 置頂部解析UTC時間
 from podcast_gcp_storager import GCPStorageManager  # 🚀 讀取GCP決策動態路徑
+from pod_scra_intel_transcoder import transcode     # 🚀 共用轉檔勤務中心
 
 
 class PodcastProcessor:
@@ -462,8 +462,7 @@ class PodcastProcessor:
     def _compress_audio(self, input_f, output_f):
         """⚡ [FFmpeg] 16k/Mono 極限壓縮"""
         try:
-            cmd = ["ffmpeg", "-i", input_f, "-ac", "1", "-ar", "8000", "-b:a", "16k", "-y", output_f]
-            return subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).returncode == 0
+            return transcode(input_f, output_f, "mono_8k_16k")[0]
         except: return False
 
 